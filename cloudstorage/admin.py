@@ -1,6 +1,6 @@
 from django.contrib import admin
 from mptt.admin import MPTTModelAdmin, DraggableMPTTAdmin
-from cloudstorage.models import Folder, File, StorageUser
+from cloudstorage.models import Folder, File, StorageUser, Blob
 
 
 class FileInLine(admin.TabularInline):
@@ -35,6 +35,11 @@ class FileAdmin(admin.ModelAdmin):
 class StorageUserAdmin(admin.ModelAdmin):
     list_display = ('id', 'email', 'first_name', 'last_name')
 
+
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'size', 'refcount', 'created')
+
 admin.site.register(Folder, FolderAdmin)
 admin.site.register(File, FileAdmin)
 admin.site.register(StorageUser, StorageUserAdmin)
+admin.site.register(Blob, BlobAdmin)
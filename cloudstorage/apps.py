@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CloudStorageConfig(AppConfig):
+    name = 'cloudstorage'
+    verbose_name = 'Cloud Storage'
+
+    def ready(self):
+        # connect signal receivers
+        from cloudstorage import signals  # noqa
@@ -0,0 +1,291 @@
+"""
+Streams a whole folder subtree as a ZIP archive.
+
+The archive is written on the fly into a small buffer that is handed to
+the server and emptied after every chunk, so no temp file is needed and
+memory stays flat however much is downloaded. ZipFile falls back to data
+descriptors on an unseekable output, and switches to ZIP64 by itself for
+large entries, offsets and entry counts, so archives over 4 GiB or with
+more than 65535 entries work too. Only the central directory, a few dozen
+bytes per entry, is held until the end.
+
+Folders come from one range query over the hierarchy (see hierarchy.py)
+and get a directory entry each, so empty folders survive the round trip.
+Files already compressed (see STORED_MIME_TYPES) are stored as they are,
+everything else is deflated.
+
+File content is read by a background thread into a queue of at most
+ARCHIVE_READ_AHEAD chunks, across file boundaries, so storage latency
+(an S3 GET per file) overlaps with compressing and sending. The file rows
+come from a cursor and are handed to that thread ARCHIVE_READ_AHEAD files
+ahead of the writer (see ReadAheadFeed), so however many files there are
+only those few rows are held, and the thread never touches the database.
+"""
+import queue
+import threading
+import zipfile
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+from cloudstorage.deletion import exclude_deleted
+from cloudstorage.hierarchy import get_hierarchy
+from cloudstorage.models import File
+from cloudstorage.streaming import FileChunkIterator
+
+DEFAULT_ARCHIVE_READ_AHEAD = 8
+
+# MIME types that deflate can't shrink any further
+STORED_MIME_TYPES = {
+    'application/gzip', 'application/x-gzip', 'application/x-bzip2', 'application/x-xz',
+    'application/x-7z-compressed', 'application/x-rar-compressed', 'application/zip',
+    'application/pdf', 'application/epub+zip',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp',
+}
+STORED_MIME_PREFIXES = ('video/', 'audio/')
+UNCOMPRESSED_AUDIO = {'audio/wav', 'audio/x-wav', 'audio/aiff', 'audio/x-aiff'}
+
+# how long the read-ahead thread waits on a full queue before checking
+# whether the download was abandoned
+PUT_TIMEOUT = 0.5
+
+
+def get_read_ahead():
+    """
+    Returns the number of chunks read ahead of the archive writer
+    """
+    return getattr(settings, 'ARCHIVE_READ_AHEAD', DEFAULT_ARCHIVE_READ_AHEAD)
+
+
+def get_compress_type(mime_type):
+    mime_type = (mime_type or '').lower()
+    if mime_type in STORED_MIME_TYPES or \
+            (mime_type.startswith(STORED_MIME_PREFIXES) and mime_type not in UNCOMPRESSED_AUDIO):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def get_entry_name(directory, name, used):
+    """
+    Returns a unique entry name for `name` in `directory`, eg.
+    'photos/cat (2).jpg' if 'photos/cat.jpg' is already taken
+    """
+    name = name.replace('/', '_').replace('\\', '_').strip() or '_'
+    stem, dot, extension = name.rpartition('.')
+    if not stem:
+        stem, dot, extension = name, '', ''
+
+    entry_name = directory + name
+    count = 1
+    while entry_name.lower() in used:
+        count += 1
+        entry_name = '{}{} ({}){}{}'.format(directory, stem, count, dot, extension)
+    used.add(entry_name.lower())
+    return entry_name
+
+
+def get_date_time(value):
+    # ZIP timestamps are local time, and can't go back before 1980
+    return max(timezone.localtime(value).timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+class ArchiveBuffer(object):
+    """
+    Write-only file object the ZipFile writes into, drained after every
+    write by the streaming iterator
+    """
+
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, data):
+        self.pieces.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.pieces)
+        self.pieces = []
+        return data
+
+
+class ReadAheadIterator(object):
+    """
+    Reads the content of `field_files`, one after the other, on a
+    background thread. Iterating yields an iterator over each file's chunks,
+    in order.
+    """
+    END_OF_FILE = object()
+
+    def __init__(self, field_files, read_ahead=None, chunk_size=None):
+        self.queue = queue.Queue(maxsize=read_ahead or get_read_ahead())
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.read, args=(field_files, chunk_size), daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(self, field_files, chunk_size):
+        try:
+            for field_file in field_files:
+                chunks = FileChunkIterator(field_file, chunk_size=chunk_size)
+                try:
+                    for data in chunks:
+                        if not self.put(data):
+                            return
+                finally:
+                    chunks.close()
+                if not self.put(self.END_OF_FILE):
+                    return
+        except Exception as e:
+            self.put(e)
+
+    def chunks(self):
+        while True:
+            item = self.queue.get()
+            if item is self.END_OF_FILE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def __iter__(self):
+        while True:
+            yield self.chunks()
+
+    def close(self):
+        self.closed.set()
+
+
+class ReadAheadFeed(object):
+    """
+    Iterates the file rows of an archive while handing their files on to a
+    ReadAheadIterator (see field_files) up to `window` rows ahead, fetching
+    no more rows than that. The stored name is the last column of a row.
+    """
+
+    def __init__(self, rows, window):
+        self.rows = iter(rows)
+        self.window = window
+        self.pending = deque()
+        self.queue = queue.Queue()
+        self.done = False
+        self.file_field = File._meta.get_field('file')
+        self.fill()
+
+    def field_files(self):
+        """
+        Yields the files to read, for the read-ahead thread
+        """
+        return iter(self.queue.get, None)
+
+    def fill(self):
+        while not self.done and len(self.pending) < self.window:
+            row = next(self.rows, None)
+            if row is None:
+                self.close()
+                break
+            self.pending.append(row)
+            self.queue.put(self.file_field.attr_class(None, self.file_field, row[-1]))
+
+    def __iter__(self):
+        while self.pending:
+            row = self.pending.popleft()
+            self.fill()
+            yield row
+
+    def close(self):
+        if not self.done:
+            self.done = True
+            self.queue.put(None)
+
+
+def get_subtree_folders(folder):
+    folders = get_hierarchy().get_descendants(folder, include_self=True)
+    return exclude_deleted(folders) \
+        .values_list('id', 'parent_id', 'name', 'modified')
+
+
+def get_subtree_files(folder):
+    hierarchy = get_hierarchy()
+    ordering = ['folder__' + field for field in hierarchy.preorder] + ['name', 'id']
+    files = File.objects.filter(hierarchy.get_subtree_filter(folder, prefix='folder__'),
+                                deleted_at__isnull=True)
+    return exclude_deleted(files, prefix='folder__') \
+        .order_by(*ordering) \
+        .values_list('folder_id', 'name', 'size', 'mime_type', 'modified', 'file')
+
+
+def write_archive(folder, buffer):
+    """
+    Writes the archive into `buffer`, yielding whenever there is something
+    to send
+    """
+    used = set()
+
+    # archive path of every folder, in pre-order so parents come first
+    directories = {}
+    paths = []
+    for folder_id, parent_id, name, modified in get_subtree_folders(folder).iterator():
+        if folder_id == folder.pk:
+            directories[folder_id] = ''
+            continue
+        directories[folder_id] = get_entry_name(directories[parent_id], name, used) + '/'
+        paths.append((directories[folder_id], modified))
+
+    files = ReadAheadFeed(get_subtree_files(folder).iterator(), get_read_ahead())
+    reader = ReadAheadIterator(files.field_files())
+
+    try:
+        with zipfile.ZipFile(buffer, 'w', allowZip64=True) as archive:
+            for path, modified in paths:
+                info = zipfile.ZipInfo(path, date_time=get_date_time(modified))
+                info.external_attr = (0o40755 << 16) | 0x10  # MS-DOS directory flag
+                archive.writestr(info, b'')
+                yield
+
+            for (folder_id, name, size, mime_type, modified, stored_name), chunks in zip(files, reader):
+                info = zipfile.ZipInfo(get_entry_name(directories[folder_id], name, used),
+                                       date_time=get_date_time(modified))
+                info.compress_type = get_compress_type(mime_type)
+                info.file_size = size  # picks ZIP64 for the entry if needed
+                info.external_attr = 0o644 << 16
+
+                with archive.open(info, 'w') as entry:
+                    for data in chunks:
+                        entry.write(data)
+                        yield
+                yield
+    finally:
+        files.close()
+        reader.close()
+
+
+def iter_archive(folder):
+    """
+    Yields the ZIP archive of `folder` and everything below it, leaving out
+    the trash. Entries are named relative to the folder.
+    """
+    buffer = ArchiveBuffer()
+    for _ in write_archive(folder, buffer):
+        data = buffer.drain()
+        if data:
+            yield data
+
+    # the central directory, written when the ZipFile closed
+    data = buffer.drain()
+    if data:
+        yield data
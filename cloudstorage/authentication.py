@@ -0,0 +1,202 @@
+"""
+Cached token and HTTP Basic authentication.
+
+DRF's TokenAuthentication joins the token to its user on every request.
+CachedTokenAuthentication keeps each token, with its user, in an
+in-process TTL'd LRU (TOKEN_CACHE_TTL seconds) and, if TOKEN_CACHE_ALIAS
+names one of CACHES, in that shared cache too (TOKEN_SHARED_CACHE_TTL
+seconds), so most requests authenticate without touching the database.
+
+Refreshing or deleting a token, or saving its user, drops the cached
+entries through the receivers in signals.py. That reaches the shared
+cache and this process's LRU, but not the LRUs of other processes. With a
+shared cache, every entry is tagged with the token's version, a random
+value kept in the shared cache and replaced whenever the token is
+forgotten; an LRU hit is only used while its version is still current, so
+revocations reach every process at the cost of one small cache read per
+request. Without a shared cache other processes keep using their entry
+until it expires, which is why TOKEN_CACHE_TTL defaults to a few seconds.
+
+Expiry is checked on every request. A cached token that looks expired is
+looked up again, it may have been refreshed in another process. The
+cached user is a snapshot, unpickled afresh for every request so requests
+never share an instance. Anything that must be up to date, like the usage
+counters, should still be read from the database.
+
+CachedBasicAuthentication spares Basic auth clients the password hasher
+(PBKDF2, deliberately slow) on every request. Credentials that checked out
+are remembered for BASIC_AUTH_CACHE_TTL seconds under a keyed HMAC of the
+email and password, so the password itself is never stored, along with
+the user id and a fingerprint of the user's password hash. A repeat
+request then costs one primary key lookup, and a changed password changes
+the hash, so the entry stops matching everywhere at once.
+"""
+import hmac
+import pickle
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from cloudstorage.cache import TTLCache
+from cloudstorage.models import AuthToken
+
+DEFAULT_TOKEN_CACHE_TTL = 5
+DEFAULT_TOKEN_SHARED_CACHE_TTL = 5 * 60
+DEFAULT_BASIC_AUTH_CACHE_TTL = 5 * 60
+
+SHARED_CACHE_PREFIX = 'cloudstorage.token:'
+VERSION_CACHE_PREFIX = 'cloudstorage.token-version:'
+
+# token key -> (token version, pickled token, with its user)
+token_cache = TTLCache(maxsize=getattr(settings, 'TOKEN_CACHE_SIZE', 10000))
+
+# HMAC of the credentials -> (user id, fingerprint of the password hash)
+credential_cache = TTLCache(maxsize=getattr(settings, 'BASIC_AUTH_CACHE_SIZE', 10000))
+
+
+def get_token_cache_ttl():
+    return getattr(settings, 'TOKEN_CACHE_TTL', DEFAULT_TOKEN_CACHE_TTL)
+
+
+def get_shared_cache():
+    """
+    Returns the shared cache configured by TOKEN_CACHE_ALIAS, or None
+    """
+    alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def get_token_version(key):
+    """
+    Returns the current version of a token in the shared cache, None
+    without one
+    """
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return None
+
+    version = shared_cache.get(VERSION_CACHE_PREFIX + key)
+    if version is None:
+        # never cached, or evicted: start afresh, never with an old version
+        shared_cache.add(VERSION_CACHE_PREFIX + key, uuid.uuid4().hex, None)
+        version = shared_cache.get(VERSION_CACHE_PREFIX + key)
+    return version
+
+
+def get_cached_token(key, version):
+    entry = token_cache.get(key)
+    if entry is not None and entry[0] != version:
+        # forgotten in another process
+        token_cache.delete(key)
+        entry = None
+
+    if entry is None:
+        shared_cache = get_shared_cache()
+        if shared_cache is None:
+            return None
+        entry = shared_cache.get(SHARED_CACHE_PREFIX + key)
+        if entry is None or entry[0] != version:
+            return None
+        if get_token_cache_ttl():
+            token_cache.set(key, entry, ttl=get_token_cache_ttl())
+
+    return pickle.loads(entry[1])
+
+
+def cache_token(key, token, version):
+    """
+    Caches a token loaded while `version` was current
+    """
+    entry = version, pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+    if get_token_cache_ttl():
+        token_cache.set(key, entry, ttl=get_token_cache_ttl())
+
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared_cache.set(SHARED_CACHE_PREFIX + key, entry,
+                         getattr(settings, 'TOKEN_SHARED_CACHE_TTL', DEFAULT_TOKEN_SHARED_CACHE_TTL))
+
+
+def forget_token(key):
+    """
+    Drops a cached token, eg. after it was refreshed or deleted
+    """
+    token_cache.delete(key)
+
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        # outdates the copies in other processes' LRUs
+        shared_cache.set(VERSION_CACHE_PREFIX + key, uuid.uuid4().hex, None)
+        shared_cache.delete(SHARED_CACHE_PREFIX + key)
+
+
+def forget_user_tokens(user_id):
+    """
+    Drops the cached copies of a user, eg. after it was changed
+    """
+    for key in AuthToken.objects.filter(user_id=user_id).values_list('key', flat=True):
+        forget_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication for per-device AuthTokens that only goes to the
+    database on a cache miss
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        # read before the database, so a token forgotten meanwhile isn't
+        # cached under the new version
+        version = get_token_version(key)
+        token = get_cached_token(key, version)
+        if token is None or token.is_expired():
+            token = AuthToken.objects.select_related('user').filter(key=key).first()
+            if token is None:
+                raise AuthenticationFailed('Invalid token.')
+            cache_token(key, token, version)
+
+        if token.is_expired():
+            raise AuthenticationFailed('Token has expired.')
+        if not token.user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+
+        return token.user, token
+
+
+def get_credentials_key(userid, password):
+    return salted_hmac('cloudstorage.authentication.credentials',
+                       '{}\0{}'.format(userid, password)).digest()
+
+
+def get_password_fingerprint(user):
+    return salted_hmac('cloudstorage.authentication.password', user.password).digest()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication that only runs the password hasher on credentials
+    it hasn't verified recently
+    """
+
+    def authenticate_credentials(self, userid, password):
+        key = get_credentials_key(userid, password)
+        entry = credential_cache.get(key)
+
+        if entry is not None:
+            user_id, fingerprint = entry
+            user = get_user_model().objects.filter(pk=user_id).first()
+            if user is not None and user.is_active and \
+                    hmac.compare_digest(get_password_fingerprint(user), fingerprint):
+                return user, None
+            credential_cache.delete(key)
+
+        user, auth = super().authenticate_credentials(userid, password)
+        credential_cache.set(key, (user.pk, get_password_fingerprint(user)),
+                             ttl=getattr(settings, 'BASIC_AUTH_CACHE_TTL', DEFAULT_BASIC_AUTH_CACHE_TTL))
+        return user, auth
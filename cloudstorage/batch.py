@@ -0,0 +1,259 @@
+"""
+Batch move, rename and delete of files and folders.
+
+Multi-select actions in the clients send one list of operations instead
+of one request per item, eg.
+
+    [{"op": "move", "type": "file", "id": 12, "folder": 5},
+     {"op": "rename", "type": "folder", "id": 7, "name": "2018"},
+     {"op": "delete", "type": "file", "id": 13}]
+
+Every item named is looked up with one query per type, which also checks
+ownership, and operations that don't check out get an error of their own
+while the rest go ahead. The valid ones then run in one transaction, by
+kind, as bulk UPDATEs: one for all renames of a type (a CASE on the id),
+one per destination folder for file moves, one for all deletes of a type,
+with the usage counters, listing versions and change journal updated
+once at the end.
+Moving 5,000 files is a handful of queries, however many folders they
+come from.
+
+Folder moves are the exception: each one renumbers the hierarchy (see
+hierarchy.py) and goes through Folder.move_to.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+from mptt.exceptions import InvalidMove
+
+from cloudstorage.deletion import exclude_deleted, set_trashed
+from cloudstorage.hierarchy import PATH_STEP
+from cloudstorage.journal import record_changes
+from cloudstorage.models import Change, File, Folder
+from cloudstorage.usage import update_folder_usage
+from cloudstorage.versions import bump_versions
+
+DEFAULT_BATCH_MAX_OPERATIONS = 10000
+
+OPERATIONS = ('move', 'rename', 'delete')
+TYPES = ('file', 'folder')
+
+NAME_MAX_LENGTH = 250
+
+
+class BatchError(Exception):
+    """
+    Raised for a batch that can't be run at all
+    """
+
+
+def get_batch_max_operations():
+    return getattr(settings, 'BATCH_MAX_OPERATIONS', DEFAULT_BATCH_MAX_OPERATIONS)
+
+
+def parse_operation(operation):
+    """
+    Returns the (op, type, id, argument) of an operation, or None if it
+    is malformed
+    """
+    if not isinstance(operation, dict):
+        return None
+    op, kind, item_id = operation.get('op'), operation.get('type'), operation.get('id')
+    if op not in OPERATIONS or kind not in TYPES or not isinstance(item_id, int):
+        return None
+
+    argument = None
+    if op == 'move':
+        argument = operation.get('folder')
+        if not isinstance(argument, int):
+            return None
+    elif op == 'rename':
+        argument = operation.get('name')
+        if not isinstance(argument, str) or not argument.strip() or len(argument) > NAME_MAX_LENGTH:
+            return None
+    return op, kind, item_id, argument
+
+
+def get_files(owner, ids):
+    files = File.objects.filter(owner=owner, id__in=ids, deleted_at__isnull=True)
+    files = exclude_deleted(files, prefix='folder__')
+    return {row['id']: row for row in files.values('id', 'folder_id', 'size', 'folder__path')}
+
+
+def get_folders(owner, ids):
+    folders = exclude_deleted(Folder.objects.filter(owner=owner, id__in=ids))
+    return {row['id']: row for row in folders.values('id', 'parent_id', 'path')}
+
+
+def check_operation(op, kind, item_id, argument, files, folders):
+    """
+    Returns why an operation can't be run, None if it can
+    """
+    item = (files if kind == 'file' else folders).get(item_id)
+    if item is None:
+        return 404, 'Not found'
+
+    if kind == 'folder' and op != 'rename' and item['parent_id'] is None:
+        return 400, 'The root folder can only be renamed'
+
+    if op == 'move':
+        target = folders.get(argument)
+        if target is None:
+            return 404, 'Destination folder not found'
+        if kind == 'folder' and target['path'].startswith(item['path']):
+            return 400, 'A folder may not be moved into itself or its descendants'
+    return None
+
+
+def rename(model, names, now):
+    if names:
+        model.objects.filter(id__in=names).update(
+            name=Case(*[When(id=item_id, then=Value(name)) for item_id, name in names.items()],
+                      output_field=CharField()),
+            modified=now)
+
+
+def move_files(moves, files, folders, now):
+    """
+    Moves files with one UPDATE per destination folder. Returns the usage
+    changes and the folders whose listings changed.
+    """
+    by_target = defaultdict(list)
+    for file_id, target_id in moves.items():
+        by_target[target_id].append(file_id)
+
+    changes = []
+    folder_ids = set(by_target)
+    for target_id, file_ids in by_target.items():
+        File.objects.filter(id__in=file_ids).update(folder_id=target_id, modified=now)
+        for file_id in file_ids:
+            file = files[file_id]
+            changes.append((file['folder__path'], -file['size'], -1))
+            changes.append((folders[target_id]['path'], file['size'], 1))
+            folder_ids.add(file['folder_id'])
+    return changes, folder_ids
+
+
+def delete_files(file_ids, files, now):
+    """
+    Moves files to the trash with one UPDATE, see deletion.delete_file
+    """
+    File.objects.filter(id__in=file_ids).update(deleted_at=now)
+    changes = [(files[file_id]['folder__path'], -files[file_id]['size'], -1) for file_id in file_ids]
+    return changes, {files[file_id]['folder_id'] for file_id in file_ids}
+
+
+def move_folders(moves):
+    """
+    Moves folders one by one, each from fresh tree columns since the moves
+    before it renumber the tree. Returns why the folders that couldn't be
+    moved after all weren't, eg. into a folder moved below them earlier in
+    the batch, by id.
+    """
+    failed = {}
+    folders = Folder.objects.in_bulk(list(moves) + list(moves.values()))
+    for folder_id, target_id in moves.items():
+        folder, target = folders[folder_id], folders[target_id]
+        folder.refresh_from_db()
+        target.refresh_from_db()
+        try:
+            with transaction.atomic():
+                folder.move_to(target)
+        except InvalidMove as e:
+            failed[folder_id] = str(e)
+    return failed
+
+
+def delete_folders(folder_ids, now):
+    """
+    Moves folders to the trash with one UPDATE, and flags their subtrees
+    with another, see deletion.delete_folder. Each takes what it counts off
+    the folders above it, up to the nearest one in the trash, as if they
+    had been deleted one after the other.
+    """
+    if not folder_ids:
+        return
+    folders = list(Folder.objects.select_for_update().filter(id__in=folder_ids, deleted_at__isnull=True)
+                   .only('path', 'tree_id', 'lft', 'rght', 'size', 'file_count'))
+    changes = [(folder.path[:-PATH_STEP], -folder.size, -folder.file_count) for folder in folders]
+    Folder.objects.filter(id__in=folder_ids).update(deleted_at=now)
+    set_trashed(folders, True)
+    update_folder_usage(*changes)
+
+
+def run_batch(owner, operations):
+    """
+    Runs a list of operations for `owner`, returns the result of each, in
+    order: {'code': 200} or eg. {'code': 404, 'status': 'Not found'}
+    """
+    if not isinstance(operations, list):
+        raise BatchError('Expected a list of operations')
+    if len(operations) > get_batch_max_operations():
+        raise BatchError('Too many operations, the limit is {}'.format(get_batch_max_operations()))
+
+    results = [{'code': 200} for operation in operations]
+    parsed = {}
+    for index, operation in enumerate(operations):
+        parsed[index] = parse_operation(operation)
+        if parsed[index] is None:
+            results[index] = {'code': 400, 'status': 'Invalid operation'}
+
+    valid = {index: operation for index, operation in parsed.items() if operation is not None}
+    file_ids = {item_id for op, kind, item_id, argument in valid.values() if kind == 'file'}
+    folder_ids = {item_id for op, kind, item_id, argument in valid.values() if kind == 'folder'} | \
+        {argument for op, kind, item_id, argument in valid.values() if op == 'move'}
+
+    now = timezone.now()
+    with transaction.atomic():
+        files = get_files(owner, file_ids)
+        folders = get_folders(owner, folder_ids)
+
+        renames = {'file': {}, 'folder': {}}
+        moves = {'file': {}, 'folder': {}}
+        deletes = {'file': [], 'folder': []}
+        seen = set()
+        for index, (op, kind, item_id, argument) in sorted(valid.items()):
+            error = check_operation(op, kind, item_id, argument, files, folders)
+            if error is None and (kind, item_id) in seen:
+                error = 400, 'Item is already part of this batch'
+            if error is not None:
+                results[index] = {'code': error[0], 'status': error[1]}
+                continue
+
+            seen.add((kind, item_id))
+            if op == 'rename':
+                renames[kind][item_id] = argument.strip()
+            elif op == 'move':
+                moves[kind][item_id] = (index, argument)
+            else:
+                deletes[kind].append(item_id)
+
+        rename(File, renames['file'], now)
+        rename(Folder, renames['folder'], now)
+
+        move_changes, moved_from = move_files({file_id: target_id for file_id, (index, target_id)
+                                               in moves['file'].items()}, files, folders, now)
+        delete_changes, deleted_from = delete_files(deletes['file'], files, now)
+        update_folder_usage(*(move_changes + delete_changes))
+
+        failed = move_folders({folder_id: target_id for folder_id, (index, target_id)
+                               in moves['folder'].items()})
+        for folder_id, reason in failed.items():
+            index = moves['folder'][folder_id][0]
+            results[index] = {'code': 400, 'status': reason}
+
+        delete_folders(deletes['folder'], now)
+        renamed_in = {files[file_id]['folder_id'] for file_id in renames['file']}
+        bump_versions(owner.pk, renamed_in | moved_from | deleted_from)
+
+        # folder moves are journaled by Folder.move_to
+        record_changes(owner.pk, Change.KIND_FILE, Change.UPDATE, renames['file'])
+        record_changes(owner.pk, Change.KIND_FILE, Change.MOVE, moves['file'])
+        record_changes(owner.pk, Change.KIND_FILE, Change.DELETE, deletes['file'])
+        record_changes(owner.pk, Change.KIND_FOLDER, Change.UPDATE, renames['folder'])
+        record_changes(owner.pk, Change.KIND_FOLDER, Change.DELETE, deletes['folder'])
+
+    return results
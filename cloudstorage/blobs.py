@@ -0,0 +1,91 @@
+"""
+Content-addressed blob store.
+
+Uploaded content is stored once per distinct SHA-256 digest under
+blobs/<digest>, no matter how many files (or users) upload it. File rows
+point at a Blob, which counts its references and is removed from storage
+when the last one goes away.
+"""
+import hashlib
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from cloudstorage.models import Blob, get_blob_path
+from cloudstorage.storage import delete_files
+
+
+def hash_content(content):
+    """
+    Returns the SHA-256 hex digest of a Django File, read in chunks
+    """
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def acquire_blob(content, digest=None):
+    """
+    Returns the blob holding `content`, storing it first if no blob with
+    the same digest exists yet, and takes a reference on it.
+    """
+    if digest is None:
+        digest = hash_content(content)
+
+    while True:
+        blob = Blob.objects.filter(digest=digest).first()
+
+        if blob is None:
+            blob = Blob(digest=digest, size=content.size)
+            storage = Blob._meta.get_field('file').storage
+            name = get_blob_path(blob, None)
+
+            # a leftover from a failed upload has the same content by
+            # definition; released content is gone by the time its row is
+            if storage.exists(name):
+                blob.file = name
+            else:
+                blob.file.save(name, content, save=False)
+
+            try:
+                with transaction.atomic():
+                    blob.save()
+            except IntegrityError:
+                # someone else stored the same content first, use theirs
+                continue
+
+        # the blob may have been released and deleted since we looked it up
+        if Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1):
+            blob.refcount += 1
+            return blob
+
+
+def release_blob(blob_id):
+    """
+    Drops a reference to a blob, deleting it and its stored content once
+    nothing references it anymore.
+    """
+    release_blobs([blob_id])
+
+
+def release_blobs(blob_ids):
+    """
+    Drops one reference per id in `blob_ids` (which may repeat), with one
+    update per distinct blob. Deletes the blobs nothing references anymore,
+    their stored content in bulk before the deletion of their rows commits.
+    """
+    for blob_id, count in Counter(blob_ids).items():
+        Blob.objects.filter(pk=blob_id, refcount__gt=0) \
+            .update(refcount=Greatest(F('refcount') - count, 0))
+
+    with transaction.atomic():
+        # the row lock makes a concurrent acquire_blob wait, then find the
+        # row gone and store the content afresh. The content has to go
+        # while the lock is held: deleted after the commit, it could
+        # already back a new row for the same digest.
+        blobs = list(Blob.objects.select_for_update().filter(pk__in=set(blob_ids), refcount=0))
+        Blob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+        delete_files(Blob._meta.get_field('file').storage, [blob.file.name for blob in blobs])
@@ -0,0 +1,235 @@
+"""
+Trash: soft deletion with restore and a delayed, batched purge.
+
+Deleting a file or folder through the API stamps deleted_at on that one
+row, and restoring it clears the stamp again. A folder's whole subtree is
+flagged `trashed` along with it, in one range UPDATE however big it is,
+so everything below a deleted folder disappears from (and reappears in)
+the API at once: queries just leave out trashed folders and the files in
+them (see exclude_deleted), as well as deleted files. A partial index
+over the live folders keeps that filter cheap, see migration 0016.
+
+Items stay in the trash for TRASH_RETENTION seconds. After that the
+purge_trash command (run it from cron) reclaims their rows and stored
+content off the request path: files go in batches, with blob references
+released in bulk and the freed objects deleted from storage in bulk
+(DeleteObjects on S3, 1000 keys per call); then the folders go, deepest
+first. Users can also empty their trash right away (see empty_trash),
+trashed items count towards the quota until they are purged.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from cloudstorage.blobs import release_blobs
+from cloudstorage.hierarchy import get_hierarchy
+from cloudstorage.models import Change, File, Folder, UploadSession
+from cloudstorage.storage import delete_files, get_file_storage
+from cloudstorage.upload_sessions import abort_session
+from cloudstorage.usage import trash_file_usage, trash_folder_usage, update_user_usage
+from cloudstorage.journal import record_change
+from cloudstorage.versions import bump_versions
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_TRASH_RETENTION = 30 * 24 * 60 * 60
+
+
+def get_trash_retention():
+    """
+    Returns how long, in seconds, deleted items can still be restored
+    """
+    return getattr(settings, 'TRASH_RETENTION', DEFAULT_TRASH_RETENTION)
+
+
+def delete_folder(folder):
+    """
+    Moves a folder and, implicitly, everything below it to the trash
+    """
+    folder.deleted_at = timezone.now()
+    folder.trashed = True
+    with transaction.atomic():
+        trash_folder_usage(folder)
+        Folder.objects.filter(pk=folder.pk).update(deleted_at=folder.deleted_at)
+        set_trashed([folder], True)
+        bump_versions(folder.owner_id)
+        record_change(folder.owner_id, Change.KIND_FOLDER, Change.DELETE, folder.pk)
+
+
+def delete_file(file):
+    """
+    Moves a file to the trash
+    """
+    file.deleted_at = timezone.now()
+    with transaction.atomic():
+        trash_file_usage(file)
+        File.objects.filter(pk=file.pk).update(deleted_at=file.deleted_at)
+        bump_versions(file.owner_id, [file.folder_id])
+        record_change(file.owner_id, Change.KIND_FILE, Change.DELETE, file.pk)
+
+
+def restore_folder(folder):
+    """
+    Takes a folder and everything below it back out of the trash
+    """
+    folder.deleted_at = None
+    folder.trashed = False
+    with transaction.atomic():
+        Folder.objects.filter(pk=folder.pk).update(deleted_at=None)
+        set_trashed([folder], False)
+        trash_folder_usage(folder, restore=True)
+        bump_versions(folder.owner_id)
+        record_change(folder.owner_id, Change.KIND_FOLDER, Change.RESTORE, folder.pk)
+
+
+def restore_file(file):
+    """
+    Takes a file back out of the trash
+    """
+    file.deleted_at = None
+    with transaction.atomic():
+        File.objects.filter(pk=file.pk).update(deleted_at=None)
+        trash_file_usage(file, restore=True)
+        bump_versions(file.owner_id, [file.folder_id])
+        record_change(file.owner_id, Change.KIND_FILE, Change.RESTORE, file.pk)
+
+
+def set_trashed(folders, trashed):
+    """
+    Flags the subtrees of `folders` as in the trash or, with trashed=False,
+    back out of it, leaving out whatever sits below folders deleted on
+    their own further down
+    """
+    if not folders:
+        return
+    hierarchy = get_hierarchy()
+    subtrees = Folder.objects.filter(reduce(or_, [hierarchy.get_subtree_filter(folder) for folder in folders]))
+    if not trashed:
+        nested = subtrees.filter(deleted_at__isnull=False).exclude(pk__in=[folder.pk for folder in folders])
+        for folder in nested.only('path', 'tree_id', 'lft', 'rght'):
+            subtrees = subtrees.exclude(hierarchy.get_subtree_filter(folder))
+    subtrees.update(trashed=trashed)
+
+
+def exclude_deleted(queryset, prefix=''):
+    """
+    Drops the rows inside deleted folders from a queryset of folders or,
+    with eg. prefix='folder__', of models pointing at them
+    """
+    return queryset.filter(**{prefix + 'trashed': False})
+
+
+def purge_files(files, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deletes the rows and stored content of up to `batch_size` of the given
+    files. Returns the number of files deleted, 0 once there are none left.
+    """
+    batch = list(files.values_list('id', 'blob_id', 'file', 'owner_id', 'size')[:batch_size])
+    if not batch:
+        return 0
+
+    ids = [file_id for file_id, blob_id, name, owner_id, size in batch]
+    usage = defaultdict(lambda: [0, 0])
+    for file_id, blob_id, name, owner_id, size in batch:
+        usage[owner_id][0] += size
+        usage[owner_id][1] += 1
+
+    with transaction.atomic():
+        # a raw delete skips the per-row post_delete signals, the blob
+        # references are released below in one go instead
+        File.objects.filter(id__in=ids)._raw_delete(File.objects.db)
+        release_blobs([blob_id for file_id, blob_id, name, owner_id, size in batch if blob_id])
+        # the folders above stopped counting these when they were trashed
+        for owner_id, (size, file_count) in usage.items():
+            update_user_usage(owner_id, -size, -file_count)
+
+    delete_files(get_file_storage(), [name for file_id, blob_id, name, owner_id, size in batch if not blob_id])
+    return len(batch)
+
+
+def get_deleted_folder(folder_id):
+    """
+    Returns the deleted folder with fresh tree columns (under MPTT they
+    shift whenever folders to their left change), or None once it's gone
+    or has been restored
+    """
+    return Folder.objects.filter(pk=folder_id, deleted_at__isnull=False).first()
+
+
+def purge_folder(folder_id, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deletes a deleted folder and its whole subtree for good, files first,
+    then the folders deepest first so no folder outlives its children
+    """
+    hierarchy = get_hierarchy()
+
+    folder = get_deleted_folder(folder_id)
+    if folder is None:
+        return
+    for session in UploadSession.objects.filter(hierarchy.get_subtree_filter(folder, prefix='folder__')):
+        abort_session(session)
+
+    while folder is not None:
+        files = File.objects.filter(hierarchy.get_subtree_filter(folder, prefix='folder__'))
+        if not purge_files(files, batch_size):
+            break
+        folder = get_deleted_folder(folder_id)
+
+    while folder is not None:
+        # the path is kept up to date under every engine, so its length is
+        # a reliable depth
+        ids = list(Folder.objects.filter(hierarchy.get_subtree_filter(folder))
+                   .order_by(Length('path').desc(), '-id')
+                   .values_list('id', flat=True)[:batch_size])
+        # nothing points at these anymore, and the gap a raw delete leaves
+        # in the MPTT numbering doesn't upset any nested set query
+        Folder.objects.filter(id__in=ids)._raw_delete(Folder.objects.db)
+        folder = get_deleted_folder(folder_id)
+
+
+def purge_trash(retention=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Purges the files and folders that have been in the trash for longer
+    than `retention` seconds (TRASH_RETENTION by default), oldest first.
+    Returns the number of (folders, files) purged; the files inside
+    purged folders aren't counted.
+    """
+    if retention is None:
+        retention = get_trash_retention()
+    cutoff = timezone.now() - timedelta(seconds=retention)
+
+    return purge(Folder.objects.filter(deleted_at__lte=cutoff),
+                 File.objects.filter(deleted_at__lte=cutoff), batch_size)
+
+
+def empty_trash(owner, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Purges everything in the owner's trash right away, see purge_trash
+    """
+    return purge(Folder.objects.filter(owner=owner, deleted_at__isnull=False),
+                 File.objects.filter(owner=owner, deleted_at__isnull=False), batch_size)
+
+
+def purge(folders, files, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Purges the given deleted folders with their subtrees, then the given
+    deleted files, oldest first. Returns the number of (folders, files)
+    purged; the files inside purged folders aren't counted.
+    """
+    folder_ids = list(folders.order_by('deleted_at').values_list('id', flat=True))
+    for folder_id in folder_ids:
+        purge_folder(folder_id, batch_size)
+
+    file_count = 0
+    while True:
+        count = purge_files(files.order_by('deleted_at'), batch_size)
+        if not count:
+            break
+        file_count += count
+
+    return len(folder_ids), file_count
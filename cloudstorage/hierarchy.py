@@ -0,0 +1,245 @@
+"""
+Folder hierarchy engines.
+
+Folders have always been stored as MPTT nested sets, which make subtree
+reads a single range query but make writes expensive: inserting or moving
+a folder renumbers lft/rght for everything to its right in the user's
+tree, under tree-wide row locks.
+
+Every folder also carries a materialized path: the ids of its ancestors
+and itself, each zero-padded to PATH_STEP digits (root 1 -> '0000000001',
+its child 5 -> '00000000010000000005'). A subtree is then every row whose
+path starts with the folder's path, ordering by path is a pre-order walk
+under any collation (it's all digits), and a move rewrites the path
+prefix of the moved subtree only.
+
+The path is kept up to date under both engines, so
+FOLDER_HIERARCHY picks which representation the rest of the app reads
+and whether the MPTT columns are maintained at all:
+
+ - 'mptt' (default): MPTT does the bookkeeping and reads use lft/rght
+ - 'path': MPTT updates are switched off and reads use the path. Moves cost
+   O(size of the moved subtree), inserts O(1). The MPTT columns go stale
+   (and tree_id is left out of the API), run the rebuild_folder_tree
+   command before switching back to 'mptt'.
+
+Paths grow by PATH_STEP characters per level. Folders may be nested up to
+FOLDER_MAX_DEPTH levels under either engine, which keeps the longest path
+well inside what a database index entry can hold (about 2.7 KB on
+PostgreSQL; MySQL only indexes a prefix of it), see check_depth().
+"""
+import contextlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.db.models import Max, Q, TextField, Value
+from django.db.models.functions import Cast, Concat, Length, Substr
+from mptt.exceptions import InvalidMove
+from mptt.models import MPTTModel
+
+PATH_STEP = 10
+
+DEFAULT_FOLDER_MAX_DEPTH = 250
+
+HIERARCHY_MPTT = 'mptt'
+HIERARCHY_PATH = 'path'
+
+
+def path_segment(folder_id):
+    return '{:0{}d}'.format(folder_id, PATH_STEP)
+
+
+def get_path_expression(parent_path):
+    """
+    Returns the path of a row below `parent_path` as an SQL expression, ie.
+    parent_path + path_segment(id), for rows whose id isn't known yet
+    """
+    folder_id = Cast('id', TextField())
+    padded = Concat(Value('0' * PATH_STEP), folder_id)
+    return Concat(Value(parent_path), Substr(padded, Length(folder_id) + 1, PATH_STEP))
+
+
+def get_path_ids(path):
+    """
+    Returns the folder ids in a path, root first
+    """
+    return [int(path[i:i + PATH_STEP]) for i in range(0, len(path), PATH_STEP)]
+
+
+def get_path_depth(path):
+    """
+    Returns the depth of the folder with this path, 0 for a root folder
+    """
+    return len(path) // PATH_STEP - 1
+
+
+def get_max_depth():
+    return getattr(settings, 'FOLDER_MAX_DEPTH', DEFAULT_FOLDER_MAX_DEPTH)
+
+
+def check_depth(parent, folder=None):
+    """
+    Raises InvalidMove if putting `folder` and everything below it, or a new
+    folder when `folder` is None, under `parent` would nest folders more
+    than FOLDER_MAX_DEPTH levels deep
+    """
+    from cloudstorage.models import Folder
+
+    height = 0
+    if folder is not None and folder.path:
+        longest = Folder.objects.filter(path__startswith=folder.path) \
+            .aggregate(longest=Max(Length('path')))['longest']
+        height = (longest - len(folder.path)) // PATH_STEP
+
+    if get_path_depth(parent.path) + 1 + height > get_max_depth():
+        raise InvalidMove('Folders may not be nested more than {} levels deep.'.format(get_max_depth()))
+
+
+def update_path(folder):
+    """
+    Sets the path of a new or moved folder from its parent's, and rewrites
+    the prefix of every path below it to match. A moved folder's usage
+    moves to its new ancestors too.
+    """
+    from cloudstorage.models import Folder
+    from cloudstorage.usage import move_folder_usage
+
+    path = (folder.parent.path if folder.parent_id else '') + path_segment(folder.pk)
+    if folder.path:
+        move_folder_usage(folder, folder.path, path)
+        Folder.objects.filter(path__startswith=folder.path) \
+            .update(path=Concat(Value(path), Substr('path', len(folder.path) + 1)))
+    else:
+        Folder.objects.filter(pk=folder.pk).update(path=path)
+    folder.path = path
+
+
+def build_paths(model):
+    """
+    Fills in every folder's path from the MPTT columns, used to migrate
+    existing trees. Takes the model so migrations can pass their own.
+    """
+    ancestors = []
+    rows = model.objects.order_by('tree_id', 'lft').values_list('id', 'level', 'path')
+
+    with transaction.atomic():
+        for folder_id, level, old_path in rows.iterator():
+            del ancestors[level:]
+            path = ''.join(ancestors) + path_segment(folder_id)
+            ancestors.append(path_segment(folder_id))
+            if path != old_path:
+                model.objects.filter(pk=folder_id).update(path=path)
+
+
+class MPTTHierarchy(object):
+    """
+    Nested sets maintained by django-mptt
+    """
+    name = HIERARCHY_MPTT
+
+    # order of get_descendants(), relative to the Folder model
+    preorder = ('tree_id', 'lft')
+
+    def tree_updates(self):
+        return contextlib.ExitStack()
+
+    def move(self, folder, target, position='first-child'):
+        with transaction.atomic():
+            MPTTModel.move_to(folder, target, position)
+            update_path(folder)
+
+    def delete(self, folder):
+        MPTTModel.delete(folder)
+
+    def get_subtree_filter(self, folder, prefix=''):
+        """
+        Returns a filter for `folder` and its descendants, on the Folder
+        model or, with eg. prefix='folder__', on models pointing at it
+        """
+        return Q(**{
+            prefix + 'tree_id': folder.tree_id,
+            prefix + 'lft__gte': folder.lft,
+            prefix + 'lft__lte': folder.rght,
+        })
+
+    def get_descendants(self, folder, include_self=False):
+        return folder.get_descendants(include_self=include_self).order_by(*self.preorder)
+
+    def get_ancestors(self, folder, include_self=False):
+        return folder.get_ancestors(include_self=include_self)
+
+
+class PathHierarchy(MPTTHierarchy):
+    """
+    Materialized paths, with the MPTT columns left alone
+    """
+    name = HIERARCHY_PATH
+    preorder = ('path',)
+
+    def tree_updates(self):
+        from cloudstorage.models import Folder
+        return Folder.objects.disable_mptt_updates()
+
+    def move(self, folder, target, position='first-child'):
+        from cloudstorage.models import Folder
+
+        with transaction.atomic():
+            if target is not None:
+                # lock the folder and everything above the target, in id
+                # order, then check with fresh paths: a move running at the
+                # same time that puts the folder above the target, or the
+                # other way round, touches one of these rows too
+                ids = sorted(set(get_path_ids(target.path)) | {folder.pk, target.pk})
+                paths = dict(Folder.objects.select_for_update().filter(id__in=ids).order_by('id')
+                             .values_list('id', 'path'))
+                folder.path, target.path = paths[folder.pk], paths[target.pk]
+                if target.path.startswith(folder.path):
+                    raise InvalidMove('A folder may not be moved into itself or its descendants.')
+
+            Folder.objects.filter(pk=folder.pk).update(parent=target)
+            folder.parent = target
+            update_path(folder)
+
+        # like MPTT, so saving the folder afterwards isn't taken for another move
+        folder._mptt_meta.update_mptt_cached_fields(folder)
+
+    def delete(self, folder):
+        # skips MPTTModel.delete(), which closes the gap left in lft/rght
+        models.Model.delete(folder)
+
+    def get_subtree_filter(self, folder, prefix=''):
+        return Q(**{prefix + 'path__startswith': folder.path})
+
+    def get_descendants(self, folder, include_self=False):
+        from cloudstorage.models import Folder
+
+        queryset = Folder.objects.filter(self.get_subtree_filter(folder))
+        if not include_self:
+            queryset = queryset.exclude(pk=folder.pk)
+        return queryset.order_by(*self.preorder)
+
+    def get_ancestors(self, folder, include_self=False):
+        from cloudstorage.models import Folder
+
+        ids = get_path_ids(folder.path)
+        if not include_self:
+            ids = ids[:-1]
+        return Folder.objects.filter(id__in=ids).order_by(*self.preorder)
+
+
+HIERARCHIES = {
+    HIERARCHY_MPTT: MPTTHierarchy(),
+    HIERARCHY_PATH: PathHierarchy(),
+}
+
+
+def get_hierarchy():
+    """
+    Returns the engine selected by FOLDER_HIERARCHY
+    """
+    name = getattr(settings, 'FOLDER_HIERARCHY', HIERARCHY_MPTT)
+    try:
+        return HIERARCHIES[name]
+    except KeyError:
+        raise ImproperlyConfigured('FOLDER_HIERARCHY must be one of {}'.format(', '.join(sorted(HIERARCHIES))))
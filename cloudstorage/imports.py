@@ -0,0 +1,392 @@
+"""
+Imports an uploaded zip or tar archive into a folder.
+
+Each entry's content is copied out of the archive into a spooled temp file
+while it is hashed, then stored as a blob like any other upload (see
+blobs.py), one entry at a time so memory stays flat. Only then are the
+rows written, in one transaction and in bulk:
+
+ - folders named in the archive are merged into the live folders of the
+   same name below the target, the rest are created level by level with
+   bulk_create, with their MPTT columns laid out in memory. Room for them
+   is made in the user's tree with one UPDATE, however many folders the
+   archive adds and wherever they go, instead of one renumbering per insert
+ - files are created with bulk_create, and the usage counters, listing
+   versions and change journal are updated once for the whole import
+
+A failed import drops the references it took on the blobs, so content
+stored for it is removed again.
+"""
+import hashlib
+import mimetypes
+import tarfile
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Max, Value, When
+
+from cloudstorage.blobs import acquire_blob, release_blobs
+from cloudstorage.deletion import exclude_deleted
+from cloudstorage.hierarchy import HIERARCHY_MPTT, get_hierarchy, get_max_depth, get_path_depth, \
+    get_path_expression, path_segment
+from cloudstorage.journal import record_changes
+from cloudstorage.models import Change, File, Folder
+from cloudstorage.quota import check_quota
+from cloudstorage.streaming import get_chunk_size
+from cloudstorage.uploads import UploadError
+from cloudstorage.usage import update_folder_usage, update_user_usage
+from cloudstorage.versions import bump_versions
+
+DEFAULT_IMPORT_MAX_ENTRIES = 10000
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ArchiveError(UploadError):
+    """
+    Raised when an uploaded archive can't be read or imported
+    """
+
+
+def get_import_max_entries():
+    return getattr(settings, 'IMPORT_MAX_ENTRIES', DEFAULT_IMPORT_MAX_ENTRIES)
+
+
+class ImportNode(object):
+    """
+    A folder named in the archive. `id` is set up front for folders that
+    exist already, and once created for new ones.
+    """
+
+    def __init__(self, name, parent=None, folder=None):
+        self.name = name
+        self.parent = parent
+        self.children = OrderedDict()
+        self.files = []  # (name, blob)
+        self.id = self.path = None
+        self.lft = self.rght = self.level = None
+        self.existing = folder is not None
+        if folder is not None:
+            self.id = folder['id']
+            self.path = folder['path']
+            self.lft, self.rght, self.level = folder['lft'], folder['rght'], folder['level']
+
+    def walk(self):
+        """
+        Yields the new folders at and below this node
+        """
+        if not self.existing:
+            yield self
+        for child in self.children.values():
+            yield from child.walk()
+
+
+def get_entry_parts(name):
+    """
+    Returns the folder names and file name of an archive entry, or None
+    for entries pointing outside the archive
+    """
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if '..' in parts:
+        return None
+    return parts
+
+
+def iter_zip_entries(archive):
+    for info in archive.infolist():
+        yield info.filename, info.is_dir(), info.file_size, lambda info=info: archive.open(info)
+
+
+def iter_tar_entries(archive):
+    for member in archive.getmembers():
+        # links and devices are left out
+        if member.isdir() or member.isfile():
+            yield member.name, member.isdir(), member.size, lambda member=member: archive.extractfile(member)
+
+
+def open_archive(upload):
+    """
+    Returns the entries of a zip or tar archive as (name, is_dir, size,
+    open) tuples
+    """
+    try:
+        if zipfile.is_zipfile(upload):
+            upload.seek(0)
+            return list(iter_zip_entries(zipfile.ZipFile(upload)))
+        upload.seek(0)
+        return list(iter_tar_entries(tarfile.open(fileobj=upload, mode='r:*')))
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError):
+        raise ArchiveError('Not a valid zip or tar archive')
+
+
+def store_entry(stream):
+    """
+    Copies an entry's content into a blob, hashing it on the way
+    """
+    sha256 = hashlib.sha256()
+    chunk_size = get_chunk_size()
+    with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as spool:
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            sha256.update(data)
+            spool.write(data)
+
+        content = DjangoFile(spool)
+        content.size = spool.tell()
+        return acquire_blob(content, digest=sha256.hexdigest())
+
+
+def read_archive(upload, owner):
+    """
+    Stores the content of every file in an uploaded archive. Returns the
+    (folder names, file name or None for folders, blob) of every entry.
+    """
+    entries = open_archive(upload)
+    if len(entries) > get_import_max_entries():
+        raise ArchiveError('Archive has too many entries, the limit is {}'.format(get_import_max_entries()))
+    check_quota(owner, sum(size for name, is_dir, size, open_entry in entries if not is_dir))
+
+    imported = []
+    try:
+        for name, is_dir, size, open_entry in entries:
+            parts = get_entry_parts(name)
+            if not parts:
+                continue
+            if is_dir:
+                imported.append((parts, None, None))
+                continue
+
+            try:
+                with open_entry() as stream:
+                    blob = store_entry(stream)
+            except (zipfile.BadZipFile, tarfile.TarError, EOFError, RuntimeError, NotImplementedError):
+                raise ArchiveError('Could not read {} from the archive'.format(name))
+            imported.append((parts[:-1], parts[-1], blob))
+    except Exception:
+        release_import_blobs(imported)
+        raise
+
+    return imported
+
+
+def release_import_blobs(imported):
+    blob_ids = [blob.pk for folders, name, blob in imported if blob is not None]
+    release_blobs(blob_ids)
+
+
+def get_existing_folders(folder):
+    """
+    Returns the live folders below `folder`, keyed by (parent id, name),
+    the first one of each name. Locks them until the end of the transaction.
+    """
+    folders = get_hierarchy().get_descendants(folder)
+    folders = exclude_deleted(folders).select_for_update() \
+        .values('id', 'parent_id', 'name', 'path', 'lft', 'rght', 'level')
+
+    existing = {}
+    for row in folders:
+        existing.setdefault((row['parent_id'], row['name']), row)
+    return existing
+
+
+def build_tree(folder, imported):
+    """
+    Returns the node for `folder`, with the nodes for the folders and files
+    in the archive below it
+    """
+    # fresh tree columns, the tree may have changed since `folder` was read
+    folder = Folder.objects.select_for_update().get(pk=folder.pk)
+    root = ImportNode(folder.name, folder={
+        'id': folder.pk, 'path': folder.path, 'lft': folder.lft, 'rght': folder.rght, 'level': folder.level,
+    })
+    existing = get_existing_folders(folder)
+
+    max_depth = get_max_depth()
+    for parts, name, blob in imported:
+        if get_path_depth(folder.path) + len(parts) > max_depth:
+            raise ArchiveError('Folders may not be nested more than {} levels deep'.format(max_depth))
+
+        node = root
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                row = existing.get((node.id, part)) if node.existing else None
+                child = node.children[part] = ImportNode(part, node, row)
+            node = child
+        if name is not None:
+            node.files.append((name, blob))
+    return root
+
+
+def make_tree_space(tree_id, points):
+    """
+    Makes room in an MPTT tree for new folders going in as the last
+    children of existing ones. `points` are the (rght, width) of those
+    existing folders: every lft or rght at or past one of them moves up by
+    its width, all in one UPDATE.
+    """
+    def shift(field):
+        return F(field) + sum(
+            (Case(When(**{field + '__gte': rght, 'then': Value(width)}), default=Value(0),
+                  output_field=IntegerField()) for rght, width in points),
+            Value(0))
+
+    Folder.objects.filter(tree_id=tree_id, rght__gte=min(rght for rght, width in points)) \
+        .update(lft=shift('lft'), rght=shift('rght'))
+
+
+def number_subtree(node, position, level):
+    """
+    Numbers a new folder and the folders below it from `position` on, and
+    returns the position after them
+    """
+    node.lft, node.level = position, level
+    position += 1
+    for child in node.children.values():
+        position = number_subtree(child, position, level + 1)
+    node.rght = position
+    return position + 1
+
+
+def lay_out_folders(root):
+    """
+    Sets the MPTT columns of the new folders, as the last children of the
+    existing folders they go in, as the tree will be once make_tree_space()
+    has run. Returns the insertion points for make_tree_space().
+    """
+    existing = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.existing:
+            existing.append(node)
+            stack.extend(node.children.values())
+
+    points = []
+    offset = 0  # how far earlier insertions moved this part of the tree
+    for parent in sorted(existing, key=lambda node: node.rght):
+        position = start = parent.rght + offset
+        for child in parent.children.values():
+            if not child.existing:
+                position = number_subtree(child, position, parent.level + 1)
+        if position > start:
+            points.append((parent.rght, position - start))
+            offset += position - start
+    return points
+
+
+def returns_bulk_ids(model):
+    """
+    Returns whether bulk_create() sets the ids of the rows it creates for
+    `model`, which it does on PostgreSQL
+    """
+    return connections[model.objects.db].features.can_return_ids_from_bulk_insert
+
+
+def create_folders(root, owner, tree_id):
+    """
+    Creates the new folders level by level, each level with one
+    bulk_create, and fills in their ids and paths
+    """
+    level = list(root.children.values())
+    while level:
+        new = [node for node in level if not node.existing]
+        created = Folder.objects.bulk_create([
+            Folder(name=node.name, parent_id=node.parent.id, owner=owner, path='',
+                   tree_id=tree_id, lft=node.lft, rght=node.rght, level=node.level)
+            for node in new
+        ], batch_size=DEFAULT_BATCH_SIZE)
+
+        parents = {node.parent.id: node.parent for node in new}
+        if returns_bulk_ids(Folder):
+            created = [(folder.parent_id, folder.name, folder.pk) for folder in created]
+        else:
+            # the new folders are the ones without a path yet, of the names
+            # just created in each parent
+            created = Folder.objects.filter(owner=owner, parent_id__in=parents, path='') \
+                .order_by('-id').values_list('parent_id', 'name', 'id')
+        for parent_id, name, folder_id in created:
+            node = parents[parent_id].children.get(name)
+            if node is not None and not node.existing and node.id is None:
+                node.id = folder_id
+                node.path = node.parent.path + path_segment(folder_id)
+
+        for parent in parents.values():
+            ids = [node.id for node in parent.children.values() if not node.existing]
+            Folder.objects.filter(id__in=ids).update(path=get_path_expression(parent.path))
+
+        record_changes(owner.pk, Change.KIND_FOLDER, Change.CREATE, [node.id for node in new])
+        level = [child for node in level for child in node.children.values()]
+
+
+def create_files(root, owner):
+    """
+    Creates the imported files with bulk_create, and counts them all at
+    once. Returns the number of files created.
+    """
+    files = []
+    changes = []
+    folder_ids = []
+
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        stack.extend(node.children.values())
+        if not node.files:
+            continue
+
+        for name, blob in node.files:
+            mime_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            files.append(File(name=name, original_name=name, size=blob.size, checksum=blob.digest,
+                              mime_type=mime_type, folder_id=node.id, file=blob.file.name,
+                              blob=blob, owner=owner))
+        changes.append((node.path, sum(blob.size for name, blob in node.files), len(node.files)))
+        folder_ids.append(node.id)
+
+    last_id = File.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    created = File.objects.bulk_create(files, batch_size=DEFAULT_BATCH_SIZE)
+    if returns_bulk_ids(File):
+        file_ids = [file.pk for file in created]
+    else:
+        # the new files are past the last id so far, and among the names
+        # just created in each folder
+        names = {(file.folder_id, file.name) for file in files}
+        file_ids = [file_id for file_id, folder_id, name in
+                    File.objects.filter(owner=owner, folder_id__in=folder_ids, id__gt=last_id)
+                    .values_list('id', 'folder_id', 'name')
+                    if (folder_id, name) in names]
+
+    update_folder_usage(*changes)
+    update_user_usage(owner.pk, sum(file.size for file in files), len(files))
+    bump_versions(owner.pk, folder_ids)
+    record_changes(owner.pk, Change.KIND_FILE, Change.CREATE, file_ids)
+    return len(files)
+
+
+def import_archive(folder, upload):
+    """
+    Imports the folders and files in an uploaded zip or tar archive into
+    `folder`. Returns the number of folders and files created.
+    """
+    owner = folder.owner
+    imported = read_archive(upload, owner)
+
+    try:
+        with transaction.atomic():
+            root = build_tree(folder, imported)
+            points = lay_out_folders(root)
+            if points and get_hierarchy().name == HIERARCHY_MPTT:
+                make_tree_space(folder.tree_id, points)
+            create_folders(root, owner, folder.tree_id)
+            file_count = create_files(root, owner)
+    except Exception:
+        release_import_blobs(imported)
+        raise
+
+    return len(list(root.walk())), file_count
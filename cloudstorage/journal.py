@@ -0,0 +1,144 @@
+"""
+Per-user change journal, for delta sync.
+
+Every create, update, move, delete (to the trash or for good) and restore
+of a file or folder appends a Change, in the same transaction, numbered
+by the owner's journal_seq counter. Taking the next numbers locks the
+user's row until the transaction ends, so changes commit in sequence
+order and a client that has seen up to N never misses anything below N.
+
+Sync clients list everything once, remember the cursor /api/changes/
+hands out, and from then on fetch only what changed since then, each
+change with the item as it is now, see ChangesAPIView. Waiting clients are
+woken once the changes commit, see notifications.py.
+
+compact_changes() keeps the journal from growing without bound:
+
+ - entries superseded by a later one for the same item are dropped right
+   away, the later one carries the item's current state anyway
+ - entries older than CHANGES_RETENTION are dropped and the user's
+   journal_floor is raised past them. A client with a cursor below the
+   floor gets a 410 and has to list everything again.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from cloudstorage.models import Change, StorageUser
+from cloudstorage.notifications import notify_changes
+
+DEFAULT_CHANGES_RETENTION = 90 * 24 * 60 * 60
+DEFAULT_CHANGES_PAGE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_changes_retention():
+    return getattr(settings, 'CHANGES_RETENTION', DEFAULT_CHANGES_RETENTION)
+
+
+def record_changes(owner_id, kind, action, item_ids):
+    """
+    Appends an entry per item to the owner's journal
+    """
+    item_ids = [item_id for item_id in item_ids if item_id is not None]
+    if not item_ids:
+        return
+
+    with transaction.atomic():
+        StorageUser.objects.filter(pk=owner_id).update(journal_seq=F('journal_seq') + len(item_ids))
+        last = StorageUser.objects.filter(pk=owner_id).values_list('journal_seq', flat=True).get()
+        first = last - len(item_ids) + 1
+        Change.objects.bulk_create([
+            Change(owner_id=owner_id, seq=first + i, kind=kind, item_id=item_id, action=action)
+            for i, item_id in enumerate(item_ids)
+        ], batch_size=DEFAULT_BATCH_SIZE)
+        notify_changes(owner_id, last)
+
+
+def record_change(owner_id, kind, action, item_id):
+    record_changes(owner_id, kind, action, [item_id])
+
+
+def get_changes(owner, since, limit=None):
+    """
+    Returns the owner's changes after `since`, at most `limit` of them,
+    the oldest first, whether there are more, and the cursor to continue
+    from. Only the latest change of each item is kept.
+    """
+    limit = limit or getattr(settings, 'CHANGES_PAGE_SIZE', DEFAULT_CHANGES_PAGE_SIZE)
+    changes = list(Change.objects.filter(owner=owner, seq__gt=since).order_by('seq')[:limit + 1])
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {}
+    for change in changes:
+        latest[change.kind, change.item_id] = change
+    return sorted(latest.values(), key=lambda change: change.seq), more, \
+        changes[-1].seq if changes else since
+
+
+def drop_superseded(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deletes up to `batch_size` entries that a later entry for the same
+    item supersedes. Returns the number deleted.
+    """
+    later = Change.objects.filter(owner_id=OuterRef('owner_id'), kind=OuterRef('kind'),
+                                  item_id=OuterRef('item_id'), seq__gt=OuterRef('seq'))
+    ids = list(Change.objects.annotate(superseded=Exists(later)).filter(superseded=True)
+               .values_list('id', flat=True)[:batch_size])
+    if ids:
+        Change.objects.filter(id__in=ids)._raw_delete(Change.objects.db)
+    return len(ids)
+
+
+def drop_expired(retention, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deletes up to `batch_size` entries older than `retention` seconds,
+    raising their owners' journal floor past them. Returns the number
+    deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    batch = list(Change.objects.filter(created__lt=cutoff).order_by('id')
+                 .values_list('id', 'owner_id', 'seq')[:batch_size])
+    if not batch:
+        return 0
+
+    floors = {}
+    for change_id, owner_id, seq in batch:
+        floors[owner_id] = max(seq, floors.get(owner_id, 0))
+
+    with transaction.atomic():
+        for owner_id, floor in floors.items():
+            StorageUser.objects.filter(pk=owner_id, journal_floor__lt=floor).update(journal_floor=floor)
+        Change.objects.filter(id__in=[change_id for change_id, owner_id, seq in batch]) \
+            ._raw_delete(Change.objects.db)
+    return len(batch)
+
+
+def compact_changes(retention=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Compacts every user's journal, see above. Returns the number of
+    (superseded, expired) entries deleted.
+    """
+    if retention is None:
+        retention = get_changes_retention()
+
+    superseded = expired = 0
+    while True:
+        count = drop_superseded(batch_size)
+        superseded += count
+        if not count:
+            break
+    while True:
+        count = drop_expired(retention, batch_size)
+        expired += count
+        if not count:
+            break
+    return superseded, expired
+
+
+def get_journal_floor(owner):
+    return StorageUser.objects.filter(pk=owner.pk).values_list('journal_floor', flat=True).get()
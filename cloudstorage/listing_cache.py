@@ -0,0 +1,92 @@
+"""
+Response cache and conditional GET for the listing endpoints.
+
+A listing is identified by what it lists plus the version of that (see
+versions.py) and the query string, eg. ('files', folder id, created,
+version), the timestamp telling apart rows that reuse a deleted row's id.
+The ETag is a digest of that identity, so:
+
+ - a client sending it back in If-None-Match gets a bare 304 as long as
+   nothing changed, without the listing being queried or serialized
+ - otherwise the serialized page is looked up in the LISTING_CACHE_ALIAS
+   cache under the same ETag, and only built on a miss
+
+Any change bumps the version, which moves the listing to a new ETag and
+cache key; stale entries are never served and simply age out after
+LISTING_CACHE_TTL seconds.
+
+Listings carry more than the rows, so the identity has two more parts:
+
+ - the scheme and host, which the absolute URLs in the listing are built
+   from
+ - on storage that signs its URLs (S3 with querystring auth), the current
+   window of half the signature lifetime. The ETag moves on with it, so
+   neither a client getting 304s nor the cached body ever holds on to URLs
+   signed more than half their lifetime ago.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+from cloudstorage.storage import get_file_storage, is_s3_storage
+
+DEFAULT_LISTING_CACHE_TTL = 5 * 60
+
+CACHE_PREFIX = 'cloudstorage.listing:'
+
+
+def get_listing_cache():
+    return caches[getattr(settings, 'LISTING_CACHE_ALIAS', 'default')]
+
+
+def get_url_lifetime():
+    """
+    Returns how many seconds the file URLs in listings stay valid, None if
+    they don't expire
+    """
+    storage = get_file_storage()
+    if is_s3_storage(storage) and storage.querystring_auth:
+        return storage.querystring_expire
+    return None
+
+
+def get_url_window():
+    lifetime = get_url_lifetime()
+    if lifetime is None:
+        return None
+    return int(time.time() // max(lifetime // 2, 1))
+
+
+def get_listing_etag(request, *identity):
+    """
+    Returns the ETag of a listing version, as requested (the page, its size,
+    the host) and with the URLs as currently signed
+    """
+    query = sorted(request.query_params.lists())
+    origin = request.build_absolute_uri('/')
+    digest = hashlib.sha1(repr((identity, query, origin, get_url_window())).encode('utf-8')).hexdigest()
+    return quote_etag(digest)
+
+
+def cached_listing(request, identity, build):
+    """
+    Returns the listing response for `identity`: a 304 if the client has it
+    already, the cached data if another request built it, or else the data
+    `build()` returns
+    """
+    etag = get_listing_etag(request, *identity)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return Response(status=304, headers={'ETag': etag})
+
+    cache = get_listing_cache()
+    data = cache.get(CACHE_PREFIX + etag)
+    if data is None:
+        data = build()
+        cache.set(CACHE_PREFIX + etag, data,
+                  getattr(settings, 'LISTING_CACHE_TTL', DEFAULT_LISTING_CACHE_TTL))
+
+    return Response(data, headers={'ETag': etag})
@@ -0,0 +1,97 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from cloudstorage.hierarchy import HIERARCHIES, get_hierarchy
+from cloudstorage.models import Folder, StorageUser
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compares folder moves and subtree reads under each FOLDER_HIERARCHY engine ' \
+           'on a generated tree. Everything it creates is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folders', type=int, default=5000,
+                            help='Number of folders in the generated tree')
+        parser.add_argument('--fanout', type=int, default=10,
+                            help='Child folders per folder')
+        parser.add_argument('--moves', type=int, default=20,
+                            help='Number of moves to time')
+        parser.add_argument('--engine', action='append', choices=sorted(HIERARCHIES),
+                            help='Engine to benchmark, can be repeated (default: all)')
+
+    def handle(self, *args, **options):
+        for name in options['engine'] or sorted(HIERARCHIES):
+            with override_settings(FOLDER_HIERARCHY=name):
+                try:
+                    with transaction.atomic():
+                        self.benchmark(name, options['folders'], options['fanout'], options['moves'])
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    def benchmark(self, name, size, fanout, moves):
+        user = StorageUser(email='benchmark-{}@example.com'.format(uuid.uuid4().hex),
+                           first_name='benchmark', last_name='benchmark')
+        user.save()
+        root = Folder.objects.get(owner=user)
+
+        started = time.perf_counter()
+        # delaying MPTT updates makes building the tree bearable, it's the
+        # moves we want to time
+        with Folder.objects.delay_mptt_updates():
+            tops = self.build(root, user, size, fanout)
+        build_time = time.perf_counter() - started
+
+        # move the first top level folder's first child under the last top
+        # level folder and back again, so the tree ends up where it started
+        moved = Folder.objects.filter(parent=tops[0]).order_by('id').first()
+        targets = [tops[-1], tops[0]]
+        moved_size = get_hierarchy().get_descendants(moved, include_self=True).count()
+
+        started = time.perf_counter()
+        for i in range(moves):
+            folder = Folder.objects.get(pk=moved.pk)
+            target = Folder.objects.get(pk=targets[i % 2].pk)
+            folder.move_to(target)
+            folder.save()
+        move_time = (time.perf_counter() - started) / max(moves, 1)
+
+        root = Folder.objects.get(pk=root.pk)
+        started = time.perf_counter()
+        count = len(list(get_hierarchy().get_descendants(root, include_self=True).values_list('id')))
+        read_time = time.perf_counter() - started
+
+        self.stdout.write(
+            '{}: built {} folders in {:.2f}s, moving {} folders took {:.1f}ms on average, '
+            'reading the whole tree took {:.1f}ms'.format(
+                name, count, build_time, moved_size, move_time * 1000, read_time * 1000))
+
+    def build(self, root, user, size, fanout):
+        """
+        Creates a tree of about `size` folders, breadth first, and returns
+        the folders directly under the root
+        """
+        level = [root]
+        tops = None
+        count = 1
+        while count < size:
+            next_level = []
+            for parent in level:
+                for i in range(fanout):
+                    if count >= size:
+                        break
+                    folder = Folder(name='folder {}'.format(count), parent=parent, owner=user)
+                    folder.save()
+                    next_level.append(folder)
+                    count += 1
+            tops = tops or next_level
+            level = next_level
+        return tops
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from cloudstorage.journal import DEFAULT_BATCH_SIZE, compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Drops change journal entries superseded by later ones, and entries older than ' \
+           'CHANGES_RETENTION, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Number of rows deleted per query')
+        parser.add_argument('--retention', type=int, default=None,
+                            help='Drop entries older than this many seconds instead of CHANGES_RETENTION')
+
+    def handle(self, *args, **options):
+        superseded, expired = compact_changes(retention=options['retention'], batch_size=options['batch_size'])
+        self.stdout.write('Purged {} superseded and {} expired change(s)'.format(superseded, expired))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from cloudstorage.tokens import DEFAULT_BATCH_SIZE, purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired API tokens, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Number of tokens deleted per query')
+
+    def handle(self, *args, **options):
+        count = purge_expired_tokens(batch_size=options['batch_size'])
+        self.stdout.write('Purged {} expired token(s)'.format(count))
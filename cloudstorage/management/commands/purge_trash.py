@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cloudstorage.deletion import DEFAULT_BATCH_SIZE, purge_trash
+
+
+class Command(BaseCommand):
+    help = 'Deletes the rows and stored content of files and folders that have been in ' \
+           'the trash for longer than TRASH_RETENTION, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Number of rows deleted per query')
+        parser.add_argument('--retention', type=int, default=None,
+                            help='Purge items deleted more than this many seconds ago '
+                                 'instead of TRASH_RETENTION')
+
+    def handle(self, *args, **options):
+        folders, files = purge_trash(retention=options['retention'], batch_size=options['batch_size'])
+        self.stdout.write('Purged {} folder(s) and {} file(s) from the trash'.format(folders, files))
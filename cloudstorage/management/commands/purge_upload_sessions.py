@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cloudstorage.models import UploadSession
+from cloudstorage.upload_sessions import abort_session, get_session_ttl
+
+
+class Command(BaseCommand):
+    help = 'Aborts upload sessions older than UPLOAD_SESSION_TTL and frees their chunks'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=get_session_ttl())
+        sessions = UploadSession.objects.filter(created__lt=cutoff)
+
+        count = 0
+        for session in sessions.iterator():
+            abort_session(session)
+            count += 1
+
+        self.stdout.write('Purged {} upload session(s)'.format(count))
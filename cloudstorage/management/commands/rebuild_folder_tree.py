@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cloudstorage.hierarchy import build_paths
+from cloudstorage.models import Folder
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the MPTT columns of every folder from its parent link, then the ' \
+           'materialized paths from those. Needed before switching FOLDER_HIERARCHY ' \
+           'from "path" back to "mptt".'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Folder.objects.rebuild()
+            build_paths(Folder)
+
+        self.stdout.write('Rebuilt {} folder(s)'.format(Folder.objects.count()))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from cloudstorage.models import File, Folder, StorageUser
+from cloudstorage.usage import rebuild_usage
+from cloudstorage.versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the storage usage counters of users and folders from their files, ' \
+           'one user per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only repair this user id, can be repeated')
+
+    def handle(self, *args, **options):
+        owner_ids = options['users'] or StorageUser.objects.values_list('id', flat=True).iterator()
+
+        count = 0
+        for owner_id in owner_ids:
+            rebuild_usage(StorageUser, Folder, File, owner_id)
+            # the folder listings show the counters
+            bump_versions(owner_id)
+            count += 1
+
+        self.stdout.write('Repaired the usage of {} user(s)'.format(count))
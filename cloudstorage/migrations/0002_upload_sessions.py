@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:40
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('etag', models.CharField(blank=True, max_length=250)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=250)),
+                ('key', models.CharField(max_length=500)),
+                ('size', models.BigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('mime_type', models.CharField(max_length=50)),
+                ('s3_upload_id', models.CharField(blank=True, max_length=250)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('folder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='cloudstorage.Folder')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='size',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddField(
+            model_name='uploadchunk',
+            name='session',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='cloudstorage.UploadSession'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='uploadchunk',
+            unique_together=set([('session', 'number')]),
+        ),
+    ]
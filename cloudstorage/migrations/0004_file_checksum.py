@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def copy_blob_digests(apps, schema_editor):
+    """
+    Deduplicated files already have their digest on the blob
+    """
+    File = apps.get_model('cloudstorage', 'File')
+    Blob = apps.get_model('cloudstorage', 'Blob')
+    for blob in Blob.objects.all().iterator():
+        File.objects.filter(blob=blob).update(checksum=blob.digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0003_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(copy_blob_digests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0004_file_checksum'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='id',
+            field=models.AutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='folder',
+            name='id',
+            field=models.AutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['folder', 'modified', 'id'], name='cloudstorag_folder__24cbc1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'modified', 'id'], name='cloudstorag_owner_i_5d869f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['owner', 'name', 'id'], name='cloudstorag_owner_i_18d99d_idx'),
+        ),
+    ]
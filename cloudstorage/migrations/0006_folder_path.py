@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from cloudstorage.hierarchy import build_paths
+
+
+def fill_paths(apps, schema_editor):
+    """
+    Derives each folder's materialized path from the MPTT columns
+    """
+    build_paths(apps.get_model('cloudstorage', 'Folder'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0005_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=1000),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
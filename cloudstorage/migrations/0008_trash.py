@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# (name, table, columns, condition)
+TRASH_INDEXES = [
+    # keyset pagination of the live files, see FilePagination
+    ('cloudstorage_file_live_folder_idx', 'cloudstorage_file', 'folder_id, modified, id',
+     'deleted_at IS NULL'),
+    ('cloudstorage_file_live_owner_idx', 'cloudstorage_file', 'owner_id, modified, id',
+     'deleted_at IS NULL'),
+    # listing a user's trash and finding what purge_trash is due to remove
+    ('cloudstorage_folder_trash_idx', 'cloudstorage_folder', 'owner_id, deleted_at',
+     'deleted_at IS NOT NULL'),
+    ('cloudstorage_file_trash_idx', 'cloudstorage_file', 'owner_id, deleted_at',
+     'deleted_at IS NOT NULL'),
+]
+
+
+def create_trash_indexes(apps, schema_editor):
+    """
+    Only the few trashed rows go into the trash indexes, and none of them
+    into the pagination indexes. Databases without partial indexes (MySQL)
+    get plain ones.
+    """
+    partial = schema_editor.connection.vendor in ('postgresql', 'sqlite')
+    for name, table, columns, condition in TRASH_INDEXES:
+        sql = 'CREATE INDEX {} ON {} ({})'.format(name, table, columns)
+        if partial:
+            sql += ' WHERE {}'.format(condition)
+        schema_editor.execute(sql)
+
+
+def drop_trash_indexes(apps, schema_editor):
+    """
+    Drops the indexes created by create_trash_indexes
+    """
+    for name, table, columns, condition in TRASH_INDEXES:
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute('DROP INDEX {} ON {}'.format(name, table))
+        else:
+            schema_editor.execute('DROP INDEX {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0007_folder_deleted_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='file',
+            name='cloudstorag_folder__24cbc1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='cloudstorag_owner_i_5d869f_idx',
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='folder',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_trash_indexes, drop_trash_indexes),
+    ]
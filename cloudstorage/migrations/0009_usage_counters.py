@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from cloudstorage.usage import rebuild_usage
+
+
+def fill_usage(apps, schema_editor):
+    """
+    Counts the files already stored by every user
+    """
+    StorageUser = apps.get_model('cloudstorage', 'StorageUser')
+    Folder = apps.get_model('cloudstorage', 'Folder')
+    File = apps.get_model('cloudstorage', 'File')
+    for owner_id in StorageUser.objects.values_list('id', flat=True):
+        rebuild_usage(StorageUser, Folder, File, owner_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0008_trash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='file_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='size',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='storageuser',
+            name='file_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='storageuser',
+            name='storage_used',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0009_usage_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageuser',
+            name='quota',
+            field=models.BigIntegerField(blank=True, help_text='Bytes the user may store, 0 for no limit. Leave empty to use DEFAULT_USER_QUOTA.', null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:07
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from cloudstorage.tokens import get_expiry
+
+
+def copy_tokens(apps, schema_editor):
+    """
+    Keeps the devices signed in with a single-session token signed in
+    """
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('cloudstorage', 'AuthToken')
+    expires = get_expiry()
+    AuthToken.objects.bulk_create(
+        AuthToken(key=token.key, user_id=token.user_id, expires=expires)
+        for token in Token.objects.all().iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0010_user_quota'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('device', models.CharField(blank=True, max_length=100)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='authtoken',
+            index=models.Index(fields=['user', 'device'], name='cloudstorag_user_id_ef92ac_idx'),
+        ),
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
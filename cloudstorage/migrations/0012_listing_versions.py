@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0011_auth_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='storageuser',
+            name='folders_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:22
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0012_listing_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('file', 'File'), ('folder', 'Folder')], max_length=6)),
+                ('item_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('move', 'Moved'), ('delete', 'Deleted'), ('restore', 'Restored')], max_length=7)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='storageuser',
+            name='journal_floor',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='storageuser',
+            name='journal_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['owner', 'kind', 'item_id', 'seq'], name='cloudstorag_owner_i_0a8d5f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='change',
+            unique_together=set([('owner', 'seq')]),
+        ),
+    ]
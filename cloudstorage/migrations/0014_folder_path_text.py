@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# MySQL can't index a TEXT column whole, only a prefix of it. 255
+# characters hold the paths of folders up to 24 levels deep, below that
+# the prefix still narrows a subtree lookup down to the rows sharing it.
+MYSQL_PATH_PREFIX = 255
+
+PATH_INDEXES = {
+    'postgresql': [
+        ('cloudstorage_folder_path_idx', 'path'),
+        # path__startswith is a LIKE 'prefix%', which needs the pattern ops
+        # outside of the C locale
+        ('cloudstorage_folder_path_like_idx', 'path text_pattern_ops'),
+    ],
+    'mysql': [
+        ('cloudstorage_folder_path_idx', 'path({})'.format(MYSQL_PATH_PREFIX)),
+    ],
+}
+
+
+def get_path_indexes(schema_editor):
+    return PATH_INDEXES.get(schema_editor.connection.vendor, [('cloudstorage_folder_path_idx', 'path')])
+
+
+def create_path_indexes(apps, schema_editor):
+    """
+    Indexes the path the way each database can index a TEXT column
+    """
+    for name, columns in get_path_indexes(schema_editor):
+        schema_editor.execute('CREATE INDEX {} ON cloudstorage_folder ({})'.format(name, columns))
+
+
+def drop_path_indexes(apps, schema_editor):
+    """
+    Drops the indexes created by create_path_indexes
+    """
+    for name, columns in get_path_indexes(schema_editor):
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute('DROP INDEX {} ON cloudstorage_folder'.format(name))
+        else:
+            schema_editor.execute('DROP INDEX {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0013_change_journal'),
+    ]
+
+    operations = [
+        # drops the index from 0006 before the column turns into TEXT
+        migrations.AlterField(
+            model_name='folder',
+            name='path',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(create_path_indexes, drop_path_indexes),
+    ]
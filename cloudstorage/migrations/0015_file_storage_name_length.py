@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 10:07
+from __future__ import unicode_literals
+
+import cloudstorage.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0014_folder_path_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(max_length=500, upload_to=cloudstorage.models.get_file_path),
+        ),
+    ]
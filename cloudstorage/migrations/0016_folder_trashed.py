@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 10:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# keyset pagination of the live folders, see FolderPagination
+LIVE_INDEX = ('cloudstorage_folder_live_owner_idx', 'cloudstorage_folder', 'owner_id, name, id', 'NOT trashed')
+
+
+def flag_trashed_folders(apps, schema_editor):
+    """
+    Flags the subtrees of the folders already in the trash. The path is
+    kept up to date under both hierarchy engines, so it finds them either way.
+    """
+    Folder = apps.get_model('cloudstorage', 'Folder')
+    for path in Folder.objects.filter(deleted_at__isnull=False).values_list('path', flat=True):
+        Folder.objects.filter(path__startswith=path).update(trashed=True)
+
+
+def create_live_index(apps, schema_editor):
+    """
+    Leaves the trash out of the pagination index, like migration 0008 does
+    for files. Databases without partial indexes (MySQL) get a plain one.
+    """
+    name, table, columns, condition = LIVE_INDEX
+    sql = 'CREATE INDEX {} ON {} ({})'.format(name, table, columns)
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        sql += ' WHERE {}'.format(condition)
+    schema_editor.execute(sql)
+
+
+def drop_live_index(apps, schema_editor):
+    name, table, columns, condition = LIVE_INDEX
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX {} ON {}'.format(name, table))
+    else:
+        schema_editor.execute('DROP INDEX {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloudstorage', '0015_file_storage_name_length'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='folder',
+            name='cloudstorag_owner_i_18d99d_idx',
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='trashed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_trashed_folders, migrations.RunPython.noop),
+        migrations.RunPython(create_live_index, drop_live_index),
+    ]
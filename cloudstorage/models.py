@@ -1,16 +1,32 @@
 import mimetypes
+import uuid
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from mptt.models import MPTTModel, TreeForeignKey
 
+from cloudstorage.hierarchy import check_depth, get_hierarchy, update_path
+
+# maintained with F() updates, see usage.py, versions.py and journal.py
+COUNTER_FIELDS = ('storage_used', 'size', 'file_count', 'version', 'folders_version',
+                  'journal_seq', 'journal_floor')
+
 # User = get_user_model()
 
 
+def get_save_fields(instance, excluded):
+    """
+    Returns the fields a full save() of an existing row should write, so
+    counters maintained with F() updates aren't overwritten by stale copies
+    """
+    return [field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in excluded]
+
+
 class MyUserManager(BaseUserManager):
 
     def create_user(self, email, first_name, last_name, password=None):
@@ -58,6 +74,18 @@ class StorageUser(PermissionsMixin, AbstractBaseUser):
         help_text='Designates whether the user can log into this admin site.',
     )
     date_joined = models.DateTimeField(default=timezone.now)
+    # usage counters, including the trash, see usage.py
+    storage_used = models.BigIntegerField(default=0, editable=False)
+    file_count = models.IntegerField(default=0, editable=False)
+    # see versions.py
+    folders_version = models.PositiveIntegerField(default=0, editable=False)
+    # last sequence number handed out in the change journal, and the last
+    # one compacted away, see journal.py
+    journal_seq = models.BigIntegerField(default=0, editable=False)
+    journal_floor = models.BigIntegerField(default=0, editable=False)
+    quota = models.BigIntegerField(null=True, blank=True,
+                                   help_text='Bytes the user may store, 0 for no limit. '
+                                             'Leave empty to use DEFAULT_USER_QUOTA.')
 
     objects = MyUserManager()
 
@@ -77,6 +105,8 @@ class StorageUser(PermissionsMixin, AbstractBaseUser):
         # created on their account
         is_new_user = False if self.id else True
 
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = get_save_fields(self, COUNTER_FIELDS)
         super().save(*args, **kwargs)
 
         # create the root folder
@@ -90,7 +120,34 @@ class StorageUser(PermissionsMixin, AbstractBaseUser):
         return self.email
 
 
+class AuthToken(models.Model):
+    """
+    An API token for one signed in device. A user can hold any number of
+    them, each expiring on its own unless refreshed, see tokens.py.
+    """
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='auth_tokens')
+    device = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            # finding a device's token again on login
+            models.Index(fields=['user', 'device']),
+        ]
+
+    def __str__(self):
+        return self.key
+
+    def is_expired(self):
+        return self.expires <= timezone.now()
+
+
 class Folder(MPTTModel):
+    # declared so the pagination index below can name it, Django only adds
+    # the implicit id after Meta.indexes are set up
+    id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=250)
     parent = TreeForeignKey('self', null=True,
                             blank=True, related_name='children',
@@ -98,32 +155,257 @@ class Folder(MPTTModel):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL)
+    # materialized path, kept alongside the MPTT columns (see hierarchy.py),
+    # indexed the way each database can index TEXT, see migration 0014
+    path = models.TextField(blank=True, editable=False)
+    # set when the folder is moved to the trash, but not on the folders
+    # below it, see deletion.py
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # set on a deleted folder and everything below it
+    trashed = models.BooleanField(default=False, editable=False)
+    # usage counters for the whole subtree, leaving out the trash, see usage.py
+    size = models.BigIntegerField(default=0, editable=False)
+    file_count = models.IntegerField(default=0, editable=False)
+    version = models.PositiveIntegerField(default=0, editable=False)  # of the file listing, see versions.py
+
+    # The keyset pagination index for /api/folders/, on (owner, name, id),
+    # is a partial index that leaves out the trash, see migration 0016
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from cloudstorage.journal import record_change
+        from cloudstorage.versions import bump_versions
+
+        hierarchy = get_hierarchy()
+        adding = self._state.adding
+        moved = self.pk is not None and \
+            self._mptt_cached_fields.get('parent') != self.parent_id
+        if not self._state.adding and 'update_fields' not in kwargs:
+            # trashed is maintained with subtree updates, see deletion.py
+            kwargs['update_fields'] = get_save_fields(self, COUNTER_FIELDS + ('trashed',))
+
+        with transaction.atomic():
+            with hierarchy.tree_updates():
+                super().save(*args, **kwargs)
+
+            if moved or not self.path:
+                update_path(self)
+            bump_versions(self.owner_id)
+            action = Change.CREATE if adding else Change.MOVE if moved else Change.UPDATE
+            record_change(self.owner_id, Change.KIND_FOLDER, action, self.pk)
+
+    def delete(self, *args, **kwargs):
+        from cloudstorage.journal import record_change
+        from cloudstorage.usage import remove_folder_usage
+        from cloudstorage.versions import bump_versions
+
+        with transaction.atomic():
+            remove_folder_usage(self)
+            record_change(self.owner_id, Change.KIND_FOLDER, Change.DELETE, self.pk)
+            get_hierarchy().delete(self)
+            bump_versions(self.owner_id)
+
+    def move_to(self, target, position='first-child'):
+        """
+        Moves the folder under `target` using the configured hierarchy engine
+        """
+        from cloudstorage.journal import record_change
+        from cloudstorage.versions import bump_versions
+
+        with transaction.atomic():
+            if target is not None:
+                check_depth(target, self)
+            get_hierarchy().move(self, target, position)
+            bump_versions(self.owner_id)
+            record_change(self.owner_id, Change.KIND_FOLDER, Change.MOVE, self.pk)
+
 
 def get_file_path(instance, filename):
     return 'user_{0}/{1}'.format(instance.owner.id, filename)
 
 
+def get_upload_path(owner, filename):
+    """
+    Returns a storage name for content the client sends straight to
+    storage, outside of FileField.save(). Storages don't make those names
+    unique (S3 just overwrites, see AWS_S3_FILE_OVERWRITE), so each upload
+    gets a directory of its own.
+    """
+    return 'user_{0}/{1}/{2}'.format(owner.id, uuid.uuid4().hex, filename)
+
+
+def get_blob_path(instance, filename):
+    # fan out over two directory levels so no directory gets too large
+    return 'blobs/{0}/{1}/{2}'.format(instance.digest[:2], instance.digest[2:4], instance.digest)
+
+
+class Blob(models.Model):
+    """
+    A piece of stored content, addressed by its SHA-256 digest. Files with
+    identical content share one blob, which is deleted from storage once
+    the last file referencing it is gone.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    file = models.FileField(upload_to=get_blob_path, max_length=200)
+    refcount = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
+
+
 class File(models.Model):
+    id = models.AutoField(primary_key=True)  # see Folder.id
     name = models.CharField(max_length=250)
     original_name = models.CharField(max_length=250)
-    size = models.PositiveIntegerField()
+    size = models.BigIntegerField()
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 hex digest
     mime_type = models.CharField(max_length=50)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
     folder = models.ForeignKey(Folder, related_name='files') # get with Folder.files.all()
-    file = models.FileField(upload_to=get_file_path)
+    file = models.FileField(upload_to=get_file_path, max_length=500)  # see get_upload_path
+    blob = models.ForeignKey(Blob, null=True, blank=True, related_name='files',
+                             on_delete=models.PROTECT)  # None for files stored before deduplication
     owner = models.ForeignKey(settings.AUTH_USER_MODEL)
+    deleted_at = models.DateTimeField(null=True, blank=True)  # set while in the trash
+
+    # The keyset pagination indexes for /api/folders/:id/files/ and
+    # /api/files/, on (folder, modified, id) and (owner, modified, id), are
+    # partial indexes that leave out the trash, see migration 0008
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from cloudstorage.journal import record_change
+        from cloudstorage.usage import update_file_usage
+        from cloudstorage.versions import bump_versions
+
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = File.objects.select_for_update().filter(pk=self.pk) \
+                    .values('folder_id', 'size', 'deleted_at').first()
+            super().save(*args, **kwargs)
+            update_file_usage(self, old)
+            bump_versions(self.owner_id, [self.folder_id, old and old['folder_id']])
+            record_change(self.owner_id, Change.KIND_FILE, get_file_action(self, old), self.pk)
+
+    def delete(self, *args, **kwargs):
+        from cloudstorage.journal import record_change
+        from cloudstorage.usage import remove_file_usage
+        from cloudstorage.versions import bump_versions
+
+        with transaction.atomic():
+            remove_file_usage(self)
+            bump_versions(self.owner_id, [self.folder_id])
+            record_change(self.owner_id, Change.KIND_FILE, Change.DELETE, self.pk)
+            return super().delete(*args, **kwargs)
+
     def set_mime_type(self):
         mimetype, encoding = mimetypes.guess_type(self.file.name)
         self.mime_type = mimetype
 
     def set_file_size(self):
         self.size = self.file.size
+
+
+def get_file_action(file, old):
+    """
+    Returns what saving a file did, for the change journal. `old` is as
+    File.save() read it.
+    """
+    if old is None:
+        return Change.CREATE
+    if old['deleted_at'] is None and file.deleted_at is not None:
+        return Change.DELETE
+    if old['deleted_at'] is not None and file.deleted_at is None:
+        return Change.RESTORE
+    if old['folder_id'] != file.folder_id:
+        return Change.MOVE
+    return Change.UPDATE
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload. The client PUTs the file in numbered chunks, in any
+    order and in parallel, then completes the session to create the File.
+    Chunks are staged in an S3 multipart upload or, on local storage, written
+    straight into a staging file at their offset.
+    """
+    name = models.CharField(max_length=250)
+    key = models.CharField(max_length=500)  # storage name reserved for the file
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    mime_type = models.CharField(max_length=50)
+    s3_upload_id = models.CharField(max_length=250, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    folder = models.ForeignKey(Folder, related_name='upload_sessions')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def get_chunk_length(self, number):
+        """
+        Returns the number of bytes expected for a chunk, numbered from 1.
+        Every chunk is chunk_size long except possibly the last one.
+        """
+        if number < self.chunk_count:
+            return self.chunk_size
+        return self.size - (self.chunk_count - 1) * self.chunk_size
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, related_name='chunks')
+    number = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    etag = models.CharField(max_length=250, blank=True)  # S3 part ETag
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('session', 'number')
+
+
+class Change(models.Model):
+    """
+    An entry in a user's change journal: a file or folder that was created,
+    changed, moved, deleted or restored, numbered by a per-user sequence,
+    see journal.py
+    """
+    KIND_FILE = 'file'
+    KIND_FOLDER = 'folder'
+    KINDS = ((KIND_FILE, 'File'), (KIND_FOLDER, 'Folder'))
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    MOVE = 'move'
+    DELETE = 'delete'
+    RESTORE = 'restore'
+    ACTIONS = ((CREATE, 'Created'), (UPDATE, 'Updated'), (MOVE, 'Moved'),
+               (DELETE, 'Deleted'), (RESTORE, 'Restored'))
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='changes')
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=6, choices=KINDS)
+    item_id = models.IntegerField()
+    action = models.CharField(max_length=7, choices=ACTIONS)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('owner', 'seq')
+        indexes = [
+            # finding superseded entries when compacting
+            models.Index(fields=['owner', 'kind', 'item_id', 'seq']),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(self.action, self.kind, self.item_id)
@@ -0,0 +1,172 @@
+"""
+Wakes clients long-polling /api/changes/ when their files or folders change.
+
+Instead of asking for changes every few seconds, a sync client passes
+?wait=<seconds> and the request is held until something lands in its
+user's change journal (see journal.py) or the wait runs out. Every journal
+write publishes the user's new sequence number once its transaction has
+committed, and waiting requests compare it with their cursor.
+
+The backend is pluggable, see NOTIFICATION_BACKEND:
+
+ - LocalBackend wakes waiters in the same process only. It is enough for a
+   single worker, and what the tests use.
+ - PollingBackend (the default) also picks up changes made by other
+   processes: one background thread per process reads the sequence numbers
+   of the users with waiting requests every NOTIFICATION_POLL_INTERVAL
+   seconds, with one query however many requests are waiting.
+
+A backend needs publish(owner_id, seq) and wait(owner_id, since, timeout),
+so eg. one on Redis pub/sub can be dropped in later.
+
+Held requests do nothing but wait on a condition, but on sync workers each
+one still takes a whole worker, so run the API on gevent workers, see
+README.md. Waiting requests give their database connection back while
+they wait.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, transaction
+from django.utils.module_loading import import_string
+
+from cloudstorage.models import StorageUser
+
+DEFAULT_NOTIFICATION_BACKEND = 'cloudstorage.notifications.PollingBackend'
+DEFAULT_NOTIFICATION_POLL_INTERVAL = 2
+DEFAULT_CHANGES_MAX_WAIT = 25
+
+
+def get_poll_interval():
+    return getattr(settings, 'NOTIFICATION_POLL_INTERVAL', DEFAULT_NOTIFICATION_POLL_INTERVAL)
+
+
+def get_max_wait():
+    """
+    Returns the most seconds a request to /api/changes/ is held
+    """
+    return getattr(settings, 'CHANGES_MAX_WAIT', DEFAULT_CHANGES_MAX_WAIT)
+
+
+class LocalBackend(object):
+    """
+    In-process pub/sub: a condition per user with waiting requests, and the
+    latest sequence number published for each user
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seqs = {}
+        self.conditions = {}  # owner id -> (condition, number of waiters)
+
+    def publish(self, owner_id, seq):
+        with self.lock:
+            if seq > self.seqs.get(owner_id, 0):
+                self.seqs[owner_id] = seq
+            if owner_id in self.conditions:
+                self.conditions[owner_id][0].notify_all()
+
+    def wait(self, owner_id, since, timeout):
+        """
+        Waits up to `timeout` seconds for a change past `since`. Returns
+        whether there was one.
+        """
+        with self.lock:
+            condition, waiters = self.conditions.get(owner_id) or (threading.Condition(self.lock), 0)
+            self.conditions[owner_id] = condition, waiters + 1
+            try:
+                return condition.wait_for(lambda: self.seqs.get(owner_id, 0) > since, timeout)
+            finally:
+                condition, waiters = self.conditions[owner_id]
+                if waiters > 1:
+                    self.conditions[owner_id] = condition, waiters - 1
+                else:
+                    del self.conditions[owner_id]
+
+    def get_waiting(self):
+        """
+        Returns the ids of the users with waiting requests
+        """
+        with self.lock:
+            return list(self.conditions)
+
+
+class PollingBackend(LocalBackend):
+    """
+    LocalBackend that also polls the database for changes made by other
+    processes, on a background thread started by the first wait
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.thread = None
+
+    def wait(self, owner_id, since, timeout):
+        self.start()
+        return super().wait(owner_id, since, timeout)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(get_poll_interval())
+            try:
+                self.poll(self.get_waiting())
+            except Exception:
+                # eg. the database going away, try again next time
+                pass
+            finally:
+                close_old_connections()
+
+    def poll(self, owner_ids):
+        """
+        Publishes the current sequence numbers of `owner_ids`
+        """
+        if not owner_ids:
+            return
+        for owner_id, seq in StorageUser.objects.filter(pk__in=owner_ids).values_list('pk', 'journal_seq'):
+            self.publish(owner_id, seq)
+
+
+backends = {}
+backends_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the backend selected by NOTIFICATION_BACKEND, one per process
+    """
+    path = getattr(settings, 'NOTIFICATION_BACKEND', DEFAULT_NOTIFICATION_BACKEND)
+    with backends_lock:
+        if path not in backends:
+            try:
+                backends[path] = import_string(path)()
+            except ImportError:
+                raise ImproperlyConfigured('NOTIFICATION_BACKEND {} could not be imported'.format(path))
+        return backends[path]
+
+
+def notify_changes(owner_id, seq):
+    """
+    Publishes `owner_id`'s new journal sequence number once the current
+    transaction commits, right away outside of one
+    """
+    backend = get_backend()
+    transaction.on_commit(lambda: backend.publish(owner_id, seq))
+
+
+def wait_for_changes(owner_id, since, timeout):
+    """
+    Holds the request up to `timeout` seconds for a change to `owner_id`'s
+    files or folders past `since`. Returns whether there was one.
+    """
+    # idle requests shouldn't hold on to a connection each
+    if not connection.in_atomic_block:
+        connection.close()
+    return get_backend().wait(owner_id, since, timeout)
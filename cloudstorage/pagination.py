@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+DRF's CursorPagination only remembers the first ordering field and falls
+back to an OFFSET for rows that tie on it, so paging through thousands of
+files modified in the same second, or folders sharing a name, still gets
+slower the deeper you go. Here the cursor holds the values of every
+ordering field of the last row on the page, and the next page is a plain
+"rows after this tuple" filter, which the composite indexes on Folder and
+File turn into an index range scan no matter how deep the page is.
+"""
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a queryset by `ordering`, whose last field must be unique
+    (usually 'id') so that every row has a distinct position.
+    """
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self.flip(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(self.get_position_filter(ordering, self.position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # one extra row tells us whether there is anything past this page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+        # an empty page reached backwards, go forward from where we started
+        return self.encode_cursor(self.position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+        return self.encode_cursor(self.position, reverse=True)
+
+    def get_position(self, instance):
+        """
+        Returns the values of the ordering fields for a row, as stored in
+        the cursor
+        """
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            # keep microseconds, the JSON encoder would cut them off
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def get_position_filter(self, ordering, position):
+        """
+        Returns the filter for rows that come after `position` in
+        `ordering`, ie. (a, b, c) > (x, y, z) spelled out as
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        """
+        clauses = []
+        for i, field in enumerate(ordering):
+            lookups = {f.lstrip('-'): value for f, value in zip(ordering[:i], position)}
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            lookups[field.lstrip('-') + lookup] = position[i]
+            clauses.append(Q(**lookups))
+
+        # redundant, but bounds the leading index column so the database
+        # doesn't have to work out the range from the OR on its own
+        first = ordering[0]
+        bound = Q(**{first.lstrip('-') + ('__lte' if first.startswith('-') else '__gte'): position[0]})
+
+        return bound & reduce(or_, clauses)
+
+    def decode_cursor(self, request):
+        """
+        Returns the (position, reverse) encoded in the request's cursor, or
+        (None, False) for the first page
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+
+class FolderPagination(KeysetPagination):
+    """
+    Folders in alphabetical order, backed by the (owner, name, id) index
+    """
+    ordering = ('name', 'id')
+
+
+class FilePagination(KeysetPagination):
+    """
+    Most recently modified files first, backed by the (folder, modified, id)
+    and (owner, modified, id) indexes
+    """
+    ordering = ('-modified', '-id')
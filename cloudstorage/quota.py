@@ -0,0 +1,68 @@
+"""
+Per-user storage quotas.
+
+Every user may store up to their own `quota` bytes or, when that is
+unset, DEFAULT_USER_QUOTA bytes (0 means no limit), checked against the
+usage counters from usage.py, trash included until it is purged or the
+user empties it (DELETE /api/trash/).
+
+Uploads through the API are turned away as early as possible: first on
+the declared Content-Length, before any of the body is read, then by
+QuotaUploadHandler while the body streams in, and finally on the actual
+size before the content is stored. Uploads racing each other can still
+overshoot by a file or so, the counters catch up as soon as they land.
+
+Direct uploads and upload sessions are only declared up front and land
+later, so nothing is reserved when they start. They are checked again
+when they complete, on their actual size and with the user's row locked
+(see lock=True) in the transaction that counts the new file, so any number
+of them opened under the quota can't complete past it together.
+"""
+from django.conf import settings
+
+from cloudstorage.models import StorageUser
+from cloudstorage.uploads import UploadError
+
+DEFAULT_USER_QUOTA = 0
+
+# Content-Length counts the multipart framing around the file too, give
+# the up front check a little room for it
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class QuotaExceeded(UploadError):
+    """
+    Raised when storing a file would take a user over their quota
+    """
+
+
+def get_default_quota():
+    return getattr(settings, 'DEFAULT_USER_QUOTA', DEFAULT_USER_QUOTA)
+
+
+def get_remaining_quota(user, lock=False):
+    """
+    Returns how many more bytes the user may store, None if there is no
+    limit. Reads fresh counters, the user object may have been loaded
+    before other uploads landed. With `lock`, holds the user's row until
+    the end of the transaction.
+    """
+    users = StorageUser.objects.filter(pk=user.pk)
+    if lock:
+        users = users.select_for_update()
+    storage_used, quota = users.values_list('storage_used', 'quota').get()
+
+    if quota is None:
+        quota = get_default_quota()
+    if not quota:
+        return None
+    return max(quota - storage_used, 0)
+
+
+def check_quota(user, size, lock=False):
+    """
+    Raises QuotaExceeded unless the user has room for `size` more bytes
+    """
+    remaining = get_remaining_quota(user, lock=lock)
+    if remaining is not None and size > remaining:
+        raise QuotaExceeded('Storage quota exceeded, {} bytes left'.format(remaining))
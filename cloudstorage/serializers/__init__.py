@@ -3,3 +3,4 @@ from .folder import FolderSerializer
 from .file import FileSerializer
 from .user import UserSerializer
 from .profile import UserProfileSerializer
+from .upload import UploadSerializer, UploadCompleteSerializer, UploadSessionSerializer
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.core import exceptions
+from cloudstorage.blobs import acquire_blob, hash_content
 from cloudstorage.models import File
 
 
@@ -9,8 +10,8 @@ class FileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = File
-        fields = ('id', 'name', 'original_name', 'size', 'mime_type', 'created', 'modified', 'folder', 'file', 'owner')
-        read_only_fields = ('id', 'original_name', 'size', 'mime_type', 'created', 'modified', 'folder', 'owner')
+        fields = ('id', 'name', 'original_name', 'size', 'checksum', 'mime_type', 'created', 'modified', 'folder', 'file', 'owner', 'deleted_at')
+        read_only_fields = ('id', 'original_name', 'size', 'checksum', 'mime_type', 'created', 'modified', 'folder', 'owner', 'deleted_at')
 
     #TODO: get file size
     def create(self, validated_data):
@@ -27,6 +28,15 @@ class FileSerializer(serializers.ModelSerializer):
         file.owner = validated_data['owner']
         file.set_mime_type()
         file.set_file_size()
+
+        # the upload handlers hash the content as it streams in, only files
+        # that didn't come through them (eg. in tests) need another read
+        upload = validated_data['file']
+        file.checksum = getattr(upload, 'checksum', None) or hash_content(upload)
+
+        # store the content once per distinct digest, shared across users
+        file.blob = acquire_blob(upload, digest=file.checksum)
+        file.file = file.blob.file.name
         file.save()
         return file
 
@@ -1,13 +1,23 @@
+from mptt.exceptions import InvalidMove
 from rest_framework import serializers
 
+from cloudstorage.hierarchy import HIERARCHY_PATH, check_depth, get_hierarchy
 from cloudstorage.models import Folder
 
 
 class FolderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Folder
-        fields = ('name', 'parent', 'id', 'owner', 'created', 'modified', 'tree_id')
-        read_only_fields = ('id', 'owner', 'created', 'modified', 'tree_id')
+        fields = ('name', 'parent', 'id', 'owner', 'created', 'modified', 'tree_id', 'deleted_at',
+                  'size', 'file_count')
+        read_only_fields = ('id', 'owner', 'created', 'modified', 'tree_id', 'deleted_at', 'size', 'file_count')
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # not maintained under the path engine, see hierarchy.py
+        if get_hierarchy().name == HIERARCHY_PATH:
+            data.pop('tree_id', None)
+        return data
 
     def validate_parent(self, value):
         """
@@ -23,6 +33,15 @@ class FolderSerializer(serializers.ModelSerializer):
         # ensure new parent is owned by requesting user
         if value.owner != request.user:
             raise serializers.ValidationError('Not your folder')
+
+        # and hasn't been deleted
+        if value.trashed:
+            raise serializers.ValidationError('Folder has been deleted')
+
+        try:
+            check_depth(value, self.instance)
+        except InvalidMove as e:
+            raise serializers.ValidationError(str(e))
         return value
 
     def create(self, validated_data):
@@ -7,6 +7,8 @@ class UserProfileSerializer(serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     email = serializers.EmailField(read_only=True)
     date_joined = serializers.DateTimeField(read_only=True)
+    storage_used = serializers.IntegerField(read_only=True)
+    file_count = serializers.IntegerField(read_only=True)
 
     def update(self, instance, validated_data):
         instance.first_name = validated_data.get('first_name', instance.first_name)
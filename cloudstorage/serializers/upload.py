@@ -0,0 +1,49 @@
+from rest_framework import serializers
+
+from cloudstorage.models import UploadSession
+from cloudstorage.upload_sessions import open_session
+from cloudstorage.uploads import UploadError
+
+
+class UploadSerializer(serializers.Serializer):
+    """
+    Validates a request for a direct-to-storage upload target
+    """
+    name = serializers.CharField(max_length=250)
+    size = serializers.IntegerField(required=False, min_value=0)
+
+
+class UploadCompleteSerializer(serializers.Serializer):
+    """
+    Validates a request to complete a direct-to-storage upload
+    """
+    token = serializers.CharField()
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.IntegerField(required=False, min_value=1)
+    size = serializers.IntegerField(min_value=1)
+    chunk_count = serializers.IntegerField(read_only=True)
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'name', 'size', 'chunk_size', 'chunk_count', 'received', 'mime_type', 'folder', 'created')
+        read_only_fields = ('id', 'mime_type', 'folder', 'created')
+
+    def get_received(self, obj):
+        """
+        Numbers of the chunks that have landed so far
+        """
+        return sorted(chunk.number for chunk in obj.chunks.all())
+
+    def create(self, validated_data):
+        if 'folder' not in validated_data:
+            raise ValueError('Must pass folder to validated_data')
+        if 'owner' not in validated_data:
+            raise ValueError('Must pass owner to validated_data')
+
+        try:
+            return open_session(**validated_data)
+        except UploadError as e:
+            raise serializers.ValidationError({'chunk_size': [str(e)]})
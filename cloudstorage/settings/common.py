@@ -140,21 +140,133 @@ STATIC_ROOT = os.path.join(ROOT_DIR, 'staticfiles')
 MEDIA_ROOT = 'media'
 MEDIA_URL = '/media/'
 
+# Hash uploads as they stream in, see cloudstorage/uploadhandlers.py
+FILE_UPLOAD_HANDLERS = [
+    'cloudstorage.uploadhandlers.HashingMemoryFileUploadHandler',
+    'cloudstorage.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
 # Blanket REST framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
+        'cloudstorage.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
-    )
+        'cloudstorage.authentication.CachedTokenAuthentication',
+    ),
+    # default page size for the keyset paginated list endpoints,
+    # clients may ask for up to 1000 with ?page_size=
+    'PAGE_SIZE': 100,
 
 }
 
 
 # DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+
+# Number of bytes read from storage at a time when streaming a file download
+FILE_STREAM_CHUNK_SIZE = env('FILE_STREAM_CHUNK_SIZE', cast=int, default=64 * 1024)
+
+# Number of FILE_STREAM_CHUNK_SIZE chunks read ahead of the writer when
+# streaming a folder as a ZIP archive
+ARCHIVE_READ_AHEAD = env('ARCHIVE_READ_AHEAD', cast=int, default=8)
+
+# Most entries (files and folders) an archive imported into a folder may have
+IMPORT_MAX_ENTRIES = env('IMPORT_MAX_ENTRIES', cast=int, default=10000)
+
+# Most operations a single /api/batch/ request may carry
+BATCH_MAX_OPERATIONS = env('BATCH_MAX_OPERATIONS', cast=int, default=10000)
+
+# How file downloads are served when files live on local disk:
+#   'stream'            - streamed through the Django worker
+#   'x-accel-redirect'  - handed to nginx, which serves FILE_SERVE_ACCEL_PREFIX
+#                         from MEDIA_ROOT through an internal location, eg.
+#                           location /protected/ { internal; alias /path/to/media/; }
+#   'x-sendfile'        - handed to Apache (mod_xsendfile) or lighttpd
+# The view still checks that the file belongs to the requesting user.
+FILE_SERVE_MODE = env('FILE_SERVE_MODE', default='stream')
+FILE_SERVE_ACCEL_PREFIX = env('FILE_SERVE_ACCEL_PREFIX', default='/protected/')
+
+# Lifetime in seconds of the presigned S3 URLs handed out by the file
+# redirect endpoint. Signed URLs are cached in-process for half that time.
+SIGNED_URL_TTL = env('SIGNED_URL_TTL', cast=int, default=300)
+SIGNED_URL_CACHE_SIZE = env('SIGNED_URL_CACHE_SIZE', cast=int, default=10000)
+
+# Direct-to-S3 uploads: how long an upload target stays valid (seconds)
+# and the largest file that can be uploaded that way (S3 caps POSTs at 5GB)
+DIRECT_UPLOAD_TTL = env('DIRECT_UPLOAD_TTL', cast=int, default=60 * 60)
+DIRECT_UPLOAD_MAX_SIZE = env('DIRECT_UPLOAD_MAX_SIZE', cast=int, default=5 * 1024 ** 3)
+
+# Resumable upload sessions: default and largest chunk size clients may pick
+# (S3 needs at least 5MB per chunk), where local storage stages chunks, and
+# how long an unfinished session is kept before purge_upload_sessions drops it
+UPLOAD_SESSION_CHUNK_SIZE = env('UPLOAD_SESSION_CHUNK_SIZE', cast=int, default=8 * 1024 * 1024)
+UPLOAD_SESSION_MAX_CHUNK_SIZE = env('UPLOAD_SESSION_MAX_CHUNK_SIZE', cast=int, default=64 * 1024 * 1024)
+UPLOAD_SESSION_DIR = os.path.join(MEDIA_ROOT, 'upload_sessions')
+UPLOAD_SESSION_TTL = env('UPLOAD_SESSION_TTL', cast=int, default=7 * 24 * 60 * 60)
+
+# How the folder hierarchy is stored and queried: 'mptt' (nested sets) or
+# 'path' (materialized paths, cheap moves). Run rebuild_folder_tree before
+# switching from 'path' back to 'mptt', see cloudstorage/hierarchy.py
+FOLDER_HIERARCHY = env('FOLDER_HIERARCHY', default='mptt')
+
+# How many levels deep folders may be nested, keep it below 270 or so on
+# PostgreSQL, where the path index can't hold longer paths
+FOLDER_MAX_DEPTH = env('FOLDER_MAX_DEPTH', cast=int, default=250)
+
+# Seconds deleted files and folders stay in the trash, and can be restored,
+# before the purge_trash command removes them for good
+TRASH_RETENTION = env('TRASH_RETENTION', cast=int, default=30 * 24 * 60 * 60)
+
+# Seconds change journal entries are kept for delta sync clients before the
+# compact_changes command drops them. Clients that haven't synced for longer
+# have to list everything again.
+CHANGES_RETENTION = env('CHANGES_RETENTION', cast=int, default=90 * 24 * 60 * 60)
+
+# Most changes /api/changes/ returns at once
+CHANGES_PAGE_SIZE = env('CHANGES_PAGE_SIZE', cast=int, default=1000)
+
+# Most seconds /api/changes/?wait= holds a request, keep it below the
+# proxy's timeout. Waiting requests are woken in-process by the backend,
+# which with PollingBackend also checks every NOTIFICATION_POLL_INTERVAL
+# seconds for changes made by other processes, see
+# cloudstorage/notifications.py
+CHANGES_MAX_WAIT = env('CHANGES_MAX_WAIT', cast=int, default=25)
+NOTIFICATION_BACKEND = env('NOTIFICATION_BACKEND', default='cloudstorage.notifications.PollingBackend')
+NOTIFICATION_POLL_INTERVAL = env('NOTIFICATION_POLL_INTERVAL', cast=float, default=2)
+
+# Bytes each user may store unless their own quota says otherwise, 0 for
+# no limit, see cloudstorage/quota.py
+DEFAULT_USER_QUOTA = env('DEFAULT_USER_QUOTA', cast=int, default=0)
+
+# Authenticated users are cached per API token for TOKEN_CACHE_TTL seconds
+# in-process and, when TOKEN_CACHE_ALIAS names one of CACHES (eg. a shared
+# memcached), for TOKEN_SHARED_CACHE_TTL seconds there, see
+# cloudstorage/authentication.py. Without a shared cache a deleted token, a
+# deactivated user or a changed password is only noticed by the other
+# processes once their copy expires, hence the few seconds.
+TOKEN_CACHE_TTL = env('TOKEN_CACHE_TTL', cast=int, default=5)
+TOKEN_CACHE_SIZE = env('TOKEN_CACHE_SIZE', cast=int, default=10000)
+TOKEN_CACHE_ALIAS = env('TOKEN_CACHE_ALIAS', default='')
+TOKEN_SHARED_CACHE_TTL = env('TOKEN_SHARED_CACHE_TTL', cast=int, default=5 * 60)
+
+# HTTP Basic credentials that checked out are trusted again for this many
+# seconds without running the password hasher (only a keyed HMAC of them
+# is kept, and changing the password voids it)
+BASIC_AUTH_CACHE_TTL = env('BASIC_AUTH_CACHE_TTL', cast=int, default=5 * 60)
+BASIC_AUTH_CACHE_SIZE = env('BASIC_AUTH_CACHE_SIZE', cast=int, default=10000)
+
+# Serialized folder and file listings are cached in this cache for up to
+# LISTING_CACHE_TTL seconds. Cache keys carry a version that any change
+# bumps, so a per-process cache is safe too, just less effective.
+LISTING_CACHE_ALIAS = env('LISTING_CACHE_ALIAS', default='default')
+LISTING_CACHE_TTL = env('LISTING_CACHE_TTL', cast=int, default=5 * 60)
+
+# Seconds an API token stays valid after login or its last refresh through
+# /api/token/refresh/; purge_auth_tokens deletes the expired ones
+AUTH_TOKEN_TTL = env('AUTH_TOKEN_TTL', cast=int, default=30 * 24 * 60 * 60)
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
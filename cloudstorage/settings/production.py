@@ -6,4 +6,7 @@ AWS_ACCESS_KEY_ID = env('DJANGO_AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = env('DJANGO_AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = env('DJANGO_AWS_STORAGE_BUCKET_NAME')
 AWS_AUTO_CREATE_BUCKET = True
+# Objects are only reachable through presigned URLs, see SIGNED_URL_TTL
+AWS_DEFAULT_ACL = 'private'
+AWS_QUERYSTRING_AUTH = True
 
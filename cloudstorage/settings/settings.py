@@ -131,11 +131,20 @@ STATIC_URL = '/static/'
 MEDIA_ROOT = 'media'
 MEDIA_URL = '/media/'
 
+# Hash uploads as they stream in, see cloudstorage/uploadhandlers.py
+FILE_UPLOAD_HANDLERS = [
+    'cloudstorage.uploadhandlers.HashingMemoryFileUploadHandler',
+    'cloudstorage.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
 # Blanket REST framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # default page size for the keyset paginated list endpoints,
+    # clients may ask for up to 1000 with ?page_size=
+    'PAGE_SIZE': 100,
 }
 
 
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cloudstorage.authentication import forget_token, forget_user_tokens
+from cloudstorage.blobs import release_blob
+from cloudstorage.models import AuthToken, File, StorageUser
+
+
+@receiver(post_delete, sender=File)
+def release_file_blob(sender, instance, **kwargs):
+    """
+    Drop the deleted file's reference to its content
+    """
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+
+
+@receiver(post_save, sender=AuthToken)
+@receiver(post_delete, sender=AuthToken)
+def forget_cached_token(sender, instance, **kwargs):
+    """
+    Make sure a refreshed or deleted token is never authenticated from the cache
+    """
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=StorageUser)
+def forget_cached_user(sender, instance, created, **kwargs):
+    """
+    Make sure requests don't authenticate as a stale copy of a changed user
+    """
+    if not created:
+        forget_user_tokens(instance.pk)
@@ -0,0 +1,47 @@
+from django.conf import settings
+
+from cloudstorage.cache import TTLCache
+from cloudstorage.storage import is_s3_storage
+
+DEFAULT_SIGNED_URL_TTL = 300
+
+# (file id, file's modified timestamp) -> (storage name, url)
+url_cache = TTLCache(maxsize=getattr(settings, 'SIGNED_URL_CACHE_SIZE', 10000))
+
+
+def get_signed_url_ttl():
+    """
+    Returns how long, in seconds, a signed file URL stays valid
+    """
+    return getattr(settings, 'SIGNED_URL_TTL', DEFAULT_SIGNED_URL_TTL)
+
+
+def sign_url(field_file, ttl):
+    """
+    Returns a URL for the stored file. On S3 this is a presigned GET that
+    expires after `ttl` seconds; other backends just return their URL.
+    """
+    if is_s3_storage(field_file.storage):
+        return field_file.storage.url(field_file.name, expire=ttl)
+    return field_file.url
+
+
+def get_file_url(file):
+    """
+    Returns a signed URL for the file, signing a new one only if there is
+    no cached URL for it. URLs are cached under the file's own `modified`
+    timestamp, so saving the file retires its URL in every process without
+    having to forget it, while changes elsewhere in the owner's tree don't.
+
+    URLs are cached for half their lifetime, so every URL handed out is
+    still valid for at least TTL / 2 seconds.
+    """
+    key = (file.id, file.modified)
+    entry = url_cache.get(key)
+    if entry is not None and entry[0] == file.file.name:
+        return entry[1]
+
+    ttl = get_signed_url_ttl()
+    url = sign_url(file.file, ttl)
+    url_cache.set(key, (file.file.name, url), ttl=ttl / 2)
+    return url
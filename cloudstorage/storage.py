@@ -0,0 +1,58 @@
+"""
+Small helpers for talking to the configured file storage backend.
+
+Most of the app only uses the generic Django storage API, but a few hot
+paths (streaming, ranged reads) can do much better by going straight to
+S3 when the S3Boto3Storage backend from django-storages is configured.
+"""
+
+
+def get_file_storage():
+    """
+    Returns the storage backend File.file saves to
+    """
+    from cloudstorage.models import File
+    return File._meta.get_field('file').storage
+
+
+def is_s3_storage(storage):
+    """
+    Returns True if the storage is (or behaves like) S3Boto3Storage
+    """
+    return hasattr(storage, 'bucket') and hasattr(storage, '_normalize_name')
+
+
+def s3_key(storage, name):
+    """
+    Returns the S3 object key for a storage name, the same way
+    S3Boto3Storage builds it when saving
+    """
+    return storage._encode_name(storage._normalize_name(storage._clean_name(name)))
+
+
+def s3_object(storage, name):
+    """
+    Returns the boto3 Object resource for a storage name
+    """
+    return storage.bucket.Object(s3_key(storage, name))
+
+
+# S3 DeleteObjects takes at most this many keys per call
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def delete_files(storage, names):
+    """
+    Deletes many stored files at once. On S3 this is one DeleteObjects call
+    per 1000 keys instead of a DELETE per file.
+    """
+    names = list(names)
+    if not is_s3_storage(storage):
+        for name in names:
+            storage.delete(name)
+        return
+
+    client = storage.bucket.meta.client
+    for i in range(0, len(names), S3_DELETE_BATCH_SIZE):
+        keys = [{'Key': s3_key(storage, name)} for name in names[i:i + S3_DELETE_BATCH_SIZE]]
+        client.delete_objects(Bucket=storage.bucket.name, Delete={'Objects': keys, 'Quiet': True})
@@ -0,0 +1,258 @@
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.encoding import filepath_to_uri
+
+from cloudstorage.storage import is_s3_storage, s3_object
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Requests asking for more ranges than this are served the whole file
+# instead, as allowed by RFC 7233, to avoid tiny-range amplification.
+MAX_RANGES = 16
+
+RANGE_SPEC_RE = re.compile(r'^(\d*)-(\d*)$')
+
+SERVE_MODE_STREAM = 'stream'
+SERVE_MODE_X_ACCEL_REDIRECT = 'x-accel-redirect'
+SERVE_MODE_X_SENDFILE = 'x-sendfile'
+SERVE_MODES = (SERVE_MODE_STREAM, SERVE_MODE_X_ACCEL_REDIRECT, SERVE_MODE_X_SENDFILE)
+
+
+def get_chunk_size():
+    """
+    Returns the number of bytes read from storage per chunk when streaming
+    """
+    return getattr(settings, 'FILE_STREAM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def get_serve_mode():
+    """
+    Returns how file downloads are served, see FILE_SERVE_MODE in settings
+    """
+    mode = getattr(settings, 'FILE_SERVE_MODE', SERVE_MODE_STREAM)
+    if mode not in SERVE_MODES:
+        raise ImproperlyConfigured('FILE_SERVE_MODE must be one of {}'.format(', '.join(SERVE_MODES)))
+    return mode
+
+
+class FileChunkIterator(object):
+    """
+    Iterates over the content of a stored file in chunks of at most
+    `chunk_size` bytes, so only one chunk is ever held in memory.
+
+    Reading starts at byte `start` and stops after `length` bytes, or at the
+    end of the file if no length is given. On S3 only the requested bytes
+    are fetched (ranged GET) and the response body is read incrementally;
+    on other backends the file is opened and read in place.
+    """
+
+    def __init__(self, field_file, start=0, length=None, chunk_size=None):
+        self.chunk_size = chunk_size or get_chunk_size()
+        self.remaining = length
+        self.stream = self._open(field_file, start, length)
+
+    def _open(self, field_file, start, length):
+        storage = field_file.storage
+
+        if is_s3_storage(storage):
+            kwargs = {}
+            if start or length is not None:
+                end = '' if length is None else start + length - 1
+                kwargs['Range'] = 'bytes={}-{}'.format(start, end)
+            return s3_object(storage, field_file.name).get(**kwargs)['Body']
+
+        stream = storage.open(field_file.name, 'rb')
+        if start:
+            stream.seek(start)
+        return stream
+
+    def __iter__(self):
+        try:
+            while self.remaining is None or self.remaining > 0:
+                size = self.chunk_size
+                if self.remaining is not None:
+                    size = min(size, self.remaining)
+
+                data = self.stream.read(size)
+                if not data:
+                    break
+
+                if self.remaining is not None:
+                    self.remaining -= len(data)
+                yield data
+        finally:
+            self.close()
+
+    def close(self):
+        self.stream.close()
+
+
+class MultipartRangeIterator(object):
+    """
+    Iterates over a multipart/byteranges body, reading each part's bytes
+    from storage only once the previous part has been sent.
+    """
+
+    def __init__(self, field_file, size, ranges, content_type, boundary, chunk_size=None):
+        self.field_file = field_file
+        self.size = size
+        self.ranges = ranges
+        self.content_type = content_type
+        self.boundary = boundary
+        self.chunk_size = chunk_size
+        self.current = None
+
+    def __iter__(self):
+        try:
+            for start, end in self.ranges:
+                yield part_header(self.boundary, self.content_type, start, end, self.size)
+                self.current = FileChunkIterator(self.field_file, start, end - start + 1,
+                                                 chunk_size=self.chunk_size)
+                for data in self.current:
+                    yield data
+            yield part_footer(self.boundary)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+
+
+def part_header(boundary, content_type, start, end, size):
+    return (
+        '\r\n--{}\r\n'
+        'Content-Type: {}\r\n'
+        'Content-Range: bytes {}-{}/{}\r\n'
+        '\r\n'.format(boundary, content_type, start, end, size)
+    ).encode('ascii')
+
+
+def part_footer(boundary):
+    return '\r\n--{}--\r\n'.format(boundary).encode('ascii')
+
+
+def parse_range_header(header, size):
+    """
+    Parses an HTTP Range header against a file of `size` bytes.
+
+    Returns a sorted list of non-overlapping (start, end) tuples with
+    inclusive ends, an empty list if no range is satisfiable, or None if the
+    header is missing, malformed or asks for too many ranges, in which case
+    the whole file should be served.
+    """
+    if not header:
+        return None
+
+    units, _, specs = header.partition('=')
+    if units.strip() != 'bytes':
+        return None
+
+    specs = [spec.strip() for spec in specs.split(',')]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = RANGE_SPEC_RE.match(spec)
+        if not match:
+            return None
+
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = int(last) if last else size - 1
+        elif last:
+            # suffix range, eg. "-500" is the last 500 bytes
+            if not int(last):
+                continue
+            start = max(size - int(last), 0)
+            end = size - 1
+        else:
+            return None
+
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    # coalesce overlapping and adjacent ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def offloaded_file_response(field_file, content_type, mode):
+    """
+    Builds an empty response telling the front-end web server (nginx with
+    X-Accel-Redirect, Apache/lighttpd with X-Sendfile) to send the file
+    itself. Returns None if the storage backend has no local files.
+    """
+    if is_s3_storage(field_file.storage):
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if mode == SERVE_MODE_X_ACCEL_REDIRECT:
+        prefix = getattr(settings, 'FILE_SERVE_ACCEL_PREFIX', '/protected/')
+        response['X-Accel-Redirect'] = prefix + filepath_to_uri(field_file.name)
+    else:
+        response['X-Sendfile'] = field_file.path
+    return response
+
+
+def file_response(field_file, content_type, range_header=None):
+    """
+    Builds a response for a stored file. Depending on FILE_SERVE_MODE this
+    either hands the transfer off to the front-end web server, or streams
+    the file honouring an optional HTTP Range header with a 206 (single or
+    multipart/byteranges) or 416.
+    """
+    mode = get_serve_mode()
+    if mode != SERVE_MODE_STREAM:
+        response = offloaded_file_response(field_file, content_type, mode)
+        if response is not None:
+            return response
+
+    size = field_file.size
+    ranges = parse_range_header(range_header, size)
+
+    if ranges is None:
+        response = StreamingHttpResponse(FileChunkIterator(field_file),
+                                         content_type=content_type)
+        response['Content-Length'] = size
+
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(FileChunkIterator(field_file, start, end - start + 1),
+                                         content_type=content_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+
+    else:
+        boundary = uuid.uuid4().hex
+        length = len(part_footer(boundary))
+        for start, end in ranges:
+            length += len(part_header(boundary, content_type, start, end, size))
+            length += end - start + 1
+
+        response = StreamingHttpResponse(
+            MultipartRangeIterator(field_file, size, ranges, content_type, boundary),
+            content_type='multipart/byteranges; boundary={}'.format(boundary),
+            status=206)
+        response['Content-Length'] = length
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,152 @@
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import Folder, File
+from cloudstorage.tests.utils import FolderTestMixin, make_user
+
+
+class BatchTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # root
+        #   photos
+        #     2017
+        #   music
+        self.photos = self.make_folder('photos', self.root)
+        self.child = self.make_folder('2017', self.photos)
+        self.music = self.make_folder('music', self.root)
+
+        self.client.force_authenticate(user=self.user)
+
+    def make_file(self, name, folder, size=1):
+        file = File()
+        file.name = name
+        file.original_name = name
+        file.size = size
+        file.mime_type = 'text/plain'
+        file.folder = folder
+        file.owner = self.user
+        file.file = 'user_{}/{}'.format(self.user.id, name)
+        file.save()
+        return file
+
+    def batch(self, *operations):
+        response = self.client.post('/api/batch/', {'operations': list(operations)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [result['code'] for result in response.data['results']]
+
+    def assertUsage(self, folder, size, file_count):
+        folder = Folder.objects.get(pk=folder.pk)
+        self.assertEqual((folder.size, folder.file_count), (size, file_count), folder.name)
+
+    def test_move_files(self):
+        files = [self.make_file('file_{}.txt'.format(i), folder, size=2)
+                 for i, folder in enumerate([self.photos, self.child, self.root] * 10)]
+        operations = [{'op': 'move', 'type': 'file', 'id': file.id, 'folder': self.music.id} for file in files]
+
+        # the lookups, one update per destination and the counters, however many files
+        with self.assertNumQueries(16):
+            codes = self.batch(*operations)
+        self.assertEqual(codes, [200] * 30)
+
+        self.assertEqual(File.objects.filter(folder=self.music).count(), 30)
+        self.assertUsage(self.music, 60, 30)
+        self.assertUsage(self.photos, 0, 0)
+        self.assertUsage(self.root, 60, 30)
+
+    def test_rename(self):
+        file = self.make_file('a.txt', self.photos)
+        codes = self.batch({'op': 'rename', 'type': 'file', 'id': file.id, 'name': 'b.txt'},
+                           {'op': 'rename', 'type': 'folder', 'id': self.child.id, 'name': '2018'},
+                           {'op': 'rename', 'type': 'folder', 'id': self.music.id, 'name': 'songs'})
+        self.assertEqual(codes, [200, 200, 200])
+        self.assertEqual(File.objects.get(pk=file.pk).name, 'b.txt')
+        self.assertEqual(Folder.objects.get(pk=self.child.pk).name, '2018')
+        self.assertEqual(Folder.objects.get(pk=self.music.pk).name, 'songs')
+
+    def test_delete(self):
+        a = self.make_file('a.txt', self.child, size=5)
+        b = self.make_file('b.txt', self.photos, size=3)
+        self.make_file('c.txt', self.music, size=2)
+        codes = self.batch({'op': 'delete', 'type': 'file', 'id': a.id},
+                           {'op': 'delete', 'type': 'folder', 'id': self.photos.id},
+                           {'op': 'delete', 'type': 'folder', 'id': self.music.id})
+        self.assertEqual(codes, [200, 200, 200])
+
+        self.assertIsNotNone(File.objects.get(pk=a.pk).deleted_at)
+        self.assertIsNone(File.objects.get(pk=b.pk).deleted_at)
+        self.assertEqual(set(Folder.objects.filter(trashed=True).values_list('name', flat=True)),
+                         {'photos', '2017', 'music'})
+        self.assertUsage(self.root, 0, 0)
+        self.assertUsage(self.photos, 3, 1)
+        self.assertUsage(self.music, 2, 1)
+
+        # restoring hands back what was counted
+        self.client.post('/api/folders/{}/restore/'.format(self.photos.id))
+        self.assertUsage(self.root, 3, 1)
+
+    def test_move_folders(self):
+        self.make_file('a.txt', self.child, size=5)
+        codes = self.batch({'op': 'move', 'type': 'folder', 'id': self.child.id, 'folder': self.music.id},
+                           {'op': 'move', 'type': 'folder', 'id': self.photos.id, 'folder': self.music.id})
+        self.assertEqual(codes, [200, 200])
+
+        self.assertEqual(Folder.objects.get(pk=self.child.pk).parent_id, self.music.id)
+        self.assertEqual(Folder.objects.get(pk=self.photos.pk).parent_id, self.music.id)
+        self.assertUsage(self.music, 5, 1)
+        self.assertUsage(self.photos, 0, 0)
+
+    def test_move_folder_into_itself(self):
+        codes = self.batch({'op': 'move', 'type': 'folder', 'id': self.photos.id, 'folder': self.child.id},
+                           {'op': 'move', 'type': 'folder', 'id': self.music.id, 'folder': self.child.id})
+        self.assertEqual(codes, [400, 200])
+        self.assertEqual(Folder.objects.get(pk=self.photos.pk).parent_id, self.root.id)
+
+    def test_move_cycle_within_batch(self):
+        codes = self.batch({'op': 'move', 'type': 'folder', 'id': self.music.id, 'folder': self.child.id},
+                           {'op': 'move', 'type': 'folder', 'id': self.photos.id, 'folder': self.music.id})
+        self.assertEqual(codes, [200, 400])
+        self.assertEqual(Folder.objects.get(pk=self.music.pk).parent_id, self.child.id)
+        self.assertEqual(Folder.objects.get(pk=self.photos.pk).parent_id, self.root.id)
+
+    def test_per_item_errors(self):
+        file = self.make_file('a.txt', self.photos)
+        other_user = make_user('other@test.com', 'richard', 'jones')
+        other_file = File.objects.create(name='x', original_name='x', size=1, mime_type='text/plain',
+                                         folder=Folder.objects.get(owner=other_user), owner=other_user,
+                                         file='user_{}/x'.format(other_user.id))
+
+        codes = self.batch({'op': 'delete', 'type': 'file', 'id': other_file.id},
+                           {'op': 'move', 'type': 'file', 'id': file.id, 'folder': other_file.folder_id},
+                           {'op': 'explode', 'type': 'file', 'id': file.id},
+                           {'op': 'rename', 'type': 'file', 'id': file.id, 'name': ''},
+                           {'op': 'delete', 'type': 'folder', 'id': self.root.id},
+                           {'op': 'rename', 'type': 'file', 'id': file.id, 'name': 'b.txt'},
+                           {'op': 'delete', 'type': 'file', 'id': file.id})
+        self.assertEqual(codes, [404, 404, 400, 400, 400, 200, 400])
+        self.assertIsNone(File.objects.get(pk=other_file.pk).deleted_at)
+        self.assertEqual(File.objects.get(pk=file.pk).name, 'b.txt')
+
+    def test_trashed_items(self):
+        file = self.make_file('a.txt', self.child)
+        self.client.delete('/api/folders/{}/'.format(self.photos.id))
+        codes = self.batch({'op': 'rename', 'type': 'file', 'id': file.id, 'name': 'b.txt'},
+                           {'op': 'move', 'type': 'folder', 'id': self.music.id, 'folder': self.child.id})
+        self.assertEqual(codes, [404, 404])
+
+    def test_invalid_batch(self):
+        response = self.client.post('/api/batch/', {'operations': 'all of them'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH_MAX_OPERATIONS=1)
+    def test_too_many_operations(self):
+        operations = [{'op': 'delete', 'type': 'folder', 'id': self.music.id}] * 2
+        response = self.client.post('/api/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathBatchTests(BatchTests):
+    pass
@@ -0,0 +1,176 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import Change, StorageUser, Folder, File
+
+
+class ChangesTests(APITestCase):
+
+    def setUp(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.root = Folder.objects.get(owner=user)
+        self.client.force_authenticate(user=user)
+
+        self.cursor = self.client.get('/api/changes/').data['cursor']
+
+    def make_folder(self, name, parent):
+        response = self.client.post('/api/folders/', {'name': name, 'parent': parent.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Folder.objects.get(pk=response.data['id'])
+
+    def upload(self, folder, name='file.txt'):
+        url = '/api/folders/{}/files/'.format(folder.id)
+        data = {'name': name, 'file': SimpleUploadedFile(name, b'12345', content_type='text/plain')}
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return File.objects.get(pk=response.data['id'])
+
+    def get_changes(self, since=None):
+        response = self.client.get('/api/changes/', {'since': self.cursor if since is None else since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.cursor = response.data['cursor']
+        return [(change['type'], change['id'], change['action']) for change in response.data['changes']]
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.get_changes(), [])
+
+    def test_changes(self):
+        photos = self.make_folder('photos', self.root)
+        music = self.make_folder('music', self.root)
+        file = self.upload(photos)
+        self.assertEqual(self.get_changes(), [('folder', photos.id, 'create'), ('folder', music.id, 'create'),
+                                              ('file', file.id, 'create')])
+
+        self.client.put('/api/folders/{}/files/{}/'.format(photos.id, file.id), {'name': 'a.txt'}, format='json')
+        self.client.put('/api/folders/{}/'.format(music.id), {'name': 'music', 'parent': photos.id}, format='json')
+        # a folder PUT moves it, then saves it, the later entry wins
+        self.assertEqual(self.get_changes(), [('file', file.id, 'update'), ('folder', music.id, 'update')])
+
+        self.client.delete('/api/folders/{}/files/{}/'.format(photos.id, file.id))
+        self.client.delete('/api/folders/{}/'.format(music.id))
+        self.assertEqual(self.get_changes(), [('file', file.id, 'delete'), ('folder', music.id, 'delete')])
+
+        self.client.post('/api/folders/{}/restore/'.format(music.id))
+        self.assertEqual(self.get_changes(), [('folder', music.id, 'restore')])
+
+    def test_changes_carry_current_state(self):
+        photos = self.make_folder('photos', self.root)
+        file = self.upload(photos)
+        File.objects.get(pk=file.pk).delete()
+
+        response = self.client.get('/api/changes/', {'since': self.cursor})
+        changes = response.data['changes']
+        # one entry per item, the latest
+        self.assertEqual([(change['type'], change['action']) for change in changes],
+                         [('folder', 'create'), ('file', 'delete')])
+        self.assertEqual(changes[0]['item']['name'], 'photos')
+        self.assertIsNone(changes[1]['item'])
+
+    @override_settings(CHANGES_PAGE_SIZE=2)
+    def test_paging(self):
+        for name in ('a', 'b', 'c'):
+            self.make_folder(name, self.root)
+        response = self.client.get('/api/changes/', {'since': self.cursor})
+        self.assertEqual([change['item']['name'] for change in response.data['changes']], ['a', 'b'])
+        self.assertTrue(response.data['more'])
+
+        response = self.client.get('/api/changes/', {'since': response.data['cursor']})
+        self.assertEqual([change['item']['name'] for change in response.data['changes']], ['c'])
+        self.assertFalse(response.data['more'])
+
+    def test_batch_and_import_journaled(self):
+        photos = self.make_folder('photos', self.root)
+        file = self.upload(self.root)
+        self.get_changes()
+
+        self.client.post('/api/batch/', {'operations': [
+            {'op': 'move', 'type': 'file', 'id': file.id, 'folder': photos.id},
+            {'op': 'rename', 'type': 'folder', 'id': photos.id, 'name': 'pictures'},
+        ]}, format='json')
+        self.assertEqual(self.get_changes(), [('file', file.id, 'move'), ('folder', photos.id, 'update')])
+
+    def test_other_users_changes(self):
+        other_user = StorageUser()
+        other_user.email = 'other@test.com'
+        other_user.first_name = 'richard'
+        other_user.last_name = 'jones'
+        other_user.save()
+        self.assertEqual(self.get_changes(), [])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/changes/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_wait_for_changes(self):
+        def change(owner_id, since, timeout):
+            Folder.objects.create(name='photos', parent=self.root, owner=self.user)
+            return True
+
+        with mock.patch('cloudstorage.views.api.wait_for_changes', side_effect=change) as wait:
+            response = self.client.get('/api/changes/', {'since': self.cursor, 'wait': 5})
+        wait.assert_called_once_with(self.user.pk, self.cursor, 5)
+        self.assertEqual([change['item']['name'] for change in response.data['changes']], ['photos'])
+        self.assertGreater(response.data['cursor'], self.cursor)
+
+    @override_settings(CHANGES_MAX_WAIT=1)
+    def test_wait_times_out(self):
+        with mock.patch('cloudstorage.views.api.wait_for_changes', return_value=False) as wait:
+            response = self.client.get('/api/changes/', {'since': self.cursor, 'wait': 60})
+        wait.assert_called_once_with(self.user.pk, self.cursor, 1)
+        self.assertEqual(response.data['changes'], [])
+        self.assertEqual(response.data['cursor'], self.cursor)
+
+    def test_no_wait_for_pending_changes(self):
+        self.make_folder('photos', self.root)
+        with mock.patch('cloudstorage.views.api.wait_for_changes') as wait:
+            response = self.client.get('/api/changes/', {'since': self.cursor, 'wait': 5})
+        self.assertFalse(wait.called)
+        self.assertEqual(len(response.data['changes']), 1)
+
+    def test_invalid_wait(self):
+        response = self.client.get('/api/changes/', {'since': self.cursor, 'wait': 'forever'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compaction(self):
+        photos = self.make_folder('photos', self.root)
+        self.client.put('/api/folders/{}/'.format(photos.id), {'name': 'pictures', 'parent': self.root.id},
+                        format='json')
+        self.assertGreater(Change.objects.filter(item_id=photos.id, kind='folder').count(), 1)
+
+        call_command('compact_changes', stdout=StringIO())
+        self.assertEqual(Change.objects.filter(item_id=photos.id, kind='folder').count(), 1)
+        # superseded entries go without breaking anyone's cursor
+        self.assertEqual(self.get_changes(), [('folder', photos.id, 'update')])
+
+    def test_expired_cursor(self):
+        old_cursor = self.cursor
+        photos = self.make_folder('photos', self.root)
+        self.get_changes()
+        Change.objects.update(created=timezone.now() - timedelta(days=1))
+        music = self.make_folder('music', self.root)
+
+        call_command('compact_changes', retention=60, stdout=StringIO())
+        response = self.client.get('/api/changes/', {'since': old_cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+        # caught up before the entries went, nothing is missing
+        self.assertEqual(self.get_changes(), [('folder', music.id, 'create')])
+        self.assertFalse(Change.objects.filter(item_id=photos.id, kind='folder').exists())
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathChangesTests(ChangesTests):
+    pass
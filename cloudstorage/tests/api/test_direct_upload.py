@@ -0,0 +1,205 @@
+import base64
+import json
+
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import StorageUser, Folder, File
+from cloudstorage.storage import s3_object
+from cloudstorage.tests.utils import S3StorageMixin
+
+
+class DirectUploadTests(S3StorageMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.folder = Folder.objects.get(owner=user)
+
+        other_user = StorageUser()
+        other_user.email = 'other@test.com'
+        other_user.first_name = 'richard'
+        other_user.last_name = 'jones'
+        other_user.save()
+        self.other_user = other_user
+
+        self.url = '/api/folders/{}/uploads/'.format(self.folder.id)
+        self.complete_url = '/api/folders/{}/uploads/complete/'.format(self.folder.id)
+
+    def start_upload(self, data):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def put_object(self, key, body, content_type):
+        s3_object(self.storage, key).put(Body=body, ContentType=content_type)
+
+    def test_upload_not_authenticated(self):
+        response = self.client.post(self.url, {'name': 'boop.txt'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_upload_other_users_folder(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post(self.url, {'name': 'boop.txt'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_target(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.assertRegex(upload['key'], r'^user_{}/[0-9a-f]{{32}}/boop.txt$'.format(self.user.id))
+        self.assertEqual(upload['fields']['key'], upload['key'])
+        self.assertEqual(upload['fields']['Content-Type'], 'text/plain')
+        self.assertIn('policy', upload['fields'])
+        self.assertIn('token', upload)
+        self.assertFalse(File.objects.exists())
+
+    def test_upload_too_large(self):
+        self.client.force_authenticate(user=self.user)
+        with self.settings(DIRECT_UPLOAD_MAX_SIZE=4):
+            response = self.client.post(self.url, {'name': 'boop.txt', 'size': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_upload(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.put_object(upload['key'], b'hello', 'text/plain')
+
+        response = self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['name'], 'boop.txt')
+        self.assertEqual(response.data['size'], 5)
+        self.assertEqual(response.data['mime_type'], 'text/plain')
+
+        file = File.objects.get(id=response.data['id'])
+        self.assertEqual(file.folder, self.folder)
+        self.assertEqual(file.owner, self.user)
+        self.assertEqual(file.file.name, upload['key'])
+
+    def test_upload_same_name_twice(self):
+        first = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.put_object(first['key'], b'hello', 'text/plain')
+        self.client.post(self.complete_url, {'token': first['token']}, format='json')
+
+        second = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.assertNotEqual(second['key'], first['key'])
+        self.put_object(second['key'], b'world', 'text/plain')
+        response = self.client.post(self.complete_url, {'token': second['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual([file.file.read() for file in File.objects.order_by('id')], [b'hello', b'world'])
+
+    def test_complete_long_name(self):
+        name = 'b' * 246 + '.txt'
+        upload = self.start_upload({'name': name, 'size': 5})
+        self.put_object(upload['key'], b'hello', 'text/plain')
+
+        response = self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['name'], name)
+        file = File.objects.get(id=response.data['id'])
+        self.assertLessEqual(len(file.file.name), File._meta.get_field('file').max_length)
+
+    def test_upload_name_too_long(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'name': 'b' * 251, 'size': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_upload_twice(self):
+        upload = self.start_upload({'name': 'boop.txt'})
+        self.put_object(upload['key'], b'hello', 'text/plain')
+        self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        response = self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(File.objects.count(), 1)
+
+    def test_complete_missing_object(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        response = self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(File.objects.exists())
+
+    def test_complete_wrong_size(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.put_object(upload['key'], b'hello world', 'text/plain')
+        response = self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_wrong_type(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.put_object(upload['key'], b'hello', 'application/x-msdownload')
+        response = self.client.post(self.complete_url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_tampered_token(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        response = self.client.post(self.complete_url, {'token': upload['token'] + 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_in_other_folder(self):
+        upload = self.start_upload({'name': 'boop.txt', 'size': 5})
+        self.put_object(upload['key'], b'hello', 'text/plain')
+
+        folder = Folder()
+        folder.name = 'other'
+        folder.parent = self.folder
+        folder.owner = self.user
+        folder.save()
+
+        url = '/api/folders/{}/uploads/complete/'.format(folder.id)
+        response = self.client.post(url, {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def get_size_limit(self, upload):
+        policy = json.loads(base64.b64decode(upload['fields']['policy']).decode())
+        for condition in policy['conditions']:
+            if isinstance(condition, list) and condition[0] == 'content-length-range':
+                return condition[2]
+
+    @override_settings(DEFAULT_USER_QUOTA=10)
+    def test_upload_over_quota(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'name': 'boop.txt', 'size': 11}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    @override_settings(DEFAULT_USER_QUOTA=10)
+    def test_undeclared_size_capped_at_quota(self):
+        StorageUser.objects.filter(pk=self.user.pk).update(storage_used=4)
+        upload = self.start_upload({'name': 'boop.txt'})
+        self.assertEqual(self.get_size_limit(upload), 6)
+
+    @override_settings(DEFAULT_USER_QUOTA=10)
+    def test_complete_over_quota(self):
+        first = self.start_upload({'name': 'first.txt', 'size': 6})
+        second = self.start_upload({'name': 'second.txt', 'size': 6})
+        self.put_object(first['key'], b'hello!', 'text/plain')
+        self.put_object(second['key'], b'hello!', 'text/plain')
+
+        response = self.client.post(self.complete_url, {'token': first['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(self.complete_url, {'token': second['token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        self.assertEqual(StorageUser.objects.get(pk=self.user.pk).storage_used, 6)
+        self.assertFalse(self.storage.exists(second['key']))
+
+
+class DirectUploadFileSystemTests(APITestCase):
+
+    def test_direct_upload_not_supported(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.save()
+        folder = Folder.objects.get(owner=user)
+
+        self.client.force_authenticate(user=user)
+        url = '/api/folders/{}/uploads/'.format(folder.id)
+        response = self.client.post(url, {'name': 'boop.txt'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
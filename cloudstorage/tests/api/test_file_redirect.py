@@ -1,12 +1,21 @@
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
 from cloudstorage.models import StorageUser, Folder, File
+from cloudstorage.signing import sign_url, url_cache
+from cloudstorage.tests.utils import S3StorageMixin
 
 
 class FileRedirectTests(APITestCase):
 
     def setUp(self):
+        # ids and timestamps may repeat once each test rolls back
+        url_cache.clear()
+
         user = StorageUser()
         user.email = 'test@test.com'
         user.first_name = 'derek'
@@ -17,6 +26,7 @@ class FileRedirectTests(APITestCase):
 
         folder = Folder()
         folder.name = "test"
+        folder.parent = Folder.objects.get(owner=user)
         folder.owner = user
         folder.save()
         self.folder = folder
@@ -43,3 +53,121 @@ class FileRedirectTests(APITestCase):
         url = '/api/folders/{}/files/{}/file/'.format(self.folder.id, self.file.id)
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_get_file_redirect_cached(self):
+        url = '/api/folders/{}/files/{}/file/'.format(self.folder.id, self.file.id)
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+        # just the file lookup, which also checks the trash
+        with self.assertNumQueries(1), mock.patch('cloudstorage.signing.sign_url', wraps=sign_url) as sign:
+            response = self.client.get(url)
+        self.assertFalse(sign.called)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, self.file.file.url)
+
+    def test_get_file_redirect_cached_other_user(self):
+        url = '/api/folders/{}/files/{}/file/'.format(self.folder.id, self.file.id)
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+
+        other_user = StorageUser()
+        other_user.email = 'other@test.com'
+        other_user.first_name = 'richard'
+        other_user.last_name = 'jones'
+        other_user.save()
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleted_folder_not_served_from_cache(self):
+        url = '/api/folders/{}/files/{}/file/'.format(self.folder.id, self.file.id)
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+        response = self.client.delete('/api/folders/{}/'.format(self.folder.id))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_deleted_folder_not_served_from_cache(self):
+        folder = Folder.objects.create(name='sub', parent=self.folder, owner=self.user)
+        self.file.folder = folder
+        self.file.save()
+        url = '/api/folders/{}/files/{}/file/'.format(folder.id, self.file.id)
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+        operations = [{'op': 'delete', 'type': 'folder', 'id': folder.id}]
+        self.client.post('/api/batch/', {'operations': operations}, format='json')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_saving_file_changes_cached_url(self):
+        url = '/api/folders/{}/files/{}/file/'.format(self.folder.id, self.file.id)
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+        modified = File.objects.get(pk=self.file.pk).modified
+        self.assertIsNotNone(url_cache.get((self.file.id, modified)))
+
+        # cached under the new timestamp, without forgetting the old one
+        self.file.save()
+        self.assertNotEqual(self.file.modified, modified)
+        self.assertIsNone(url_cache.get((self.file.id, self.file.modified)))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_302_FOUND)
+        self.assertIsNotNone(url_cache.get((self.file.id, self.file.modified)))
+
+    def test_other_changes_keep_cached_url(self):
+        url = '/api/folders/{}/files/{}/file/'.format(self.folder.id, self.file.id)
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+
+        response = self.client.post('/api/folders/', {'name': 'other', 'parent': self.folder.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with mock.patch('cloudstorage.signing.sign_url', wraps=sign_url) as sign:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertFalse(sign.called)
+
+
+class S3FileRedirectTests(S3StorageMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        url_cache.clear()
+
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.save()
+        self.user = user
+
+        folder = Folder.objects.get(owner=user)
+
+        file = File()
+        file.name = "boop.jpg"
+        file.original_name = "boop.jpg"
+        file.size = 12
+        file.mime_type = "image/jpeg"
+        file.folder = folder
+        file.owner = user
+        file.file = SimpleUploadedFile("file.jpg", b"file_content", content_type="image/jpeg")
+        file.save()
+        self.file = file
+
+        self.url = '/api/folders/{}/files/{}/file/'.format(folder.id, file.id)
+
+    @override_settings(SIGNED_URL_TTL=120)
+    def test_get_presigned_redirect(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+        location = urlparse(response.url)
+        query = parse_qs(location.query)
+        self.assertTrue(location.path.endswith(self.file.file.name))
+        self.assertIn('Signature', query)
+        self.assertIn('Expires', query)
+
+    def test_presigned_redirect_signed_once(self):
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(first.url, second.url)
@@ -0,0 +1,180 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import StorageUser, Folder, File
+from cloudstorage.tests.utils import S3StorageMixin, make_user
+
+
+class FileStreamTests(APITestCase):
+
+    def setUp(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+
+        other_user = StorageUser()
+        other_user.email = 'other@test.com'
+        other_user.first_name = 'richard'
+        other_user.last_name = 'jones'
+        other_user.set_password('password')
+        other_user.save()
+        self.other_user = other_user
+
+        folder = Folder()
+        folder.name = "test"
+        folder.owner = user
+        folder.save()
+        self.folder = folder
+
+        file = File()
+        file.name = "boop.jpg"
+        file.original_name = "boop.jpg"
+        file.size = 12
+        file.mime_type = "image/jpeg"
+        file.folder = folder
+        file.owner = user
+        file.file = SimpleUploadedFile("file.jpg", b"file_content", content_type="image/jpeg")
+        file.save()
+        self.file = file
+
+        self.url = '/api/folders/{}/files/{}/file/stream/'.format(self.folder.id, self.file.id)
+
+    def test_stream_file(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], '12')
+        self.assertEqual(b''.join(response.streaming_content), b'file_content')
+
+    @override_settings(FILE_STREAM_CHUNK_SIZE=5)
+    def test_stream_file_in_chunks(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        chunks = list(response.streaming_content)
+        self.assertEqual(chunks, [b'file_', b'conte', b'nt'])
+
+    def test_stream_file_other_user(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_not_authenticated_stream_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stream_single_range(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-8')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/12')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), b'cont')
+
+    def test_stream_suffix_range(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 9-11/12')
+        self.assertEqual(b''.join(response.streaming_content), b'ent')
+
+    def test_stream_multiple_ranges(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3,9-')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        boundary = response['Content-Type'].split('boundary=')[1]
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Length'], str(len(body)))
+        self.assertIn(b'Content-Range: bytes 0-3/12\r\n\r\nfile\r\n', body)
+        self.assertIn(b'Content-Range: bytes 9-11/12\r\n\r\nent\r\n', body)
+        self.assertTrue(body.endswith('--{}--\r\n'.format(boundary).encode()))
+
+    def test_stream_unsatisfiable_range(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=50-60')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */12')
+
+    def test_stream_malformed_range_returns_whole_file(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=8-2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'file_content')
+
+    @override_settings(FILE_SERVE_MODE='x-accel-redirect', FILE_SERVE_ACCEL_PREFIX='/protected/')
+    def test_x_accel_redirect(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.file.file.name)
+
+    @override_settings(FILE_SERVE_MODE='x-sendfile')
+    def test_x_sendfile(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Sendfile'], self.file.file.path)
+
+    @override_settings(FILE_SERVE_MODE='x-accel-redirect')
+    def test_x_accel_redirect_other_user(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+
+class S3FileStreamTests(S3StorageMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user(password='password')
+
+        file = File()
+        file.name = "boop.jpg"
+        file.original_name = "boop.jpg"
+        file.size = 12
+        file.mime_type = "image/jpeg"
+        file.folder = Folder.objects.get(owner=self.user)
+        file.owner = self.user
+        file.file = SimpleUploadedFile("file.jpg", b"file_content", content_type="image/jpeg")
+        file.save()
+        self.file = file
+
+        self.url = '/api/folders/{}/files/{}/file/stream/'.format(file.folder_id, file.id)
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(FILE_STREAM_CHUNK_SIZE=5)
+    def test_stream_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Length'], '12')
+        self.assertEqual(list(response.streaming_content), [b'file_', b'conte', b'nt'])
+
+    def test_stream_single_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-8')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/12')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), b'cont')
+
+    def test_stream_multiple_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3,-3')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        boundary = response['Content-Type'].split('boundary=')[1]
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Length'], str(len(body)))
+        self.assertIn(b'Content-Range: bytes 0-3/12\r\n\r\nfile\r\n', body)
+        self.assertIn(b'Content-Range: bytes 9-11/12\r\n\r\nent\r\n', body)
+        self.assertTrue(body.endswith('--{}--\r\n'.format(boundary).encode()))
@@ -0,0 +1,57 @@
+import hashlib
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import StorageUser, Folder, File
+
+
+class FileUploadTests(APITestCase):
+
+    def setUp(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.folder = Folder.objects.get(owner=user)
+        self.url = '/api/folders/{}/files/'.format(self.folder.id)
+
+    def upload(self, content):
+        self.client.force_authenticate(user=self.user)
+        data = {'name': 'file.jpg',
+                'file': SimpleUploadedFile("file.jpg", content, content_type="image/jpeg")}
+        # the upload handlers must provide the digest, the content isn't read again
+        with mock.patch('cloudstorage.serializers.file.hash_content', side_effect=AssertionError):
+            return self.client.post(self.url, data, format='multipart')
+
+    def test_upload_records_checksum_and_size(self):
+        response = self.upload(b'file_content')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['checksum'], hashlib.sha256(b'file_content').hexdigest())
+        self.assertEqual(response.data['size'], 12)
+
+        file = File.objects.get(id=response.data['id'])
+        self.assertEqual(file.checksum, file.blob.digest)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_upload_to_temporary_file_records_checksum(self):
+        content = b'x' * 100
+        response = self.upload(content)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['checksum'], hashlib.sha256(content).hexdigest())
+        self.assertEqual(response.data['size'], 100)
+
+    def test_filter_files_by_checksum(self):
+        self.upload(b'file_content')
+        self.upload(b'other_content')
+
+        checksum = hashlib.sha256(b'file_content').hexdigest()
+        response = self.client.get('/api/files/', {'checksum': checksum})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['checksum'], checksum)
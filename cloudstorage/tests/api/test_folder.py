@@ -1,3 +1,4 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -52,11 +53,15 @@ class FolderAPITests(APITestCase):
         self.client.force_authenticate(user=self.user_1)
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['name'], 'user_1_root')
-        self.assertEqual(response.data[0]['parent'], None)
-        self.assertEqual(response.data[1]['name'], 'test_folder_1')
-        self.assertEqual(response.data[1]['parent'], self.folder_root_1.id)
+        results = response.data['results']
+        # sorted by name, including the root folder every user starts with
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['name'], 'root')
+        self.assertEqual(results[1]['name'], 'test_folder_1')
+        self.assertEqual(results[1]['parent'], self.folder_root_1.id)
+        self.assertEqual(results[2]['name'], 'user_1_root')
+        self.assertEqual(results[2]['parent'], None)
+        self.assertIsNone(response.data['next'])
 
     def test_post_folder_list_not_authenticated(self):
         url = '/api/folders/'
@@ -84,6 +89,14 @@ class FolderAPITests(APITestCase):
         self.assertEqual(response.data['owner'], self.user_1.id)
         self.assertEqual(Folder.objects.get(name='folder_3').id, response.data['id'])
 
+    @override_settings(FOLDER_MAX_DEPTH=1)
+    def test_post_folder_list_too_deep(self):
+        data = {'name': 'folder_3', 'parent': self.folder_1.id}
+        self.client.force_authenticate(user=self.user_1)
+        response = self.client.post('/api/folders/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Folder.objects.filter(name='folder_3').exists())
+
     def test_get_folder_detail_not_authenticated(self):
         url = '/api/folders/{}/' .format(self.folder_1.id)
         response = self.client.get(url)
@@ -107,6 +120,15 @@ class FolderAPITests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], 'test_folder_1')
+        self.assertEqual(response.data['tree_id'], self.folder_1.tree_id)
+
+    @override_settings(FOLDER_HIERARCHY='path')
+    def test_get_folder_detail_without_tree_id(self):
+        # not kept up to date under the path engine
+        url = '/api/folders/{}/' .format(self.folder_1.id)
+        self.client.force_authenticate(user=self.user_1)
+        response = self.client.get(url)
+        self.assertNotIn('tree_id', response.data)
 
     def test_put_folder_detail_not_authenticated(self):
         url = '/api/folders/{}/' .format(self.folder_1.id)
@@ -141,7 +163,9 @@ class FolderAPITests(APITestCase):
         url = '/api/folders/{}/' .format(self.folder_1.id)
         self.client.force_authenticate(user=self.user_1)
         response = self.client.delete(url)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        with self.assertRaises(Folder.DoesNotExist):
-            Folder.objects.get(id=self.folder_1.id)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNotNone(Folder.objects.get(id=self.folder_1.id).deleted_at)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
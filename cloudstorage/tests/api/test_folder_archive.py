@@ -0,0 +1,133 @@
+import io
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.archive import ReadAheadFeed
+from cloudstorage.models import Folder, File
+from cloudstorage.tests.utils import FolderTestMixin, make_user
+
+
+class FolderArchiveTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # root
+        #   photos
+        #     2017
+        #     empty
+        #   notes.txt
+        self.photos = self.make_folder('photos', self.root)
+        self.child = self.make_folder('2017', self.photos)
+        self.empty = self.make_folder('empty', self.photos)
+
+        self.make_file('notes.txt', self.root, b'hello ' * 1000, 'text/plain')
+        self.make_file('cat.jpg', self.photos, b'\xff\xd8 cat', 'image/jpeg')
+        self.make_file('cat.jpg', self.photos, b'\xff\xd8 other cat', 'image/jpeg')
+        self.make_file('dog.jpg', self.child, b'\xff\xd8 dog', 'image/jpeg')
+
+        self.client.force_authenticate(user=self.user)
+
+    def make_file(self, name, folder, content, mime_type):
+        file = File()
+        file.name = name
+        file.original_name = name
+        file.size = len(content)
+        file.mime_type = mime_type
+        file.folder = folder
+        file.owner = self.user
+        file.file = SimpleUploadedFile(name, content, content_type=mime_type)
+        file.save()
+        return file
+
+    def get_archive(self, folder):
+        response = self.client.get('/api/folders/{}/archive/'.format(folder.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_archive(self):
+        archive = self.get_archive(self.root)
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(sorted(archive.namelist()), [
+            'notes.txt',
+            'photos/',
+            'photos/2017/',
+            'photos/2017/dog.jpg',
+            'photos/cat (2).jpg',
+            'photos/cat.jpg',
+            'photos/empty/',
+        ])
+        self.assertEqual(archive.read('notes.txt'), b'hello ' * 1000)
+        self.assertEqual(archive.read('photos/2017/dog.jpg'), b'\xff\xd8 dog')
+        self.assertEqual({archive.read('photos/cat.jpg'), archive.read('photos/cat (2).jpg')},
+                         {b'\xff\xd8 cat', b'\xff\xd8 other cat'})
+
+    def test_compressed_types_stored(self):
+        archive = self.get_archive(self.root)
+        self.assertEqual(archive.getinfo('notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertLess(archive.getinfo('notes.txt').compress_size, 6000)
+        self.assertEqual(archive.getinfo('photos/cat.jpg').compress_type, zipfile.ZIP_STORED)
+
+    def test_subfolder(self):
+        archive = self.get_archive(self.photos)
+        self.assertEqual(sorted(archive.namelist()),
+                         ['2017/', '2017/dog.jpg', 'cat (2).jpg', 'cat.jpg', 'empty/'])
+        response = self.client.get('/api/folders/{}/archive/'.format(self.photos.id))
+        self.assertEqual(response['Content-Disposition'], "attachment; filename*=UTF-8''photos.zip")
+
+    @override_settings(FILE_STREAM_CHUNK_SIZE=16, ARCHIVE_READ_AHEAD=1)
+    def test_small_chunks(self):
+        archive = self.get_archive(self.root)
+        self.assertEqual(archive.read('notes.txt'), b'hello ' * 1000)
+
+    @override_settings(ARCHIVE_READ_AHEAD=1)
+    def test_read_ahead_of_one(self):
+        archive = self.get_archive(self.root)
+        self.assertEqual(archive.read('notes.txt'), b'hello ' * 1000)
+        self.assertEqual(archive.read('photos/2017/dog.jpg'), b'\xff\xd8 dog')
+
+    def test_rows_fetched_as_needed(self):
+        fetched = []
+
+        def rows():
+            for i in range(10):
+                fetched.append(i)
+                yield (i, 'user_1/{}.txt'.format(i))
+
+        feed = ReadAheadFeed(rows(), 2)
+        self.assertEqual(len(fetched), 2)
+        rows = iter(feed)
+        self.assertEqual(next(rows)[0], 0)
+        self.assertEqual(len(fetched), 3)
+        self.assertEqual([field_file.name for field_file in [feed.queue.get() for i in range(3)]],
+                         ['user_1/0.txt', 'user_1/1.txt', 'user_1/2.txt'])
+
+        self.assertEqual([row[0] for row in rows], list(range(1, 10)))
+        # the rest, up to the end marker
+        self.assertEqual(len(list(feed.field_files())), 7)
+
+    def test_trash_left_out(self):
+        self.client.delete('/api/folders/{}/'.format(self.child.id))
+        archive = self.get_archive(self.root)
+        self.assertNotIn('photos/2017/dog.jpg', archive.namelist())
+        self.assertNotIn('photos/2017/', archive.namelist())
+
+    def test_other_users_folder(self):
+        other_user = make_user('other@test.com', 'richard', 'jones')
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get('/api/folders/{}/archive/'.format(self.photos.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abandoned_download(self):
+        response = self.client.get('/api/folders/{}/archive/'.format(self.root.id))
+        next(iter(response.streaming_content))
+        response.close()
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathFolderArchiveTests(FolderArchiveTests):
+    pass
@@ -0,0 +1,85 @@
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import Folder, File
+from cloudstorage.tests.utils import FolderTestMixin, make_user
+
+
+class FolderContentsTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.photos = self.make_folder('photos', self.root)
+        self.folder = self.make_folder('2017', self.photos)
+
+        self.other_user = make_user('other@test.com', 'richard', 'jones')
+
+        self.url = '/api/folders/{}/contents/'.format(self.folder.id)
+
+    def make_file(self, name, folder):
+        file = File()
+        file.name = name
+        file.original_name = name
+        file.size = 1
+        file.mime_type = 'image/jpeg'
+        file.folder = folder
+        file.owner = self.user
+        file.file = 'user_{}/{}'.format(self.user.id, name)
+        file.save()
+        return file
+
+    def test_contents_not_authenticated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_contents_other_user(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_contents(self):
+        self.make_folder('march', self.folder)
+        self.make_folder('january', self.folder)
+        self.make_folder('grandchild', Folder.objects.get(name='march'))
+        file = self.make_file('beach.jpg', self.folder)
+        self.make_file('elsewhere.jpg', self.photos)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['folder']['id'], self.folder.id)
+        self.assertEqual([folder['name'] for folder in response.data['path']], ['root', 'photos', '2017'])
+        self.assertEqual([folder['name'] for folder in response.data['folders']], ['january', 'march'])
+        self.assertEqual([f['id'] for f in response.data['files']], [file.id])
+
+    def test_contents_root_folder(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/folders/{}/contents/'.format(self.root.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([folder['id'] for folder in response.data['path']], [self.root.id])
+        self.assertEqual([folder['name'] for folder in response.data['folders']], ['photos'])
+        self.assertEqual(response.data['files'], [])
+
+    def test_query_count_independent_of_size(self):
+        self.client.force_authenticate(user=self.user)
+        self.make_folder('child', self.folder)
+        self.make_file('file.jpg', self.folder)
+
+        # the folder, its path, children and files
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+        for i in range(10):
+            self.make_folder('child_{}'.format(i), self.folder)
+            self.make_file('file_{}.jpg'.format(i), self.folder)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['folders']), 11)
+        self.assertEqual(len(response.data['files']), 11)
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathFolderContentsTests(FolderContentsTests):
+    pass
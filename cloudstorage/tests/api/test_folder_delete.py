@@ -0,0 +1,135 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.deletion import purge_trash
+from cloudstorage.models import Folder, File, Blob
+from cloudstorage.storage import s3_object
+from cloudstorage.tests.utils import S3StorageMixin, FolderTestMixin
+
+
+class FolderDeleteTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.folder = self.make_folder('photos', self.root)
+        self.child = self.make_folder('2017', self.folder)
+        self.other = self.make_folder('music', self.root)
+
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, folder, content):
+        url = '/api/folders/{}/files/'.format(folder.id)
+        data = {'name': 'file.jpg',
+                'file': SimpleUploadedFile("file.jpg", content, content_type="image/jpeg")}
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return File.objects.get(id=response.data['id'])
+
+    def delete(self, folder):
+        response = self.client.delete('/api/folders/{}/'.format(folder.id))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_delete_hides_subtree(self):
+        self.upload(self.child, b'file_content')
+        self.delete(self.folder)
+
+        response = self.client.get('/api/folders/{}/'.format(self.child.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/folders/{}/files/'.format(self.child.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get('/api/folders/')
+        self.assertEqual([folder['name'] for folder in response.data['results']], ['music', 'root'])
+        response = self.client.get('/api/files/')
+        self.assertEqual(response.data['results'], [])
+
+        response = self.client.get('/api/folders/{}/contents/'.format(self.root.id))
+        self.assertEqual([folder['name'] for folder in response.data['folders']], ['music'])
+
+    def test_delete_flags_subtree(self):
+        self.delete(self.folder)
+        trashed = set(Folder.objects.filter(trashed=True).values_list('name', flat=True))
+        self.assertEqual(trashed, {'photos', '2017'})
+
+    def test_restore_keeps_nested_delete(self):
+        grandchild = self.make_folder('summer', self.child)
+        self.delete(self.child)
+        self.delete(self.folder)
+
+        response = self.client.post('/api/folders/{}/restore/'.format(self.folder.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        trashed = set(Folder.objects.filter(trashed=True).values_list('name', flat=True))
+        self.assertEqual(trashed, {'2017', 'summer'})
+        response = self.client.get('/api/folders/{}/'.format(grandchild.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_listing_cost_independent_of_trash(self):
+        for i in range(5):
+            self.delete(self.make_folder('old_{}'.format(i), self.other))
+        url = '/api/folders/{}/contents/'.format(self.root.id)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual([folder['name'] for folder in response.data['folders']], ['music', 'photos'])
+
+    def test_move_into_deleted_folder(self):
+        self.delete(self.folder)
+        url = '/api/folders/{}/'.format(self.other.id)
+        response = self.client.put(url, {'name': 'music', 'parent': self.child.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge(self):
+        file = self.upload(self.child, b'file_content')
+        storage = file.blob.file.storage
+        name = file.blob.file.name
+        self.delete(self.folder)
+
+        self.assertEqual(purge_trash(retention=0, batch_size=1), (1, 0))
+        self.assertFalse(Folder.objects.filter(id__in=[self.folder.id, self.child.id]).exists())
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(storage.exists(name))
+        self.assertTrue(Folder.objects.filter(id=self.other.id).exists())
+
+    def test_purge_keeps_shared_content(self):
+        file = self.upload(self.child, b'file_content')
+        self.upload(self.other, b'file_content')
+        self.delete(self.folder)
+
+        purge_trash(retention=0)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.refcount, 1)
+        self.assertTrue(blob.file.storage.exists(blob.file.name))
+
+    def test_purge_nested_deletes(self):
+        self.delete(self.child)
+        self.delete(self.folder)
+
+        self.assertEqual(purge_trash(retention=0), (2, 0))
+        self.assertEqual(set(Folder.objects.values_list('name', flat=True)), {'root', 'music'})
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathFolderDeleteTests(FolderDeleteTests):
+    pass
+
+
+class S3FolderPurgeTests(S3StorageMixin, FolderTestMixin, APITestCase):
+
+    def test_purge_deletes_objects_in_bulk(self):
+        folder = self.make_folder('photos', self.root)
+
+        # files stored before deduplication point straight at their object
+        for i in range(3):
+            key = 'user_{}/{}.txt'.format(self.user.id, i)
+            s3_object(self.storage, key).put(Body=b'hello')
+            File.objects.create(name='{}.txt'.format(i), original_name='{}.txt'.format(i), size=5,
+                                mime_type='text/plain', folder=folder, owner=self.user, file=key)
+
+        self.client.force_authenticate(user=self.user)
+        self.client.delete('/api/folders/{}/'.format(folder.id))
+        purge_trash(retention=0, batch_size=2)
+
+        self.assertFalse(File.objects.exists())
+        self.assertEqual(list(self.storage.bucket.objects.all()), [])
@@ -0,0 +1,200 @@
+import io
+import tarfile
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import Change, StorageUser, Folder, File
+from cloudstorage.tests.utils import FolderTestMixin, make_user
+
+
+def make_zip(entries):
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, 'w') as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return content.getvalue()
+
+
+def make_tar(entries):
+    content = io.BytesIO()
+    with tarfile.open(fileobj=content, mode='w:gz') as archive:
+        for name, data in entries:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return content.getvalue()
+
+
+class FolderImportTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # root
+        #   photos
+        #     2017
+        #   music
+        self.photos = self.make_folder('photos', self.root)
+        self.child = self.make_folder('2017', self.photos)
+        self.music = self.make_folder('music', self.root)
+
+        self.client.force_authenticate(user=self.user)
+
+    def import_archive(self, folder, content, name='archive.zip'):
+        url = '/api/folders/{}/import/'.format(folder.id)
+        data = {'archive': SimpleUploadedFile(name, content, content_type='application/octet-stream')}
+        return self.client.post(url, data, format='multipart')
+
+    def get_names(self, folder):
+        return sorted(Folder.objects.filter(parent=folder).values_list('name', flat=True)), \
+            sorted(File.objects.filter(folder=folder).values_list('name', flat=True))
+
+    def assertTreeValid(self):
+        folders = list(Folder.objects.filter(owner=self.user))
+        for folder in folders:
+            by_path = {f.pk for f in folders if f.path.startswith(folder.path)}
+            by_mptt = {f.pk for f in folders if f.tree_id == folder.tree_id and folder.lft <= f.lft <= folder.rght}
+            self.assertEqual(by_mptt, by_path, folder.name)
+            parent = [f for f in folders if f.pk == folder.parent_id]
+            if parent:
+                self.assertEqual(folder.level, parent[0].level + 1)
+        values = sorted([f.lft for f in folders] + [f.rght for f in folders])
+        self.assertEqual(values, list(range(1, 2 * len(folders) + 1)))
+
+    def test_import_zip(self):
+        response = self.import_archive(self.root, make_zip([
+            ('readme.txt', b'hello'),
+            ('photos/cat.jpg', b'cat'),
+            ('photos/2017/dog.jpg', b'dog'),
+            ('photos/2018/bird.jpg', b'bird'),
+            ('docs/', b''),
+            ('docs/drafts/notes.txt', b'notes'),
+        ]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'folders': 3, 'files': 5})
+
+        self.assertEqual(self.get_names(self.root), (['docs', 'music', 'photos'], ['readme.txt']))
+        self.assertEqual(self.get_names(self.photos), (['2017', '2018'], ['cat.jpg']))
+        self.assertEqual(self.get_names(self.child), ([], ['dog.jpg']))
+        docs = Folder.objects.get(name='docs')
+        self.assertEqual(self.get_names(docs), (['drafts'], []))
+
+        notes = File.objects.get(name='notes.txt')
+        self.assertEqual(notes.mime_type, 'text/plain')
+        self.assertEqual(notes.file.read(), b'notes')
+        self.assertTreeValid()
+
+    def test_rows_inserted_meanwhile_not_taken(self):
+        bulk_create_files = File.objects.bulk_create
+        bulk_create_folders = Folder.objects.bulk_create
+
+        # rows another request inserts next to the imported ones, without
+        # an id handed back
+        def insert_file(files, **kwargs):
+            bulk_create_files([File(name='other.txt', original_name='other.txt', size=1, mime_type='text/plain',
+                                    folder=self.photos, owner=self.user)])
+            return bulk_create_files(files, **kwargs)
+
+        def insert_folder(folders, **kwargs):
+            bulk_create_folders([Folder(name='other', parent=self.root, owner=self.user, path='',
+                                        tree_id=self.root.tree_id, lft=0, rght=0, level=1)])
+            return bulk_create_folders(folders, **kwargs)
+
+        with mock.patch('cloudstorage.imports.returns_bulk_ids', return_value=False), \
+                mock.patch.object(File.objects, 'bulk_create', side_effect=insert_file), \
+                mock.patch.object(Folder.objects, 'bulk_create', side_effect=insert_folder):
+            response = self.import_archive(self.root, make_zip([
+                ('photos/cat.jpg', b'cat'),
+                ('docs/notes.txt', b'notes'),
+            ]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        changes = Change.objects.filter(owner=self.user, action=Change.CREATE)
+        self.assertEqual(set(changes.filter(kind=Change.KIND_FILE).values_list('item_id', flat=True)),
+                         set(File.objects.filter(name__in=['cat.jpg', 'notes.txt']).values_list('id', flat=True)))
+        docs = Folder.objects.get(name='docs')
+        self.assertIn(docs.id, changes.filter(kind=Change.KIND_FOLDER).values_list('item_id', flat=True))
+        self.assertEqual(docs.path, self.root.path + '{:010d}'.format(docs.id))
+        self.assertEqual(Folder.objects.get(name='other').path, '')
+
+    def test_import_tar(self):
+        response = self.import_archive(self.music, make_tar([
+            ('./albums/one/track.mp3', b'track'),
+            ('albums/two/track.mp3', b'track'),
+        ]), name='archive.tar.gz')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'folders': 3, 'files': 2})
+
+        self.assertEqual(File.objects.get(folder__name='one').file.read(), b'track')
+        # same content, stored once
+        self.assertEqual(len(set(File.objects.values_list('blob_id', flat=True))), 1)
+        self.assertTreeValid()
+
+    def test_usage_and_listings(self):
+        etag = self.client.get('/api/folders/{}/files/'.format(self.child.id))['ETag']
+        self.import_archive(self.photos, make_zip([('2017/dog.jpg', b'dog'), ('new/cat.jpg', b'kitty')]))
+
+        self.assertEqual(Folder.objects.get(pk=self.child.pk).size, 3)
+        self.assertEqual(Folder.objects.get(pk=self.photos.pk).size, 8)
+        self.assertEqual(Folder.objects.get(pk=self.root.pk).file_count, 2)
+        user = StorageUser.objects.get(pk=self.user.pk)
+        self.assertEqual((user.storage_used, user.file_count), (8, 2))
+
+        response = self.client.get('/api/folders/{}/files/'.format(self.child.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([f['name'] for f in response.data['results']], ['dog.jpg'])
+
+    def test_folders_created_afterwards(self):
+        self.import_archive(self.photos, make_zip([('a/b/c/file.txt', b'x')]))
+        self.make_folder('later', Folder.objects.get(name='b'))
+        self.make_folder('after', self.music)
+        self.assertTreeValid()
+
+    def test_trashed_folder_not_merged(self):
+        self.client.delete('/api/folders/{}/'.format(self.child.id))
+        response = self.import_archive(self.photos, make_zip([('2017/dog.jpg', b'dog')]))
+        self.assertEqual(response.data, {'folders': 1, 'files': 1})
+        self.assertEqual(File.objects.get().folder.deleted_at, None)
+
+    def test_unsafe_names_skipped(self):
+        response = self.import_archive(self.root, make_zip([('../escape.txt', b'x'), ('ok.txt', b'y')]))
+        self.assertEqual(response.data, {'folders': 0, 'files': 1})
+
+    def test_not_an_archive(self):
+        response = self.import_archive(self.root, b'just some bytes')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/folders/{}/import/'.format(self.root.id), {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IMPORT_MAX_ENTRIES=1)
+    def test_too_many_entries(self):
+        response = self.import_archive(self.root, make_zip([('a.txt', b'a'), ('b.txt', b'b')]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(File.objects.exists())
+
+    @override_settings(DEFAULT_USER_QUOTA=1024)
+    def test_over_quota(self):
+        response = self.import_archive(self.root, make_zip([('big.txt', b'x' * 2048)]))
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(File.objects.exists())
+
+    def test_other_users_folder(self):
+        other_user = make_user('other@test.com', 'richard', 'jones')
+        self.client.force_authenticate(user=other_user)
+        response = self.import_archive(self.photos, make_zip([('a.txt', b'a')]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathFolderImportTests(FolderImportTests):
+
+    def assertTreeValid(self):
+        folders = list(Folder.objects.filter(owner=self.user))
+        for folder in folders:
+            parent = [f for f in folders if f.pk == folder.parent_id]
+            expected = (parent[0].path if parent else '') + '{:010d}'.format(folder.pk)
+            self.assertEqual(folder.path, expected)
@@ -0,0 +1,93 @@
+import json
+
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import Folder, File
+from cloudstorage.tests.utils import FolderTestMixin, make_user
+
+
+class FolderTreeTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # root
+        #   a
+        #     a1
+        #       a1x
+        #     a2
+        #   b
+        self.a = self.make_folder('a', self.root)
+        self.a1 = self.make_folder('a1', self.a)
+        self.a1x = self.make_folder('a1x', self.a1)
+        self.a2 = self.make_folder('a2', self.a)
+        self.b = self.make_folder('b', self.root)
+
+        self.make_file('root.txt', self.root)
+        self.make_file('a1x.txt', self.a1x)
+        self.make_file('b_1.txt', self.b)
+        self.make_file('b_2.txt', self.b)
+
+        self.other_user = make_user('other@test.com', 'richard', 'jones')
+
+    def make_file(self, name, folder):
+        file = File()
+        file.name = name
+        file.original_name = name
+        file.size = 1
+        file.mime_type = 'text/plain'
+        file.folder = folder
+        file.owner = self.user
+        file.file = 'user_{}/{}'.format(self.user.id, name)
+        file.save()
+        return file
+
+    def get_tree(self, folder, **params):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/folders/{}/tree/'.format(folder.id), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+
+    def names(self, node):
+        return [node['name'], [self.names(child) for child in node['children']]]
+
+    def test_tree_not_authenticated(self):
+        response = self.client.get('/api/folders/{}/tree/'.format(self.root.id))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_tree_other_user(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get('/api/folders/{}/tree/'.format(self.root.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tree(self):
+        tree = self.get_tree(self.root)
+        self.assertEqual(self.names(tree),
+                         ['root', [['a', [['a1', [['a1x', []]]], ['a2', []]]], ['b', []]]])
+        self.assertEqual(tree['children'][0]['parent'], self.root.id)
+        self.assertNotIn('files', tree)
+
+    def test_subtree(self):
+        tree = self.get_tree(self.a)
+        self.assertEqual(self.names(tree), ['a', [['a1', [['a1x', []]]], ['a2', []]]])
+
+    def test_tree_with_files(self):
+        tree = self.get_tree(self.root, files='true')
+        self.assertEqual([f['name'] for f in tree['files']], ['root.txt'])
+        a, b = tree['children']
+        self.assertEqual(a['files'], [])
+        self.assertEqual([f['name'] for f in a['children'][0]['children'][0]['files']], ['a1x.txt'])
+        self.assertEqual([f['name'] for f in b['files']], ['b_1.txt', 'b_2.txt'])
+
+    def test_tree_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        # the folder and its subtree and files
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/folders/{}/tree/'.format(self.root.id), {'files': 'true'})
+            b''.join(response.streaming_content)
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathFolderTreeTests(FolderTreeTests):
+    pass
@@ -0,0 +1,175 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import StorageUser, Folder, File
+from cloudstorage.tests.utils import S3StorageMixin
+
+
+class ListingCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.root = Folder.objects.get(owner=user)
+
+        self.photos = Folder()
+        self.photos.name = 'photos'
+        self.photos.parent = self.root
+        self.photos.owner = user
+        self.photos.save()
+
+        self.files_url = '/api/folders/{}/files/'.format(self.photos.id)
+        self.client.force_authenticate(user=user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def upload(self, name='file.jpg'):
+        data = {'name': name,
+                'file': SimpleUploadedFile(name, b'12345', content_type="image/jpeg")}
+        response = self.client.post(self.files_url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response['ETag']
+
+    def test_not_modified(self):
+        for url in ('/api/folders/', self.files_url):
+            etag = self.get_etag(url)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale", {}'.format(etag))
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cached_listing(self):
+        self.upload()
+        first = self.client.get(self.files_url)
+        # just the folder, no listing
+        with self.assertNumQueries(1):
+            second = self.client.get(self.files_url)
+        self.assertEqual(second.data, first.data)
+
+    def test_upload_changes_listings(self):
+        folders_etag = self.get_etag('/api/folders/')
+        files_etag = self.get_etag(self.files_url)
+        self.upload()
+
+        response = self.client.get(self.files_url, HTTP_IF_NONE_MATCH=files_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        # the folder counters changed
+        response = self.client.get('/api/folders/', HTTP_IF_NONE_MATCH=folders_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_rename_changes_listings(self):
+        file_id = self.upload()
+        folders_etag = self.get_etag('/api/folders/')
+        files_etag = self.get_etag(self.files_url)
+
+        self.client.put('/api/folders/{}/'.format(self.photos.id),
+                        {'name': 'pictures', 'parent': self.root.id}, format='json')
+        response = self.client.get('/api/folders/')
+        self.assertNotEqual(response['ETag'], folders_etag)
+        self.assertIn('pictures', [folder['name'] for folder in response.data['results']])
+
+        self.client.put('{}{}/'.format(self.files_url, file_id), {'name': 'renamed.jpg'}, format='json')
+        response = self.client.get(self.files_url)
+        self.assertNotEqual(response['ETag'], files_etag)
+        self.assertEqual(response.data['results'][0]['name'], 'renamed.jpg')
+
+    def test_trash_changes_listings(self):
+        file_id = self.upload()
+        files_etag = self.get_etag(self.files_url)
+        self.client.delete('{}{}/'.format(self.files_url, file_id))
+        response = self.client.get(self.files_url)
+        self.assertNotEqual(response['ETag'], files_etag)
+        self.assertEqual(response.data['results'], [])
+
+        folders_etag = self.get_etag('/api/folders/')
+        self.client.delete('/api/folders/{}/'.format(self.photos.id))
+        response = self.client.get('/api/folders/')
+        self.assertNotEqual(response['ETag'], folders_etag)
+        self.assertNotIn('photos', [folder['name'] for folder in response.data['results']])
+
+    def test_query_params(self):
+        self.assertNotEqual(self.get_etag(self.files_url), self.get_etag(self.files_url + '?page=2'))
+
+    def test_listings_are_per_user(self):
+        other = StorageUser()
+        other.email = 'other@test.com'
+        other.first_name = 'meredith'
+        other.last_name = 'grey'
+        other.save()
+        etag = self.get_etag('/api/folders/')
+
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/folders/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('photos', [folder['name'] for folder in response.data['results']])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'files.example.com'])
+    def test_listings_are_per_host(self):
+        self.upload()
+        first = self.client.get(self.files_url)
+        second = self.client.get(self.files_url, HTTP_HOST='files.example.com')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertTrue(second.data['results'][0]['file'].startswith('http://files.example.com/'))
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathListingCacheTests(ListingCacheTests):
+    pass
+
+
+class S3ListingCacheTests(S3StorageMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.save()
+        self.user = user
+        self.root = Folder.objects.get(owner=user)
+        self.url = '/api/folders/{}/files/'.format(self.root.id)
+        self.client.force_authenticate(user=user)
+
+        file = File(name='boop.jpg', original_name='boop.jpg', size=12, mime_type='image/jpeg',
+                    folder=self.root, owner=user)
+        file.file = SimpleUploadedFile('file.jpg', b'file_content', content_type='image/jpeg')
+        file.save()
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def test_signed_urls_renewed(self):
+        self.storage.querystring_expire = 600
+        with mock.patch('cloudstorage.listing_cache.time.time', return_value=1000):
+            first = self.client.get(self.url)
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+
+        # half the signature lifetime later the listing is signed again
+        with mock.patch('cloudstorage.listing_cache.time.time', return_value=1300):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertIn('Signature', response.data['results'][0]['file'])
@@ -1,8 +1,7 @@
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
-from cloudstorage.models import StorageUser
+from cloudstorage.models import AuthToken, StorageUser
 
 
 class LoginAPITests(APITestCase):
@@ -22,24 +21,37 @@ class LoginAPITests(APITestCase):
         data = {'email': 'test@test.com', 'password': 'password'}
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(Token.objects.count(), 1)
-        token = Token.objects.get(user=self.user)
+        self.assertEqual(AuthToken.objects.count(), 1)
+        token = AuthToken.objects.get(user=self.user)
         self.assertEqual(response.data['token'], token.key)
+        self.assertEqual(response.data['expires'], token.expires)
 
-    def test_login_cycles_token(self):
+    def test_login_keeps_other_devices_signed_in(self):
 
         url = '/api/login/'
-        data = {'email': 'test@test.com', 'password': 'password'}
+        data = {'email': 'test@test.com', 'password': 'password', 'device': 'phone'}
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(Token.objects.count(), 1)
-        token = Token.objects.get(user=self.user)
-        self.assertEqual(response.data['token'], token.key)
+        phone_token = response.data['token']
+
+        data['device'] = 'laptop'
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['token'], phone_token)
+        self.assertTrue(AuthToken.objects.filter(key=phone_token).exists())
+
+    def test_login_reuses_device_token(self):
+
+        url = '/api/login/'
+        data = {'email': 'test@test.com', 'password': 'password', 'device': 'phone'}
+        response = self.client.post(url, data, format='json')
+        token = response.data['token']
 
-        # LOGIN again to cycle token
+        # LOGIN again from the same device
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertNotEqual(response.data['token'], token.key)
+        self.assertEqual(response.data['token'], token)
+        self.assertEqual(AuthToken.objects.count(), 1)
 
     def test_wrong_password(self):
 
@@ -0,0 +1,85 @@
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import StorageUser, Folder, File
+
+
+class PaginationTests(APITestCase):
+
+    def setUp(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.folder = Folder.objects.get(owner=user)
+
+        for i in range(7):
+            file = File()
+            file.name = 'file_{}.txt'.format(i)
+            file.original_name = file.name
+            file.size = 1
+            file.mime_type = 'text/plain'
+            file.folder = self.folder
+            file.owner = user
+            file.file = 'user_{}/{}'.format(user.id, file.name)
+            file.save()
+
+        # ties on modified must be broken by id, not skipped or repeated
+        File.objects.filter(id__lte=File.objects.order_by('id')[3].id).update(modified=timezone.now())
+
+        self.client.force_authenticate(user=user)
+
+    def get_all(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_files_paginated_in_order(self):
+        url = '/api/folders/{}/files/?page_size=3'.format(self.folder.id)
+        ids = self.get_all(url)
+        expected = list(File.objects.order_by('-modified', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_all_files_paginated_in_order(self):
+        ids = self.get_all('/api/files/?page_size=3')
+        expected = list(File.objects.order_by('-modified', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_page(self):
+        url = '/api/folders/{}/files/?page_size=3'.format(self.folder.id)
+        first = self.client.get(url)
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(first.data['previous'])
+
+        response = self.client.get(second.data['previous'])
+        self.assertEqual(response.data['results'], first.data['results'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_folders_paginated_by_name(self):
+        for name in ('b', 'a', 'a', 'c'):
+            folder = Folder()
+            folder.name = name
+            folder.parent = self.folder
+            folder.owner = self.user
+            folder.save()
+
+        response = self.client.get('/api/folders/?page_size=2')
+        names = [item['name'] for item in response.data['results']]
+        response = self.client.get(response.data['next'])
+        names += [item['name'] for item in response.data['results']]
+        response = self.client.get(response.data['next'])
+        names += [item['name'] for item in response.data['results']]
+        self.assertEqual(names, ['a', 'a', 'b', 'c', 'root'])
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/files/?cursor=nonsense')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
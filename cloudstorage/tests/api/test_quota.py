@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.middleware.csrf import _get_new_csrf_token
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from cloudstorage.models import StorageUser, Folder, File, UploadSession
+from cloudstorage.uploadhandlers import QuotaUploadHandler
+
+
+@override_settings(DEFAULT_USER_QUOTA=100 * 1024)
+class QuotaTests(APITestCase):
+
+    def setUp(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.folder = Folder.objects.get(owner=user)
+        self.url = '/api/folders/{}/files/'.format(self.folder.id)
+        self.client.force_authenticate(user=user)
+
+    def upload(self, content):
+        data = {'name': 'file.jpg',
+                'file': SimpleUploadedFile("file.jpg", content, content_type="image/jpeg")}
+        return self.client.post(self.url, data, format='multipart')
+
+    def test_upload_within_quota(self):
+        response = self.upload(b'x' * 1024)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_declared_length_over_quota(self):
+        # turned away on Content-Length, before a single chunk is read
+        with mock.patch.object(QuotaUploadHandler, 'receive_data_chunk') as receive_data_chunk:
+            response = self.upload(b'x' * 200 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(receive_data_chunk.called)
+        self.assertFalse(File.objects.exists())
+
+    def test_upload_aborted_when_quota_runs_out(self):
+        self.upload(b'x' * 90 * 1024)
+        # the declared length fits in the multipart allowance, the handler
+        # stops the upload once the file itself is too large
+        response = self.upload(b'y' * 20 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(File.objects.count(), 1)
+
+    def test_session_upload_aborted_when_quota_runs_out(self):
+        self.upload(b'x' * 90 * 1024)
+
+        # the CSRF check reads the body while authenticating
+        client = APIClient(enforce_csrf_checks=True)
+        client.login(email='test@test.com', password='password')
+        token = _get_new_csrf_token()
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        data = {'name': 'file.jpg', 'csrfmiddlewaretoken': token,
+                'file': SimpleUploadedFile("file.jpg", b'y' * 20 * 1024, content_type="image/jpeg")}
+        with mock.patch.object(QuotaUploadHandler, 'receive_data_chunk', autospec=True,
+                               side_effect=QuotaUploadHandler.receive_data_chunk) as receive_data_chunk:
+            response = client.post(self.url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertTrue(receive_data_chunk.called)
+        self.assertEqual(File.objects.count(), 1)
+
+    def test_session_upload_within_quota(self):
+        client = APIClient(enforce_csrf_checks=True)
+        client.login(email='test@test.com', password='password')
+        token = _get_new_csrf_token()
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        data = {'name': 'file.jpg', 'csrfmiddlewaretoken': token,
+                'file': SimpleUploadedFile("file.jpg", b'x' * 1024, content_type="image/jpeg")}
+        response = client.post(self.url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_trash_counts_towards_quota(self):
+        response = self.upload(b'x' * 90 * 1024)
+        self.client.delete('/api/folders/{}/files/{}/'.format(self.folder.id, response.data['id']))
+        response = self.upload(b'y' * 20 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_emptying_trash_frees_quota(self):
+        response = self.upload(b'x' * 90 * 1024)
+        self.client.delete('/api/folders/{}/files/{}/'.format(self.folder.id, response.data['id']))
+        self.client.delete('/api/trash/')
+        response = self.upload(b'y' * 20 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_user_quota_overrides_default(self):
+        StorageUser.objects.filter(pk=self.user.pk).update(quota=1024 * 1024)
+        response = self.upload(b'x' * 200 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_unlimited_user(self):
+        StorageUser.objects.filter(pk=self.user.pk).update(quota=0)
+        response = self.upload(b'x' * 200 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(DEFAULT_USER_QUOTA=0)
+    def test_no_default_quota(self):
+        response = self.upload(b'x' * 200 * 1024)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_upload_session_over_quota(self):
+        url = '/api/folders/{}/upload-sessions/'.format(self.folder.id)
+        response = self.client.post(url, {'name': 'video.mp4', 'size': 200 * 1024}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_upload_sessions_complete_within_quota(self):
+        # both fit when opened, only one fits once the other has landed
+        url = '/api/folders/{}/upload-sessions/'.format(self.folder.id)
+        sessions = []
+        for name in ('first.bin', 'second.bin'):
+            response = self.client.post(url, {'name': name, 'size': 90 * 1024, 'chunk_size': 90 * 1024},
+                                        format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            sessions.append(response.data['id'])
+
+        for session_id in sessions:
+            self.client.put('/api/upload-sessions/{}/chunks/1/'.format(session_id), b'x' * 90 * 1024,
+                            content_type='application/octet-stream')
+
+        response = self.client.post('/api/upload-sessions/{}/complete/'.format(sessions[0]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/upload-sessions/{}/complete/'.format(sessions[1]))
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        self.assertEqual(StorageUser.objects.get(pk=self.user.pk).storage_used, 90 * 1024)
+        self.assertEqual(File.objects.count(), 1)
+        self.assertFalse(UploadSession.objects.exists())
@@ -0,0 +1,60 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.authentication import token_cache
+from cloudstorage.models import AuthToken, StorageUser
+from cloudstorage.tokens import issue_token
+
+
+class TokenRefreshTests(APITestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.url = '/api/token/refresh/'
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_refresh(self):
+        token = issue_token(self.user, device='phone')
+        AuthToken.objects.filter(pk=token.pk).update(expires=timezone.now() + timedelta(minutes=1))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token'], token.key)
+        self.assertGreater(AuthToken.objects.get(pk=token.pk).expires, timezone.now() + timedelta(days=1))
+
+    def test_refresh_expired_token(self):
+        token = issue_token(self.user)
+        AuthToken.objects.filter(pk=token.pk).update(expires=timezone.now() - timedelta(minutes=1))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_not_authenticated(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_expired_tokens(self):
+        live = issue_token(self.user, device='phone')
+        for device in ('laptop', 'tablet'):
+            token = issue_token(self.user, device=device)
+            AuthToken.objects.filter(pk=token.pk).update(expires=timezone.now() - timedelta(minutes=1))
+
+        out = StringIO()
+        call_command('purge_auth_tokens', batch_size=1, stdout=out)
+        self.assertIn('Purged 2', out.getvalue())
+        self.assertEqual(list(AuthToken.objects.values_list('key', flat=True)), [live.key])
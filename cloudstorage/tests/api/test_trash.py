@@ -0,0 +1,170 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.deletion import purge_trash
+from cloudstorage.models import StorageUser, Folder, File, Blob
+from cloudstorage.tests.utils import FolderTestMixin, make_user
+
+
+class TrashTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.folder = self.make_folder('photos', self.root)
+        self.child = self.make_folder('2017', self.folder)
+
+        self.other_user = make_user('other@test.com', 'richard', 'jones')
+
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, folder, name='file.jpg', content=b'file_content'):
+        url = '/api/folders/{}/files/'.format(folder.id)
+        data = {'name': name,
+                'file': SimpleUploadedFile(name, content, content_type="image/jpeg")}
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return File.objects.get(id=response.data['id'])
+
+    def delete_file(self, file):
+        response = self.client.delete('/api/folders/{}/files/{}/'.format(file.folder_id, file.id))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def delete_folder(self, folder):
+        response = self.client.delete('/api/folders/{}/'.format(folder.id))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_delete_root_folder(self):
+        response = self.client.delete('/api/folders/{}/'.format(self.root.id))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(Folder.objects.get(id=self.root.id).deleted_at)
+        self.assertIsNone(Folder.objects.get(id=self.folder.id).deleted_at)
+
+    def test_delete_file_moves_it_to_trash(self):
+        file = self.upload(self.folder)
+        self.delete_file(file)
+
+        response = self.client.get('/api/folders/{}/files/{}/'.format(self.folder.id, file.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/folders/{}/files/'.format(self.folder.id))
+        self.assertEqual(response.data['results'], [])
+        response = self.client.get('/api/files/')
+        self.assertEqual(response.data['results'], [])
+
+        # the content is kept until the trash is purged
+        self.assertTrue(Blob.objects.filter(refcount=1).exists())
+
+    def test_restore_file(self):
+        file = self.upload(self.folder)
+        self.delete_file(file)
+
+        response = self.client.post('/api/folders/{}/files/{}/restore/'.format(self.folder.id, file.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['deleted_at'])
+
+        response = self.client.get('/api/folders/{}/files/'.format(self.folder.id))
+        self.assertEqual([f['id'] for f in response.data['results']], [file.id])
+
+    def test_restore_live_file(self):
+        file = self.upload(self.folder)
+        response = self.client.post('/api/folders/{}/files/{}/restore/'.format(self.folder.id, file.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_restore_file_in_trashed_folder(self):
+        file = self.upload(self.child)
+        self.delete_file(file)
+        self.delete_folder(self.folder)
+
+        response = self.client.post('/api/folders/{}/files/{}/restore/'.format(self.child.id, file.id))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_restore_folder(self):
+        file = self.upload(self.child)
+        self.delete_folder(self.folder)
+
+        response = self.client.post('/api/folders/{}/restore/'.format(self.folder.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/api/folders/{}/files/'.format(self.child.id))
+        self.assertEqual([f['id'] for f in response.data['results']], [file.id])
+
+    def test_restore_folder_in_trashed_folder(self):
+        self.delete_folder(self.child)
+        self.delete_folder(self.folder)
+
+        response = self.client.post('/api/folders/{}/restore/'.format(self.child.id))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_restore_other_users_folder(self):
+        self.delete_folder(self.folder)
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post('/api/folders/{}/restore/'.format(self.folder.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_trash_lists_top_level_items(self):
+        other = self.make_folder('music', self.root)
+        kept = self.upload(self.folder, 'kept.jpg')
+        inside = self.upload(self.child, 'inside.jpg')
+        self.delete_file(kept)
+        self.delete_file(inside)
+        self.delete_folder(self.child)
+        self.delete_folder(other)
+
+        response = self.client.get('/api/trash/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([folder['name'] for folder in response.data['folders']], ['music', '2017'])
+        self.assertEqual([f['name'] for f in response.data['files']], ['kept.jpg'])
+
+        # once its folder is in the trash too, a file is restored with it
+        self.delete_folder(self.folder)
+        response = self.client.get('/api/trash/')
+        self.assertEqual([folder['name'] for folder in response.data['folders']], ['photos', 'music'])
+        self.assertEqual(response.data['files'], [])
+
+    def test_purge_keeps_recent_trash(self):
+        self.delete_file(self.upload(self.folder))
+        self.delete_folder(self.child)
+
+        self.assertEqual(purge_trash(), (0, 0))
+        self.assertEqual(File.objects.count(), 1)
+        self.assertTrue(Folder.objects.filter(id=self.child.id).exists())
+
+    def test_purge_files(self):
+        file = self.upload(self.folder)
+        storage = file.blob.file.storage
+        name = file.blob.file.name
+        self.delete_file(file)
+        self.upload(self.folder, 'live.jpg', b'other_content')
+
+        self.assertEqual(purge_trash(retention=0), (0, 1))
+        self.assertEqual(list(File.objects.values_list('name', flat=True)), ['live.jpg'])
+        self.assertFalse(storage.exists(name))
+
+    def test_empty_trash(self):
+        file = self.upload(self.folder)
+        name = file.blob.file.name
+        storage = file.blob.file.storage
+        self.delete_file(file)
+        self.upload(self.child, 'child.jpg', b'other_content')
+        self.delete_folder(self.folder)
+
+        other_folder = Folder.objects.get(owner=self.other_user)
+        other_file = File.objects.create(name='x.jpg', original_name='x.jpg', size=1, mime_type='image/jpeg',
+                                         folder=other_folder, owner=self.other_user, deleted_at=timezone.now())
+
+        response = self.client.delete('/api/trash/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Folder.objects.filter(owner=self.user).values_list('name', flat=True)), ['root'])
+        self.assertFalse(File.objects.filter(owner=self.user).exists())
+        self.assertFalse(storage.exists(name))
+        self.assertTrue(File.objects.filter(id=other_file.id).exists())
+
+        user = StorageUser.objects.get(pk=self.user.pk)
+        self.assertEqual((user.storage_used, user.file_count), (0, 0))
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathTrashTests(TrashTests):
+    pass
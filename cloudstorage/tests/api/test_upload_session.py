@@ -0,0 +1,208 @@
+import os
+from datetime import timedelta
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.models import StorageUser, Folder, File, UploadSession
+from cloudstorage.tests.utils import S3StorageMixin
+from cloudstorage.upload_sessions import complete_session, get_staging_path
+from cloudstorage.uploads import UploadConflict
+
+
+class UploadSessionTestMixin(object):
+
+    def setUp(self):
+        super().setUp()
+
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+        self.folder = Folder.objects.get(owner=user)
+
+        other_user = StorageUser()
+        other_user.email = 'other@test.com'
+        other_user.first_name = 'richard'
+        other_user.last_name = 'jones'
+        other_user.save()
+        self.other_user = other_user
+
+        self.client.force_authenticate(user=self.user)
+
+    def open_session(self, data):
+        url = '/api/folders/{}/upload-sessions/'.format(self.folder.id)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data
+
+    def put_chunk(self, session, number, data):
+        url = '/api/upload-sessions/{}/chunks/{}/'.format(session['id'], number)
+        return self.client.put(url, data, content_type='application/octet-stream')
+
+    def complete(self, session):
+        url = '/api/upload-sessions/{}/complete/'.format(session['id'])
+        return self.client.post(url)
+
+
+class UploadSessionTests(UploadSessionTestMixin, APITestCase):
+
+    def test_open_session(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 10, 'chunk_size': 4})
+        self.assertEqual(session['chunk_count'], 3)
+        self.assertEqual(session['received'], [])
+        self.assertEqual(session['mime_type'], 'text/plain')
+        self.assertEqual(session['folder'], self.folder.id)
+
+    def test_open_session_not_authenticated(self):
+        self.client.force_authenticate(user=None)
+        url = '/api/folders/{}/upload-sessions/'.format(self.folder.id)
+        response = self.client.post(url, {'name': 'boop.txt', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_open_session_other_users_folder(self):
+        self.client.force_authenticate(user=self.other_user)
+        url = '/api/folders/{}/upload-sessions/'.format(self.folder.id)
+        response = self.client.post(url, {'name': 'boop.txt', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_chunks_out_of_order(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 10, 'chunk_size': 4})
+
+        self.assertEqual(self.put_chunk(session, 3, b'89').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.put_chunk(session, 1, b'0123').status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/api/upload-sessions/{}/'.format(session['id']))
+        self.assertEqual(response.data['received'], [1, 3])
+
+        # can't complete until every chunk is in
+        self.assertEqual(self.complete(session).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(self.put_chunk(session, 2, b'4567').status_code, status.HTTP_200_OK)
+        response = self.complete(session)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['name'], 'boop.txt')
+        self.assertEqual(response.data['size'], 10)
+
+        file = File.objects.get(id=response.data['id'])
+        self.assertEqual(file.folder, self.folder)
+        self.assertEqual(file.file.read(), b'0123456789')
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_resend_chunk(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.put_chunk(session, 1, b'xxxx')
+        self.put_chunk(session, 1, b'abcd')
+        response = self.complete(session)
+        self.assertEqual(File.objects.get(id=response.data['id']).file.read(), b'abcd')
+
+    def test_chunk_wrong_size(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 10, 'chunk_size': 4})
+        self.assertEqual(self.put_chunk(session, 1, b'012').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.put_chunk(session, 1, b'01234').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.put_chunk(session, 3, b'8').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunk_number_out_of_range(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 10, 'chunk_size': 4})
+        self.assertEqual(self.put_chunk(session, 4, b'89').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.put_chunk(session, 0, b'0123').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_session(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.put_chunk(session, 1, b'abcd').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.complete(session).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abort_session(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.put_chunk(session, 1, b'abcd')
+        response = self.client.delete('/api/upload-sessions/{}/'.format(session['id']))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_session_with_folder_in_trash(self):
+        old = Folder.objects.create(name='old', parent=self.folder, owner=self.user)
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.client.delete('/api/folders/{}/'.format(old.id))
+
+        self.assertEqual(self.client.get('/api/upload-sessions/{}/'.format(session['id'])).status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(self.put_chunk(session, 1, b'abcd').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.complete(session).status_code, status.HTTP_201_CREATED)
+
+    def test_session_in_trashed_folder(self):
+        self.folder = Folder.objects.create(name='old', parent=self.folder, owner=self.user)
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.client.delete('/api/folders/{}/'.format(self.folder.id))
+        self.assertEqual(self.put_chunk(session, 1, b'abcd').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_complete_twice(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.put_chunk(session, 1, b'abcd')
+        stale = UploadSession.objects.get(id=session['id'])
+
+        self.assertEqual(self.complete(session).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.complete(session).status_code, status.HTTP_404_NOT_FOUND)
+        # eg. a request that looked the session up just before the first one finished
+        with self.assertRaises(UploadConflict):
+            complete_session(stale)
+        self.assertEqual(File.objects.count(), 1)
+
+    def test_complete_staging_file_gone(self):
+        session = self.open_session({'name': 'boop.txt', 'size': 4, 'chunk_size': 4})
+        self.put_chunk(session, 1, b'abcd')
+        os.remove(get_staging_path(UploadSession.objects.get(id=session['id'])))
+
+        self.assertEqual(self.complete(session).status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(File.objects.exists())
+
+    def test_purge_stale_sessions(self):
+        stale = self.open_session({'name': 'old.txt', 'size': 4, 'chunk_size': 4})
+        fresh = self.open_session({'name': 'new.txt', 'size': 4, 'chunk_size': 4})
+        UploadSession.objects.filter(id=stale['id']).update(created=timezone.now() - timedelta(days=30))
+
+        call_command('purge_upload_sessions', stdout=open('/dev/null', 'w'))
+        self.assertEqual(list(UploadSession.objects.values_list('id', flat=True)), [fresh['id']])
+
+
+class S3UploadSessionTests(UploadSessionTestMixin, S3StorageMixin, APITestCase):
+
+    def test_chunk_size_below_s3_minimum(self):
+        url = '/api/folders/{}/upload-sessions/'.format(self.folder.id)
+        response = self.client.post(url, {'name': 'boop.txt', 'size': 10, 'chunk_size': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_multipart_upload(self):
+        chunk_size = 5 * 1024 * 1024
+        first, last = b'a' * chunk_size, b'b' * 10
+        session = self.open_session({'name': 'big.bin', 'size': chunk_size + 10, 'chunk_size': chunk_size})
+
+        self.assertEqual(self.put_chunk(session, 2, last).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.put_chunk(session, 1, first).status_code, status.HTTP_200_OK)
+
+        response = self.complete(session)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        file = File.objects.get(id=response.data['id'])
+        self.assertEqual(file.file.size, chunk_size + 10)
+        obj = self.storage.bucket.Object(file.file.name).get(Range='bytes={}-'.format(chunk_size - 2))
+        self.assertEqual(obj['Body'].read(), b'aa' + last)
+
+    def test_multipart_upload_gone(self):
+        chunk_size = 5 * 1024 * 1024
+        session = self.open_session({'name': 'big.bin', 'size': 10, 'chunk_size': chunk_size})
+        self.put_chunk(session, 1, b'0123456789')
+
+        # eg. completed by a request on another server
+        error = ClientError({'Error': {'Code': 'NoSuchUpload'}}, 'CompleteMultipartUpload')
+        with mock.patch.object(self.storage.bucket.meta.client, 'complete_multipart_upload', side_effect=error):
+            response = self.complete(session)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(File.objects.exists())
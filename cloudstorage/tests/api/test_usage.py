@@ -0,0 +1,143 @@
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cloudstorage.deletion import purge_trash
+from cloudstorage.models import StorageUser, Folder, File
+from cloudstorage.tests.utils import FolderTestMixin
+
+
+class UsageTests(FolderTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # root
+        #   photos
+        #     2017
+        #   music
+        self.photos = self.make_folder('photos', self.root)
+        self.child = self.make_folder('2017', self.photos)
+        self.music = self.make_folder('music', self.root)
+
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, folder, content, name='file.jpg'):
+        url = '/api/folders/{}/files/'.format(folder.id)
+        data = {'name': name,
+                'file': SimpleUploadedFile(name, content, content_type="image/jpeg")}
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return File.objects.get(id=response.data['id'])
+
+    def assertUsage(self, folder, size, file_count):
+        folder = Folder.objects.get(pk=folder.pk)
+        self.assertEqual((folder.size, folder.file_count), (size, file_count), folder.name)
+
+    def assertUserUsage(self, size, file_count):
+        user = StorageUser.objects.get(pk=self.user.pk)
+        self.assertEqual((user.storage_used, user.file_count), (size, file_count))
+
+    def test_upload_counts_towards_ancestors(self):
+        self.upload(self.child, b'12345')
+        self.upload(self.photos, b'123')
+
+        self.assertUsage(self.child, 5, 1)
+        self.assertUsage(self.photos, 8, 2)
+        self.assertUsage(self.root, 8, 2)
+        self.assertUsage(self.music, 0, 0)
+        self.assertUserUsage(8, 2)
+
+    def test_move_folder(self):
+        self.upload(self.child, b'12345')
+
+        response = self.client.put('/api/folders/{}/'.format(self.child.id),
+                                   {'name': '2017', 'parent': self.music.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertUsage(self.photos, 0, 0)
+        self.assertUsage(self.music, 5, 1)
+        self.assertUsage(self.root, 5, 1)
+        self.assertUserUsage(5, 1)
+
+    def test_rename_folder_keeps_counters(self):
+        self.upload(self.photos, b'12345')
+        response = self.client.put('/api/folders/{}/'.format(self.photos.id),
+                                   {'name': 'pictures', 'parent': self.root.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['size'], 5)
+        self.assertUsage(self.photos, 5, 1)
+
+    def test_trash_and_restore(self):
+        file = self.upload(self.child, b'12345')
+        self.upload(self.photos, b'123')
+
+        self.client.delete('/api/folders/{}/files/{}/'.format(self.child.id, file.id))
+        self.assertUsage(self.root, 3, 1)
+        self.client.delete('/api/folders/{}/'.format(self.photos.id))
+        self.assertUsage(self.root, 0, 0)
+        # still stored until the trash is purged
+        self.assertUserUsage(8, 2)
+
+        self.client.post('/api/folders/{}/restore/'.format(self.photos.id))
+        self.assertUsage(self.root, 3, 1)
+        self.client.post('/api/folders/{}/files/{}/restore/'.format(self.child.id, file.id))
+        self.assertUsage(self.root, 8, 2)
+        self.assertUsage(self.child, 5, 1)
+
+    def test_purge(self):
+        self.upload(self.child, b'12345')
+        file = self.upload(self.music, b'123')
+        self.client.delete('/api/folders/{}/'.format(self.photos.id))
+        self.client.delete('/api/folders/{}/files/{}/'.format(self.music.id, file.id))
+
+        purge_trash(retention=0)
+        self.assertUsage(self.root, 0, 0)
+        self.assertUserUsage(0, 0)
+
+    def test_delete_for_good(self):
+        self.upload(self.child, b'12345')
+        file = self.upload(self.music, b'123')
+
+        File.objects.get(pk=file.pk).delete()
+        self.assertUsage(self.music, 0, 0)
+        self.assertUserUsage(5, 1)
+
+        Folder.objects.get(pk=self.photos.pk).delete()
+        self.assertUsage(self.root, 0, 0)
+        self.assertUserUsage(0, 0)
+
+    def test_profile(self):
+        self.upload(self.child, b'12345')
+        self.client.force_authenticate(user=StorageUser.objects.get(pk=self.user.pk))
+        response = self.client.get('/api/profile/')
+        self.assertEqual(response.data['storage_used'], 5)
+        self.assertEqual(response.data['file_count'], 1)
+
+    def test_profile_update_keeps_counters(self):
+        self.upload(self.child, b'12345')
+        # self.user still holds the counters from before the upload
+        response = self.client.put('/api/profile/', {'first_name': 'kered', 'last_name': 'drahpehs'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertUserUsage(5, 1)
+
+    def test_repair(self):
+        file = self.upload(self.child, b'12345')
+        self.upload(self.music, b'123')
+        self.client.delete('/api/folders/{}/files/{}/'.format(self.child.id, file.id))
+        Folder.objects.update(size=0, file_count=0)
+        StorageUser.objects.update(storage_used=0, file_count=0)
+
+        call_command('repair_usage', stdout=StringIO())
+        self.assertUsage(self.child, 0, 0)
+        self.assertUsage(self.music, 3, 1)
+        self.assertUsage(self.root, 3, 1)
+        self.assertUserUsage(8, 2)
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class PathUsageTests(UsageTests):
+    pass
@@ -0,0 +1,195 @@
+import base64
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from cloudstorage.authentication import CachedBasicAuthentication, CachedTokenAuthentication, \
+    credential_cache, token_cache
+from cloudstorage.models import AuthToken, StorageUser
+from cloudstorage.tokens import issue_token, refresh_token
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+}
+
+
+@override_settings(CACHES=CACHES)
+class TestCachedTokenAuthentication(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.save()
+        self.user = user
+        self.token = issue_token(user)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get('/api/profile/',
+                                          HTTP_AUTHORIZATION='Token {}'.format(key or self.token.key))
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_authenticate_once_per_token(self):
+        with self.assertNumQueries(1):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_requests_get_their_own_user(self):
+        first, token = self.authenticate()
+        second, token = self.authenticate()
+        self.assertIsNot(first, second)
+
+    def test_invalid_token(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('0' * 40)
+
+    def test_deleted_token(self):
+        self.authenticate()
+        AuthToken.objects.filter(user=self.user).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_changed_user(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared', TOKEN_CACHE_TTL=0)
+    def test_shared_cache(self):
+        self.authenticate()
+        # another process, with nothing cached locally
+        token_cache.clear()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+
+        AuthToken.objects.filter(user=self.user).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared')
+    def test_local_cache_with_shared_cache(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared')
+    def test_deleted_in_another_process(self):
+        self.authenticate()
+        entry = token_cache.get(self.token.key)
+        AuthToken.objects.filter(user=self.user).delete()
+        # another process still has the token in its LRU
+        token_cache.set(self.token.key, entry)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared')
+    def test_changed_in_another_process(self):
+        self.authenticate()
+        entry = token_cache.get(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        token_cache.set(self.token.key, entry)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_expired_token(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_refreshed_elsewhere(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        # eg. by another process, which can't reach our cache
+        AuthToken.objects.filter(pk=self.token.pk).update(expires=timezone.now() + timedelta(days=1))
+        user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    def test_refresh_drops_cached_token(self):
+        self.authenticate()
+        refresh_token(self.token)
+        with self.assertNumQueries(1):
+            user, token = self.authenticate()
+        self.assertEqual(token.expires, self.token.expires)
+
+
+class TestCachedBasicAuthentication(TestCase):
+
+    def setUp(self):
+        credential_cache.clear()
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.set_password('password')
+        user.save()
+        self.user = user
+
+    def tearDown(self):
+        credential_cache.clear()
+
+    def authenticate(self, password='password'):
+        credentials = base64.b64encode('test@test.com:{}'.format(password).encode()).decode()
+        request = APIRequestFactory().get('/api/profile/', HTTP_AUTHORIZATION='Basic {}'.format(credentials))
+        # counts how often the password hasher runs
+        with mock.patch.object(BasicAuthentication, 'authenticate_credentials', autospec=True,
+                               side_effect=BasicAuthentication.authenticate_credentials) as verify:
+            user, auth = CachedBasicAuthentication().authenticate(request)
+        return user, verify.call_count
+
+    def test_hashes_password_once(self):
+        user, hashed = self.authenticate()
+        self.assertEqual((user, hashed), (self.user, 1))
+
+        with self.assertNumQueries(1):
+            user, hashed = self.authenticate()
+        self.assertEqual((user, hashed), (self.user, 0))
+
+    def test_credentials_not_stored(self):
+        self.authenticate()
+        for key, (expires, (user_id, fingerprint)) in credential_cache._data.items():
+            self.assertNotIn(b'password', key)
+            self.assertNotIn(self.user.password.encode(), fingerprint)
+
+    def test_wrong_password(self):
+        self.authenticate()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('incorrect')
+
+    def test_password_change(self):
+        self.authenticate()
+        user = StorageUser.objects.get(pk=self.user.pk)
+        user.set_password('new password')
+        user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        user, hashed = self.authenticate('new password')
+        self.assertEqual(hashed, 1)
+
+    def test_deactivated_user(self):
+        self.authenticate()
+        StorageUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
@@ -0,0 +1,107 @@
+import hashlib
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from cloudstorage.blobs import acquire_blob, release_blob, release_blobs, hash_content
+from cloudstorage.models import Blob, File, StorageUser, Folder
+from cloudstorage.serializers.file import FileSerializer
+from cloudstorage.storage import delete_files
+
+
+class TestBlobs(TestCase):
+
+    def test_hash_content(self):
+        content = SimpleUploadedFile("file.jpg", b"file_content")
+        self.assertEqual(hash_content(content), hashlib.sha256(b"file_content").hexdigest())
+
+    def test_acquire_stores_content_once(self):
+        first = acquire_blob(SimpleUploadedFile("a.jpg", b"file_content"))
+        second = acquire_blob(SimpleUploadedFile("b.jpg", b"file_content"))
+
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Blob.objects.count(), 1)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(blob.size, 12)
+        self.assertEqual(blob.file.name, 'blobs/{0}/{1}/{2}'.format(blob.digest[:2], blob.digest[2:4], blob.digest))
+        self.assertEqual(blob.file.read(), b"file_content")
+
+    def test_different_content_different_blobs(self):
+        acquire_blob(SimpleUploadedFile("a.jpg", b"file_content"))
+        acquire_blob(SimpleUploadedFile("a.jpg", b"other_content"))
+        self.assertEqual(Blob.objects.count(), 2)
+
+    def test_release_deletes_unreferenced_blob(self):
+        blob = acquire_blob(SimpleUploadedFile("a.jpg", b"file_content"))
+        acquire_blob(SimpleUploadedFile("b.jpg", b"file_content"))
+        storage = blob.file.storage
+        name = blob.file.name
+
+        release_blob(blob.id)
+        self.assertEqual(Blob.objects.get(id=blob.id).refcount, 1)
+        self.assertTrue(storage.exists(name))
+
+        release_blob(blob.id)
+        self.assertFalse(Blob.objects.filter(id=blob.id).exists())
+        self.assertFalse(storage.exists(name))
+
+
+    def test_acquire_while_releasing(self):
+        blob = acquire_blob(SimpleUploadedFile("a.jpg", b"file_content"))
+        storage = blob.file.storage
+        name = blob.file.name
+
+        # another upload of the same content, before the release commits:
+        # it must store the content afresh rather than find it gone later
+        def acquire_next(storage, names):
+            delete_files(storage, names)
+            acquired.append(acquire_blob(SimpleUploadedFile("b.jpg", b"file_content")))
+
+        acquired = []
+        with mock.patch('cloudstorage.blobs.delete_files', side_effect=acquire_next):
+            release_blobs([blob.id])
+
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(acquired[0].file.read(), b"file_content")
+
+class TestFileDeduplication(TestCase):
+
+    def setUp(self):
+        self.users = []
+        for email in ('a@test.com', 'b@test.com'):
+            user = StorageUser()
+            user.email = email
+            user.first_name = 'derek'
+            user.last_name = 'shephard'
+            user.save()
+            self.users.append(user)
+
+    def upload(self, user, name, content):
+        data = {'name': name, 'file': SimpleUploadedFile(name, content, content_type="image/jpeg")}
+        serializer = FileSerializer(data=data)
+        self.assertTrue(serializer.is_valid())
+        return serializer.save(folder=Folder.objects.get(owner=user), owner=user)
+
+    def test_identical_uploads_share_a_blob(self):
+        first = self.upload(self.users[0], 'file.jpg', b'file_content')
+        second = self.upload(self.users[1], 'copy.jpg', b'file_content')
+
+        self.assertEqual(first.blob, second.blob)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(second.mime_type, 'image/jpeg')
+        self.assertEqual(second.size, 12)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+    def test_deleting_files_releases_blob(self):
+        first = self.upload(self.users[0], 'file.jpg', b'file_content')
+        second = self.upload(self.users[1], 'copy.jpg', b'file_content')
+
+        first.delete()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertEqual(File.objects.get().file.read(), b'file_content')
+
+        # deleting the folder cascades to the file
+        Folder.objects.get(owner=self.users[1]).delete()
+        self.assertFalse(Blob.objects.exists())
@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase
+from cloudstorage.cache import TTLCache
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(SimpleTestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_set(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_entries_expire(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=30)
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_delete(self):
+        self.cache.set('a', 1)
+        self.cache.delete('a')
+        self.cache.delete('missing')
+        self.assertIsNone(self.cache.get('a'))
@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from mptt.exceptions import InvalidMove
+from cloudstorage.hierarchy import build_paths, check_depth, get_hierarchy, get_path_ids, path_segment
+from cloudstorage.models import Folder
+from cloudstorage.tests.utils import FolderTestMixin
+
+
+class HierarchyTestsMixin(FolderTestMixin):
+
+    def setUp(self):
+        super().setUp()
+
+        self.a = self.make_folder('a', self.root)
+        self.a1 = self.make_folder('a1', self.a)
+        self.a1x = self.make_folder('a1x', self.a1)
+        self.b = self.make_folder('b', self.root)
+
+    def reload(self, folder):
+        return Folder.objects.get(pk=folder.pk)
+
+    def test_path(self):
+        self.assertEqual(self.reload(self.a1x).path, ''.join(
+            path_segment(folder.id) for folder in (self.root, self.a, self.a1, self.a1x)))
+        self.assertEqual(get_path_ids(self.a1x.path), [self.root.id, self.a.id, self.a1.id, self.a1x.id])
+
+    def test_descendants_in_preorder(self):
+        descendants = get_hierarchy().get_descendants(self.reload(self.root), include_self=True)
+        self.assertEqual([folder.name for folder in descendants], ['root', 'a', 'a1', 'a1x', 'b'])
+
+        descendants = get_hierarchy().get_descendants(self.reload(self.a))
+        self.assertEqual([folder.name for folder in descendants], ['a1', 'a1x'])
+
+    def test_ancestors(self):
+        ancestors = get_hierarchy().get_ancestors(self.reload(self.a1x))
+        self.assertEqual([folder.name for folder in ancestors], ['root', 'a', 'a1'])
+
+    def test_move(self):
+        folder = self.reload(self.a1)
+        folder.move_to(self.reload(self.b))
+        folder.save()
+
+        self.assertEqual(self.reload(self.a1).parent, self.b)
+        self.assertEqual(get_path_ids(self.reload(self.a1x).path),
+                         [self.root.id, self.b.id, self.a1.id, self.a1x.id])
+
+        descendants = get_hierarchy().get_descendants(self.reload(self.b))
+        self.assertEqual([folder.name for folder in descendants], ['a1', 'a1x'])
+        self.assertFalse(get_hierarchy().get_descendants(self.reload(self.a)).exists())
+
+    def test_move_by_setting_parent(self):
+        folder = self.reload(self.a1)
+        folder.parent = self.reload(self.b)
+        folder.save()
+
+        descendants = get_hierarchy().get_descendants(self.reload(self.b))
+        self.assertEqual([folder.name for folder in descendants], ['a1', 'a1x'])
+
+    def test_move_into_descendant(self):
+        with self.assertRaises(InvalidMove):
+            self.reload(self.a).move_to(self.reload(self.a1x))
+
+    @override_settings(FOLDER_MAX_DEPTH=3)
+    def test_max_depth(self):
+        # a1x would end up at depth 4
+        with self.assertRaises(InvalidMove):
+            self.reload(self.a).move_to(self.reload(self.b))
+        # and here at depth 3
+        self.reload(self.a1).move_to(self.reload(self.b))
+        with self.assertRaises(InvalidMove):
+            check_depth(self.reload(self.a1x))
+
+    def test_delete(self):
+        self.reload(self.a).delete()
+        descendants = get_hierarchy().get_descendants(self.reload(self.root), include_self=True)
+        self.assertEqual([folder.name for folder in descendants], ['root', 'b'])
+
+
+@override_settings(FOLDER_HIERARCHY='mptt')
+class TestMPTTHierarchy(HierarchyTestsMixin, TestCase):
+
+    def test_build_paths(self):
+        Folder.objects.update(path='')
+        build_paths(Folder)
+        self.assertEqual(get_path_ids(self.reload(self.a1x).path),
+                         [self.root.id, self.a.id, self.a1.id, self.a1x.id])
+
+
+@override_settings(FOLDER_HIERARCHY='path')
+class TestPathHierarchy(HierarchyTestsMixin, TestCase):
+
+    def test_mptt_columns_untouched(self):
+        b = self.reload(self.b)
+        folder = self.reload(self.a1)
+        folder.move_to(self.reload(self.root))
+        folder.save()
+        self.make_folder('c', self.root)
+
+        self.assertEqual((self.reload(self.b).lft, self.reload(self.b).rght), (b.lft, b.rght))
+
+    def test_crossing_moves(self):
+        # loaded before another request moved b below a
+        a, b = self.reload(self.a), self.reload(self.b)
+        self.reload(self.b).move_to(self.reload(self.a1x))
+
+        with self.assertRaises(InvalidMove):
+            a.move_to(b)
+        self.assertEqual(self.reload(self.a).parent, self.root)
+
+    def test_rebuild_for_mptt(self):
+        folder = self.reload(self.a1)
+        folder.move_to(self.reload(self.b))
+        folder.save()
+
+        call_command('rebuild_folder_tree', stdout=StringIO())
+        with self.settings(FOLDER_HIERARCHY='mptt'):
+            descendants = get_hierarchy().get_descendants(self.reload(self.b))
+            self.assertEqual([folder.name for folder in descendants], ['a1', 'a1x'])
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from cloudstorage.models import StorageUser
+from cloudstorage.notifications import LocalBackend, PollingBackend, get_backend, notify_changes
+
+
+class TestLocalBackend(TestCase):
+
+    def setUp(self):
+        self.backend = LocalBackend()
+
+    def test_published_before_waiting(self):
+        self.backend.publish(1, 5)
+        self.assertTrue(self.backend.wait(1, 4, timeout=0))
+        self.assertFalse(self.backend.wait(1, 5, timeout=0))
+
+    def test_other_users(self):
+        self.backend.publish(2, 5)
+        self.assertFalse(self.backend.wait(1, 0, timeout=0))
+
+    def test_sequence_never_goes_back(self):
+        self.backend.publish(1, 5)
+        self.backend.publish(1, 3)
+        self.assertTrue(self.backend.wait(1, 4, timeout=0))
+
+    def test_wakes_waiters(self):
+        results = []
+        waiters = [threading.Thread(target=lambda: results.append(self.backend.wait(1, 0, timeout=10)))
+                   for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        while len(self.backend.get_waiting()) < 1:
+            time.sleep(0.01)
+
+        started = time.time()
+        self.backend.publish(1, 1)
+        for waiter in waiters:
+            waiter.join()
+        self.assertEqual(results, [True, True, True])
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(self.backend.get_waiting(), [])
+
+    def test_timeout(self):
+        started = time.time()
+        self.assertFalse(self.backend.wait(1, 0, timeout=0.1))
+        self.assertGreaterEqual(time.time() - started, 0.1)
+        self.assertEqual(self.backend.get_waiting(), [])
+
+
+class TestPollingBackend(TestCase):
+
+    def test_picks_up_changes_from_other_processes(self):
+        user = StorageUser()
+        user.email = 'test@test.com'
+        user.first_name = 'derek'
+        user.last_name = 'shephard'
+        user.save()
+        StorageUser.objects.filter(pk=user.pk).update(journal_seq=3)
+
+        backend = PollingBackend()
+        backend.poll([user.pk])
+        self.assertTrue(LocalBackend.wait(backend, user.pk, 2, timeout=0))
+        self.assertFalse(LocalBackend.wait(backend, user.pk, 3, timeout=0))
+
+
+@override_settings(NOTIFICATION_BACKEND='cloudstorage.notifications.LocalBackend')
+class TestNotifyChanges(TransactionTestCase):
+    # nobody else's, the backend lives as long as the process
+    owner_id = 10 ** 9
+
+    def test_published_on_commit(self):
+        backend = get_backend()
+        with transaction.atomic():
+            notify_changes(self.owner_id, 1)
+            # not before the changes can be read
+            self.assertFalse(backend.wait(self.owner_id, 0, timeout=0))
+        self.assertTrue(backend.wait(self.owner_id, 0, timeout=0))
@@ -0,0 +1,41 @@
+from django.test import SimpleTestCase
+from cloudstorage.streaming import parse_range_header, MAX_RANGES
+
+
+class TestParseRangeHeader(SimpleTestCase):
+
+    def test_no_header(self):
+        self.assertIsNone(parse_range_header(None, 100))
+        self.assertIsNone(parse_range_header('', 100))
+
+    def test_single_range(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), [(0, 9)])
+
+    def test_open_ended_range(self):
+        self.assertEqual(parse_range_header('bytes=90-', 100), [(90, 99)])
+
+    def test_end_clamped_to_size(self):
+        self.assertEqual(parse_range_header('bytes=90-500', 100), [(90, 99)])
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header('bytes=-10', 100), [(90, 99)])
+        self.assertEqual(parse_range_header('bytes=-500', 100), [(0, 99)])
+
+    def test_multiple_ranges_are_sorted_and_coalesced(self):
+        self.assertEqual(parse_range_header('bytes=50-59, 0-9, 5-19, 20-29', 100),
+                         [(0, 29), (50, 59)])
+
+    def test_unsatisfiable(self):
+        self.assertEqual(parse_range_header('bytes=100-', 100), [])
+        self.assertEqual(parse_range_header('bytes=-0', 100), [])
+        self.assertEqual(parse_range_header('bytes=0-', 0), [])
+
+    def test_malformed(self):
+        self.assertIsNone(parse_range_header('items=0-9', 100))
+        self.assertIsNone(parse_range_header('bytes=a-b', 100))
+        self.assertIsNone(parse_range_header('bytes=-', 100))
+        self.assertIsNone(parse_range_header('bytes=9-0', 100))
+
+    def test_too_many_ranges(self):
+        header = 'bytes=' + ','.join('{0}-{0}'.format(i) for i in range(MAX_RANGES + 1))
+        self.assertIsNone(parse_range_header(header, 100))
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from moto import mock_s3
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from cloudstorage.models import StorageUser, Folder, File
+
+
+def make_user(email='test@test.com', first_name='derek', last_name='shephard', password=None):
+    user = StorageUser()
+    user.email = email
+    user.first_name = first_name
+    user.last_name = last_name
+    if password is not None:
+        user.set_password(password)
+    user.save()
+    return user
+
+
+class FolderTestMixin(object):
+    """
+    Sets up self.user with its self.root folder, and builds folders under it.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user(password='password')
+        self.root = Folder.objects.get(owner=self.user)
+
+    def make_folder(self, name, parent):
+        folder = Folder()
+        folder.name = name
+        folder.parent = parent
+        folder.owner = self.user
+        folder.save()
+        return folder
+
+
+class S3StorageMixin(object):
+    """
+    Swaps the storage behind File.file for an S3Boto3Storage talking to
+    moto's in-process fake S3, so S3 code paths can be tested locally.
+    """
+    bucket_name = 'cloudstorage-test'
+
+    def setUp(self):
+        self.s3_mock = mock_s3()
+        self.s3_mock.start()
+
+        self.storage = S3Boto3Storage(bucket=self.bucket_name,
+                                      access_key='testing',
+                                      secret_key='testing',
+                                      region_name='us-east-1',
+                                      auto_create_bucket=True,
+                                      default_acl='private')
+        self.storage_patch = mock.patch.object(File._meta.get_field('file'), 'storage', self.storage)
+        self.storage_patch.start()
+
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.storage_patch.stop()
+        self.s3_mock.stop()
@@ -0,0 +1,75 @@
+"""
+Per-device API tokens.
+
+Signing in creates a token for the device, or hands back the device's
+current token with a fresh expiry, without touching the user's other
+devices, so one login no longer signs everyone else out. Tokens expire
+AUTH_TOKEN_TTL seconds after they were issued or last refreshed; clients
+refresh them with the token itself, which skips the password hashing
+entirely. The purge_auth_tokens command clears out expired tokens.
+"""
+import binascii
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from cloudstorage.models import AuthToken
+
+DEFAULT_AUTH_TOKEN_TTL = 30 * 24 * 60 * 60
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_auth_token_ttl():
+    """
+    Returns how long, in seconds, a token stays valid once issued or refreshed
+    """
+    return getattr(settings, 'AUTH_TOKEN_TTL', DEFAULT_AUTH_TOKEN_TTL)
+
+
+def get_expiry():
+    return timezone.now() + timedelta(seconds=get_auth_token_ttl())
+
+
+def generate_key():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+def issue_token(user, device=''):
+    """
+    Returns a token for the user's device: its current one if it still
+    has one, refreshed, or else a new one. Takes a single write either way.
+    """
+    if device:
+        token = AuthToken.objects.filter(user=user, device=device, expires__gt=timezone.now()) \
+            .order_by('-expires').first()
+        if token is not None:
+            refresh_token(token)
+            return token
+
+    return AuthToken.objects.create(key=generate_key(), user=user, device=device, expires=get_expiry())
+
+
+def refresh_token(token):
+    """
+    Pushes a token's expiry back to AUTH_TOKEN_TTL from now
+    """
+    token.expires = get_expiry()
+    token.save(update_fields=['expires'])
+
+
+def purge_expired_tokens(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deletes expired tokens, `batch_size` at a time. Returns how many went.
+    """
+    count = 0
+    while True:
+        keys = list(AuthToken.objects.filter(expires__lte=timezone.now())
+                    .values_list('key', flat=True)[:batch_size])
+        if not keys:
+            return count
+        # expired tokens can't authenticate even if they are still cached,
+        # so there are no signal receivers to run
+        AuthToken.objects.filter(key__in=keys)._raw_delete(AuthToken.objects.db)
+        count += len(keys)
@@ -0,0 +1,85 @@
+"""
+Streams a whole folder subtree as nested JSON.
+
+The hierarchy engine (see hierarchy.py) returns all descendants of a folder
+from one range query, in depth-first (pre-order) order: by lft for MPTT, by
+path for materialized paths. So the subtree can be nested in a single pass:
+when a folder is not deeper than the previous one, the folders still open
+above it are closed first.
+
+Files are fetched with the same range over their folder and the same
+order, and merged in as each folder is written. Both queries are read with
+iterator(), so memory stays flat however large the tree is.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from cloudstorage.deletion import exclude_deleted
+from cloudstorage.hierarchy import get_hierarchy, get_path_depth
+from cloudstorage.models import File
+
+FOLDER_FIELDS = ('id', 'name', 'parent_id', 'created', 'modified')
+FILE_FIELDS = ('id', 'name', 'size', 'checksum', 'mime_type', 'created', 'modified')
+
+# bits of JSON collected before a piece of the response is handed to the server
+BUFFER_PIECES = 1024
+
+
+def get_subtree_folders(folder):
+    folders = get_hierarchy().get_descendants(folder, include_self=True)
+    return exclude_deleted(folders).values('path', *FOLDER_FIELDS)
+
+
+def get_subtree_files(folder):
+    hierarchy = get_hierarchy()
+    ordering = ['folder__' + field for field in hierarchy.preorder] + ['name', 'id']
+    files = File.objects.filter(hierarchy.get_subtree_filter(folder, prefix='folder__'),
+                                deleted_at__isnull=True)
+    return exclude_deleted(files, prefix='folder__') \
+        .order_by(*ordering) \
+        .values('folder_id', *FILE_FIELDS)
+
+
+def iter_tree_json(folder, include_files=False):
+    """
+    Yields the JSON for `folder` and all of its descendants, each folder
+    with its "children" (and "files" if asked for) nested inside it
+    """
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    # deleted subtrees below the folder are left out
+    files = iter(get_subtree_files(folder).iterator()) if include_files else iter(())
+    next_file = next(files, None)
+
+    buffer = []
+    depth = 0  # folders opened but not closed yet
+
+    for node in get_subtree_folders(folder).iterator():
+        level = get_path_depth(node.pop('path')) - get_path_depth(folder.path)
+        node['parent'] = node.pop('parent_id')
+
+        # close the previous folder and any of its ancestors this one isn't in
+        if level < depth:
+            buffer.append(']}' * (depth - level) + ',')
+
+        # everything but the final '}', so files and children can follow
+        buffer.append(encoder.encode(node)[:-1])
+
+        if include_files:
+            folder_files = []
+            # files come in folder pre-order too, so they are never behind
+            while next_file is not None and next_file['folder_id'] == node['id']:
+                del next_file['folder_id']
+                folder_files.append(next_file)
+                next_file = next(files, None)
+            buffer.append(',"files":' + encoder.encode(folder_files))
+
+        buffer.append(',"children":[')
+        depth = level + 1
+
+        if len(buffer) >= BUFFER_PIECES:
+            yield ''.join(buffer)
+            buffer = []
+
+    buffer.append(']}' * depth)
+    yield ''.join(buffer)
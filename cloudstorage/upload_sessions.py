@@ -0,0 +1,273 @@
+"""
+Resumable, chunked upload sessions.
+
+A session reserves a storage name for the new file. Chunks can then be
+sent in any order and in parallel, since each one lands independently:
+as a part of an S3 multipart upload on the S3 backend, or written at its
+offset into a staging file on local storage. Completing the session
+assembles the object and creates the File row.
+"""
+import mimetypes
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db import transaction
+
+from cloudstorage.models import File, UploadChunk, UploadSession, get_upload_path
+from cloudstorage.quota import QuotaExceeded, check_quota
+from cloudstorage.storage import get_file_storage, is_s3_storage, s3_key
+from cloudstorage.uploads import UploadConflict, UploadError
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_SESSION_TTL = 7 * 24 * 60 * 60
+
+# S3 multipart limits
+S3_MIN_CHUNK_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+
+READ_SIZE = 64 * 1024
+
+
+class StagedFile(DjangoFile):
+    """
+    A fully assembled staging file. Exposing temporary_file_path() lets
+    FileSystemStorage move it into place instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_session_ttl():
+    """
+    Returns how long, in seconds, an unfinished session is kept around
+    """
+    return getattr(settings, 'UPLOAD_SESSION_TTL', DEFAULT_SESSION_TTL)
+
+
+def get_chunk_size_limits():
+    """
+    Returns the (min, max) chunk size clients may pick for a session
+    """
+    storage = get_file_storage()
+    min_size = S3_MIN_CHUNK_SIZE if is_s3_storage(storage) else 1
+    max_size = getattr(settings, 'UPLOAD_SESSION_MAX_CHUNK_SIZE', DEFAULT_MAX_CHUNK_SIZE)
+    return min_size, max_size
+
+
+def get_staging_path(session):
+    staging_dir = getattr(settings, 'UPLOAD_SESSION_DIR', None) or \
+        os.path.join(settings.MEDIA_ROOT, 'upload_sessions')
+    return os.path.join(staging_dir, 'session_{}'.format(session.id))
+
+
+def open_session(owner, folder, name, size, chunk_size=None):
+    """
+    Starts a new upload session for a file of `size` bytes
+    """
+    storage = get_file_storage()
+    min_size, max_size = get_chunk_size_limits()
+    chunk_size = chunk_size or getattr(settings, 'UPLOAD_SESSION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+    if not min_size <= chunk_size <= max_size:
+        raise UploadError('chunk_size must be between {} and {} bytes'.format(min_size, max_size))
+
+    session = UploadSession()
+    session.owner = owner
+    session.folder = folder
+    session.name = name
+    session.size = size
+    session.chunk_size = chunk_size
+    session.mime_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    session.key = get_upload_path(owner, name)
+
+    if is_s3_storage(storage):
+        if session.chunk_count > S3_MAX_PARTS:
+            raise UploadError('Too many chunks, use a larger chunk_size')
+
+        parameters = {'ContentType': session.mime_type}
+        if storage.default_acl:
+            parameters['ACL'] = storage.default_acl
+        upload = storage.bucket.meta.client.create_multipart_upload(
+            Bucket=storage.bucket.name, Key=s3_key(storage, session.key), **parameters)
+        session.s3_upload_id = upload['UploadId']
+
+    session.save()
+
+    if not is_s3_storage(storage):
+        path = get_staging_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+    return session
+
+
+def iter_exactly(stream, length):
+    """
+    Reads `length` bytes from a request stream in bounded pieces, failing
+    once the stream turns out to hold more or fewer bytes than that
+    """
+    remaining = length
+    while remaining > 0:
+        piece = stream.read(min(READ_SIZE, remaining))
+        if not piece:
+            break
+        remaining -= len(piece)
+        yield piece
+
+    if remaining or stream.read(1):
+        raise UploadError('Chunk must be exactly {} bytes'.format(length))
+
+
+def write_chunk(session, number, stream):
+    """
+    Stores chunk `number` (counting from 1) of a session from a readable
+    stream. Chunks may be re-sent; the latest copy wins.
+    """
+    if not 1 <= number <= session.chunk_count:
+        raise UploadError('Chunk number must be between 1 and {}'.format(session.chunk_count))
+
+    length = session.get_chunk_length(number)
+    if stream is None:
+        raise UploadError('Chunk must be exactly {} bytes'.format(length))
+
+    storage = get_file_storage()
+    etag = ''
+
+    if is_s3_storage(storage):
+        # the part must be checked for length before it goes out, spooled to
+        # disk past FILE_UPLOAD_MAX_MEMORY_SIZE rather than held in memory
+        with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as body:
+            for piece in iter_exactly(stream, length):
+                body.write(piece)
+            body.seek(0)
+            try:
+                part = storage.bucket.meta.client.upload_part(
+                    Bucket=storage.bucket.name,
+                    Key=s3_key(storage, session.key),
+                    UploadId=session.s3_upload_id,
+                    PartNumber=number,
+                    Body=body,
+                    ContentLength=length,
+                )
+            except storage.connection_response_error:
+                raise UploadConflict('Upload session is no longer open')
+        etag = part['ETag']
+    else:
+        # a partially written chunk is harmless, it isn't recorded below
+        # and gets overwritten when the client sends it again
+        offset = (number - 1) * session.chunk_size
+        fd = os.open(get_staging_path(session), os.O_WRONLY)
+        try:
+            for piece in iter_exactly(stream, length):
+                os.pwrite(fd, piece, offset)
+                offset += len(piece)
+        finally:
+            os.close(fd)
+
+    chunk, created = UploadChunk.objects.update_or_create(
+        session=session, number=number, defaults={'size': length, 'etag': etag})
+    return chunk
+
+
+def assemble_session(session, chunks):
+    """
+    Puts the uploaded chunks together into the stored file, returns its
+    storage name
+    """
+    storage = get_file_storage()
+
+    if is_s3_storage(storage):
+        try:
+            storage.bucket.meta.client.complete_multipart_upload(
+                Bucket=storage.bucket.name,
+                Key=s3_key(storage, session.key),
+                UploadId=session.s3_upload_id,
+                MultipartUpload={'Parts': [{'ETag': chunk.etag, 'PartNumber': chunk.number}
+                                           for chunk in chunks]},
+            )
+        except storage.connection_response_error:
+            raise UploadConflict('Upload session is no longer open')
+        return session.key
+
+    path = get_staging_path(session)
+    try:
+        with open(path, 'rb') as staged:
+            name = storage.save(session.key, StagedFile(staged))
+    except FileNotFoundError:
+        raise UploadConflict('Upload session is no longer open')
+    # only left behind if the storage had to copy instead of move
+    if os.path.exists(path):
+        os.remove(path)
+    return name
+
+
+def complete_session(session):
+    """
+    Assembles the uploaded chunks into the stored file, creates its File
+    row and removes the session. A session the owner no longer has room
+    for is thrown away instead, see quota.py.
+
+    The session's row is locked throughout, so of requests completing the
+    same session at once only the first one does, the others get an
+    UploadConflict. The user's row is locked too, for sessions completing
+    together against the quota.
+    """
+    exceeded = None
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None:
+            raise UploadConflict('Upload session has already been completed')
+
+        chunks = list(session.chunks.order_by('number'))
+        if [chunk.number for chunk in chunks] != list(range(1, session.chunk_count + 1)):
+            raise UploadError('Not all chunks have been uploaded')
+
+        try:
+            check_quota(session.owner, session.size, lock=True)
+        except QuotaExceeded as e:
+            abort_session(session)
+            exceeded = e
+        else:
+            file = File()
+            file.name = session.name
+            file.original_name = session.name
+            file.folder = session.folder
+            file.owner = session.owner
+            file.file = assemble_session(session, chunks)
+            file.size = session.size
+            file.mime_type = session.mime_type
+            file.save()
+            session.delete()
+
+    if exceeded is not None:
+        raise exceeded
+    return file
+
+
+def abort_session(session):
+    """
+    Throws away an unfinished session and everything uploaded for it
+    """
+    storage = get_file_storage()
+
+    if is_s3_storage(storage):
+        try:
+            storage.bucket.meta.client.abort_multipart_upload(
+                Bucket=storage.bucket.name,
+                Key=s3_key(storage, session.key),
+                UploadId=session.s3_upload_id,
+            )
+        except storage.connection_response_error:
+            # completed or aborted already
+            pass
+    else:
+        try:
+            os.remove(get_staging_path(session))
+        except FileNotFoundError:
+            pass
+
+    session.delete()
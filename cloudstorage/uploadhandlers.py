@@ -0,0 +1,69 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler, MemoryFileUploadHandler, StopUpload, \
+    TemporaryFileUploadHandler
+
+
+class HashingUploadHandlerMixin(object):
+    """
+    Computes the SHA-256 digest of each uploaded file while its chunks
+    stream in, so the content never has to be read a second time. The hex
+    digest ends up on the uploaded file as `checksum`.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # set up before calling super(), which may raise StopFutureHandlers
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        # only hash the chunks this handler keeps, the rest are passed on
+        # to the next handler, which hashes them itself
+        if data is None:
+            self.sha256.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.checksum = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """
+    Aborts an upload as soon as the files in it grow past `limit` bytes,
+    without reading the rest of the body. Goes in front of the other
+    handlers, which it passes every chunk on to; check `exceeded` once the
+    request has been parsed. `limit` may be a callable, which is called
+    when the body starts to be parsed; None means no limit.
+    """
+
+    def __init__(self, limit, request=None):
+        super().__init__(request)
+        self.limit = limit
+        self.received = 0
+        self.exceeded = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if callable(self.limit):
+            self.limit = self.limit()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.limit is not None and self.received > self.limit:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
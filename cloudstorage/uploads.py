@@ -0,0 +1,158 @@
+"""
+Two-phase direct-to-storage uploads.
+
+Instead of sending the file body through a Django worker, the client first
+asks for an upload target, POSTs the file straight to S3 using the
+presigned form fields it gets back, and then calls the "complete"
+endpoint, which checks the stored object and creates the File row.
+
+The upload token handed out in phase one is signed with SECRET_KEY and
+carries everything phase two needs, so no state is kept server side
+between the two calls.
+"""
+import mimetypes
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+from cloudstorage.models import File, get_upload_path
+from cloudstorage.storage import get_file_storage, is_s3_storage, s3_key, s3_object
+
+UPLOAD_TOKEN_SALT = 'cloudstorage.uploads'
+
+DEFAULT_DIRECT_UPLOAD_TTL = 60 * 60
+
+# S3 refuses POST uploads larger than 5GB
+DEFAULT_DIRECT_UPLOAD_MAX_SIZE = 5 * 1024 ** 3
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload can't be started, stored or completed
+    """
+
+
+class UploadConflict(UploadError):
+    """
+    Raised when an upload was completed or aborted by another request
+    """
+
+
+def get_direct_upload_ttl():
+    return getattr(settings, 'DIRECT_UPLOAD_TTL', DEFAULT_DIRECT_UPLOAD_TTL)
+
+
+def get_direct_upload_max_size():
+    return getattr(settings, 'DIRECT_UPLOAD_MAX_SIZE', DEFAULT_DIRECT_UPLOAD_MAX_SIZE)
+
+
+def create_upload(owner, folder, name, size=None):
+    """
+    Reserves a storage name for a new file and returns the presigned POST
+    target for it, along with the token needed to complete the upload.
+    Without a declared `size`, the target accepts no more than the owner's
+    remaining quota.
+    """
+    from cloudstorage.quota import check_quota, get_remaining_quota
+
+    storage = get_file_storage()
+    if not is_s3_storage(storage):
+        raise UploadError('Direct uploads are not supported by the storage backend')
+
+    max_size = get_direct_upload_max_size()
+    if size is not None and size > max_size:
+        raise UploadError('File is too large, the limit is {} bytes'.format(max_size))
+
+    if size is not None:
+        check_quota(owner, size)
+    else:
+        remaining = get_remaining_quota(owner)
+        if remaining is not None:
+            max_size = min(max_size, remaining)
+
+    key = get_upload_path(owner, name)
+    if len(key) > File._meta.get_field('file').max_length:
+        raise UploadError('File name is too long')
+    mime_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    ttl = get_direct_upload_ttl()
+
+    post = storage.bucket.meta.client.generate_presigned_post(
+        Bucket=storage.bucket.name,
+        Key=s3_key(storage, key),
+        Fields={'Content-Type': mime_type},
+        Conditions=[
+            {'Content-Type': mime_type},
+            ['content-length-range', 0, size if size is not None else max_size],
+        ],
+        ExpiresIn=ttl,
+    )
+
+    token = signing.dumps({
+        'owner': owner.id,
+        'folder': folder.id,
+        'key': key,
+        'name': name,
+        'size': size,
+        'mime_type': mime_type,
+    }, salt=UPLOAD_TOKEN_SALT)
+
+    return {
+        'url': post['url'],
+        'fields': post['fields'],
+        'key': key,
+        'token': token,
+        'expires_in': ttl,
+    }
+
+
+def complete_upload(owner, folder, token):
+    """
+    Checks that the object described by an upload token has landed in
+    storage with the expected size and type, and creates its File row.
+    An object the owner no longer has room for is deleted again.
+    """
+    from cloudstorage.quota import QuotaExceeded, check_quota
+
+    try:
+        upload = signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=get_direct_upload_ttl())
+    except signing.BadSignature:
+        raise UploadError('Invalid or expired upload token')
+
+    if upload['owner'] != owner.id or upload['folder'] != folder.id:
+        raise UploadError('Upload token does not match this folder')
+
+    if File.objects.filter(file=upload['key']).exists():
+        raise UploadError('Upload has already been completed')
+
+    storage = get_file_storage()
+    obj = s3_object(storage, upload['key'])
+    try:
+        obj.load()
+    except storage.connection_response_error:
+        raise UploadError('File has not been uploaded')
+
+    if upload['size'] is not None and obj.content_length != upload['size']:
+        raise UploadError('Uploaded file size does not match')
+    if obj.content_length > get_direct_upload_max_size():
+        raise UploadError('Uploaded file is too large')
+    if obj.content_type != upload['mime_type']:
+        raise UploadError('Uploaded file type does not match')
+
+    with transaction.atomic():
+        try:
+            check_quota(owner, obj.content_length, lock=True)
+        except QuotaExceeded:
+            obj.delete()
+            raise
+
+        file = File()
+        file.name = upload['name']
+        file.original_name = upload['name']
+        file.folder = folder
+        file.owner = owner
+        file.file = upload['key']
+        file.size = obj.content_length
+        file.mime_type = upload['mime_type']
+        file.save()
+    return file
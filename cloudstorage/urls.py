@@ -35,18 +35,57 @@ urlpatterns += [
     url(r'^api/login/$',
         api.LoginView.as_view()),
 
+    url(r'^api/token/refresh/$',
+        api.TokenRefreshView.as_view()),
+
     url(r'^api/folders/$',
         api.FolderListAPIView.as_view()),
 
     url(r'^api/folders/(?P<folder_id>\d+)/$',
         api.FolderDetailAPIView.as_view()),
 
+    url(r'^api/folders/(?P<folder_id>\d+)/contents/$',
+        api.FolderContentsAPIView.as_view()),
+
+    url(r'^api/folders/(?P<folder_id>\d+)/tree/$',
+        api.FolderTreeAPIView.as_view()),
+
+    url(r'^api/folders/(?P<folder_id>\d+)/archive/$',
+        api.FolderArchiveAPIView.as_view()),
+
+    url(r'^api/folders/(?P<folder_id>\d+)/import/$',
+        api.FolderImportAPIView.as_view()),
+
+    url(r'^api/folders/(?P<folder_id>\d+)/restore/$',
+        api.FolderRestoreAPIView.as_view()),
+
     url(r'^api/folders/(?P<folder_id>\d+)/files/$',
         api.FileListAPIView.as_view()),
 
+    url(r'^api/folders/(?P<folder_id>\d+)/uploads/$',
+        api.FileUploadAPIView.as_view()),
+
+    url(r'^api/folders/(?P<folder_id>\d+)/uploads/complete/$',
+        api.FileUploadCompleteAPIView.as_view()),
+
+    url(r'^api/folders/(?P<folder_id>\d+)/upload-sessions/$',
+        api.UploadSessionListAPIView.as_view()),
+
+    url(r'^api/upload-sessions/(?P<session_id>\d+)/$',
+        api.UploadSessionDetailAPIView.as_view()),
+
+    url(r'^api/upload-sessions/(?P<session_id>\d+)/chunks/(?P<number>\d+)/$',
+        api.UploadChunkAPIView.as_view()),
+
+    url(r'^api/upload-sessions/(?P<session_id>\d+)/complete/$',
+        api.UploadSessionCompleteAPIView.as_view()),
+
     url(r'^api/folders/(?P<folder_id>\d+)/files/(?P<file_id>\d+)/$',
         api.FileDetailAPIView.as_view()),
 
+    url(r'^api/folders/(?P<folder_id>\d+)/files/(?P<file_id>\d+)/restore/$',
+        api.FileRestoreAPIView.as_view()),
+
     url(r'^api/folders/(?P<folder_id>\d+)/files/(?P<file_id>\d+)/file/$',
         api.FileRedirectAPIView.as_view()),
 
@@ -56,6 +95,15 @@ urlpatterns += [
     url(r'^api/files/$',
         api.AllFileListAPIView.as_view()),
 
+    url(r'^api/trash/$',
+        api.TrashAPIView.as_view()),
+
+    url(r'^api/batch/$',
+        api.BatchAPIView.as_view()),
+
+    url(r'^api/changes/$',
+        api.ChangesAPIView.as_view()),
+
 
 
     url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework'))
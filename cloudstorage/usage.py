@@ -0,0 +1,190 @@
+"""
+Storage usage counters.
+
+Every folder counts the bytes and files in its subtree (size and
+file_count) and every user the bytes and files they store (storage_used
+and file_count), so showing usage or checking a quota reads one row
+instead of summing File.size over a subtree.
+
+The counters are adjusted in the same transaction as the change behind
+them: saving and deleting files (File.save/delete), moving folders
+(hierarchy.update_path), deleting folders (Folder.delete) and moving
+things in and out of the trash (deletion.py). Trashed items keep counting
+against their owner until they are purged, but no longer count towards
+the folders above them; a trashed folder keeps its own counters so a
+restore can hand them back. The repair_usage command recomputes
+everything from the File rows.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from cloudstorage.hierarchy import PATH_STEP, get_hierarchy, get_path_ids
+from cloudstorage.models import File, Folder, StorageUser
+
+
+def add_counted(totals, path, deleted_ids, size, file_count):
+    """
+    Adds content stored in the folder with this path to `totals` for every
+    folder that counts it: the folder itself and its ancestors, up to and
+    including the nearest one in the trash
+    """
+    for folder_id in reversed(get_path_ids(path)):
+        totals[folder_id][0] += size
+        totals[folder_id][1] += file_count
+        if folder_id in deleted_ids:
+            break
+
+
+def update_folder_usage(*changes):
+    """
+    Applies (path, bytes, files) changes to the folder counters, with one
+    update per distinct amount, so eg. a move leaves the ancestors the old
+    and new location share alone
+    """
+    ids = set()
+    for path, size, file_count in changes:
+        ids.update(get_path_ids(path))
+    deleted_ids = set(Folder.objects.filter(id__in=ids, deleted_at__isnull=False).values_list('id', flat=True))
+
+    totals = defaultdict(lambda: [0, 0])
+    for path, size, file_count in changes:
+        add_counted(totals, path, deleted_ids, size, file_count)
+
+    groups = defaultdict(list)
+    for folder_id, (size, file_count) in totals.items():
+        if size or file_count:
+            groups[size, file_count].append(folder_id)
+
+    for (size, file_count), folder_ids in groups.items():
+        Folder.objects.filter(id__in=folder_ids) \
+            .update(size=F('size') + size, file_count=F('file_count') + file_count)
+
+
+def update_user_usage(owner_id, size, file_count):
+    if size or file_count:
+        StorageUser.objects.filter(pk=owner_id) \
+            .update(storage_used=F('storage_used') + size, file_count=F('file_count') + file_count)
+
+
+def get_folder_usage(folder_id):
+    """
+    Returns the (bytes, files) a folder passes on to the folders above it,
+    nothing if it is in the trash. Locks the folder's counters until the
+    end of the transaction.
+    """
+    usage = Folder.objects.select_for_update() \
+        .filter(pk=folder_id, deleted_at__isnull=True) \
+        .values_list('size', 'file_count').first()
+    return usage or (0, 0)
+
+
+def update_file_usage(file, old=None):
+    """
+    Counts a file that was just saved. `old` holds its previous folder_id,
+    size and deleted_at, None for a new file.
+    """
+    changes = []
+    if old is not None and old['deleted_at'] is None:
+        if (old['folder_id'], old['size']) == (file.folder_id, file.size) and file.deleted_at is None:
+            return
+        if old['folder_id'] == file.folder_id:
+            old_path = file.folder.path
+        else:
+            old_path = Folder.objects.filter(pk=old['folder_id']).values_list('path', flat=True).get()
+        changes.append((old_path, -old['size'], -1))
+    if file.deleted_at is None:
+        changes.append((file.folder.path, file.size, 1))
+
+    update_folder_usage(*changes)
+    if old is None:
+        update_user_usage(file.owner_id, file.size, 1)
+    else:
+        update_user_usage(file.owner_id, file.size - old['size'], 0)
+
+
+def remove_file_usage(file):
+    """
+    Uncounts a file that is about to be deleted for good
+    """
+    if file.deleted_at is None:
+        update_folder_usage((file.folder.path, -file.size, -1))
+    update_user_usage(file.owner_id, -file.size, -1)
+
+
+def move_folder_usage(folder, old_path, new_path):
+    """
+    Moves what a folder counts from its old ancestors to its new ones
+    """
+    size, file_count = get_folder_usage(folder.pk)
+    if size or file_count:
+        update_folder_usage((old_path[:-PATH_STEP], -size, -file_count),
+                            (new_path[:-PATH_STEP], size, file_count))
+
+
+def trash_folder_usage(folder, restore=False):
+    """
+    Takes what a folder counts off the folders above it when it goes into
+    the trash, or hands it back on restore. Call it while the folder is
+    out of the trash.
+    """
+    size, file_count = get_folder_usage(folder.pk)
+    if not restore:
+        size, file_count = -size, -file_count
+    update_folder_usage((folder.path[:-PATH_STEP], size, file_count))
+
+
+def trash_file_usage(file, restore=False):
+    """
+    Takes a file off its folders' counters when it goes into the trash, or
+    puts it back on restore
+    """
+    sign = 1 if restore else -1
+    update_folder_usage((file.folder.path, sign * file.size, sign))
+
+
+def remove_folder_usage(folder):
+    """
+    Uncounts a folder and everything below it that is about to be deleted
+    for good
+    """
+    size, file_count = get_folder_usage(folder.pk)
+    update_folder_usage((folder.path[:-PATH_STEP], -size, -file_count))
+
+    files = File.objects.filter(get_hierarchy().get_subtree_filter(folder, prefix='folder__'))
+    usage = files.aggregate(total_size=Sum('size'), total_count=Count('id'))
+    update_user_usage(folder.owner_id, -(usage['total_size'] or 0), -usage['total_count'])
+
+
+def rebuild_usage(user_model, folder_model, file_model, owner_id):
+    """
+    Recomputes every counter of one user from their File rows. Takes the
+    models so migrations can pass their own.
+    """
+    with transaction.atomic():
+        # uploads bump the user's counters last, so they wait for us here
+        user_model.objects.select_for_update().filter(pk=owner_id).exists()
+
+        files = file_model.objects.filter(owner_id=owner_id)
+        usage = files.aggregate(total_size=Sum('size'), total_count=Count('id'))
+        user_model.objects.filter(pk=owner_id) \
+            .update(storage_used=usage['total_size'] or 0, file_count=usage['total_count'])
+
+        folders = folder_model.objects.filter(owner_id=owner_id)
+        paths = dict(folders.values_list('id', 'path'))
+        deleted_ids = set(folders.filter(deleted_at__isnull=False).values_list('id', flat=True))
+
+        totals = defaultdict(lambda: [0, 0])
+        for folder_id, size, file_count in files.filter(deleted_at__isnull=True).values('folder_id') \
+                .annotate(total_size=Sum('size'), total_count=Count('id')) \
+                .values_list('folder_id', 'total_size', 'total_count'):
+            add_counted(totals, paths[folder_id], deleted_ids, size, file_count)
+
+        groups = defaultdict(list)
+        for folder_id in paths:
+            size, file_count = totals.get(folder_id, (0, 0))
+            groups[size, file_count].append(folder_id)
+
+        for (size, file_count), folder_ids in groups.items():
+            folder_model.objects.filter(id__in=folder_ids).update(size=size, file_count=file_count)
@@ -0,0 +1,25 @@
+"""
+Listing versions.
+
+Every folder carries a version that goes up whenever the list of files in
+it changes, and every user a folders_version that goes up whenever any of
+their folders changes (including its usage counters). The listing
+endpoints build their ETags and response cache keys from these, so a
+cached listing is never served after a change, in any process, without
+having to delete anything from the cache.
+"""
+from django.db.models import F
+
+from cloudstorage.models import Folder, StorageUser
+
+
+def bump_versions(owner_id, folder_ids=()):
+    """
+    Marks the owner's folder listing, and the file listings of the given
+    folders, as changed
+    """
+    StorageUser.objects.filter(pk=owner_id).update(folders_version=F('folders_version') + 1)
+
+    folder_ids = set(folder_ids) - {None}
+    if folder_ids:
+        Folder.objects.filter(id__in=folder_ids).update(version=F('version') + 1)
@@ -1,18 +1,37 @@
 # from django.contrib.auth.models import User
-from django.core.files.base import ContentFile
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from rest_framework import routers, serializers, viewsets, mixins
 
 
 # Serializers define the API representation.
-from rest_framework.authtoken.models import Token
 from rest_framework.generics import GenericAPIView, get_object_or_404
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import authenticate
-from cloudstorage.models import File, Folder
-from cloudstorage.serializers import FolderSerializer, FileSerializer, UserProfileSerializer
+from django.utils.http import urlquote
+from cloudstorage.archive import iter_archive
+from cloudstorage.authentication import CachedTokenAuthentication
+from cloudstorage.batch import BatchError, run_batch
+from cloudstorage.deletion import delete_folder, delete_file, restore_folder, restore_file, exclude_deleted, \
+    empty_trash
+from cloudstorage.hierarchy import get_hierarchy
+from cloudstorage.imports import import_archive
+from cloudstorage.listing_cache import cached_listing
+from cloudstorage.journal import get_changes, get_journal_floor
+from cloudstorage.models import Change, File, Folder, StorageUser, UploadSession
+from cloudstorage.notifications import get_max_wait, wait_for_changes
+from cloudstorage.pagination import FolderPagination, FilePagination
+from cloudstorage.quota import MULTIPART_OVERHEAD, QuotaExceeded, check_quota, get_remaining_quota
+from cloudstorage.serializers import FolderSerializer, FileSerializer, UserProfileSerializer, \
+    UploadSerializer, UploadCompleteSerializer, UploadSessionSerializer
+from cloudstorage.signing import get_file_url
+from cloudstorage.streaming import file_response
+from cloudstorage.tokens import issue_token, refresh_token
+from cloudstorage.tree import iter_tree_json
+from cloudstorage.uploadhandlers import QuotaUploadHandler
+from cloudstorage.upload_sessions import write_chunk, complete_session, abort_session
+from cloudstorage.uploads import UploadConflict, UploadError, create_upload, complete_upload
 
 
 class LoginView(APIView):
@@ -20,8 +39,10 @@ class LoginView(APIView):
 
     def post(self, request):
         """
-        Logins a user using email and password credentials. 
-        Refreshes the token every time the user logs in.
+        Logins a user using email and password credentials.
+        Issues a token for the device named by the optional 'device' field,
+        reusing the device's current token if it has one. The user's other
+        devices stay signed in.
         """
 
         if 'email' not in request.data or 'password' not in request.data:
@@ -37,19 +58,35 @@ class LoginView(APIView):
         if user is None:
             return Response({'status': 'invalid credentials'}, status=401)
 
-        Token.objects.filter(user=user).delete()
-
-        token = Token.objects.create(user=user)
+        token = issue_token(user, device=str(request.data.get('device', ''))[:100])
 
         root_folder = Folder.objects.filter(parent=None, owner=user).first()
 
         return Response({
             'status': 'Success',
             'token': token.key,
+            'expires': token.expires,
             'root_id': root_folder.id,
         }, status=200)
 
 
+class TokenRefreshView(APIView):
+    """
+    URL eg. /api/token/refresh/
+    POST: Pushes the expiry of the token the request is authenticated with
+    back to AUTH_TOKEN_TTL from now, without sending the password again
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+
+    def post(self, request):
+        refresh_token(request.auth)
+        return Response({
+            'status': 'Success',
+            'token': request.auth.key,
+            'expires': request.auth.expires,
+        }, status=200)
+
+
 class ProfileView(APIView):
     # Authentication requirement handled with Django magic using
     # project settings
@@ -61,6 +98,8 @@ class ProfileView(APIView):
         # if request.user.is_anonymous():
         #     return Response(status=401)
 
+        # the user may come from the token cache, get fresh counters
+        request.user.refresh_from_db(fields=('storage_used', 'file_count'))
         serializer = UserProfileSerializer(request.user)
         return Response(serializer.data)
 
@@ -88,17 +127,24 @@ class FolderAPIView(GenericAPIView):
         """
         queryset = super().get_queryset()
         queryset = queryset.filter(owner=self.request.user)
-        return queryset
+        return exclude_deleted(queryset)
 
 
 class FolderListAPIView(mixins.ListModelMixin, mixins.CreateModelMixin, FolderAPIView):
     """
     URL eg. /api/folders/
-    GET: Displays a list of folders for the requesting user
+    GET: Displays a list of folders for the requesting user. Supports
+    conditional requests (ETag, If-None-Match) and is cached until any of
+    the user's folders change, see listing_cache.py.
     POST: Creates a new folder for the requesting user
     """
+    pagination_class = FolderPagination
+
     def get(self, request):
-        return self.list(request=request)
+        version, date_joined = StorageUser.objects.filter(pk=request.user.pk) \
+            .values_list('folders_version', 'date_joined').get()
+        return cached_listing(request, ('folders', request.user.pk, date_joined, version),
+                              lambda: self.list(request=request).data)
 
     def post(self, request):
         return self.create(request=request)
@@ -112,7 +158,9 @@ class FolderDetailAPIView(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mi
     URL eg. /api/folders/:id/
     GET: Displays a single folder's details
     PUT: Updates a folder's details
-    DELETE: Deletes a folder 
+    DELETE: Moves a folder and everything in it to the trash. The folder
+    disappears right away and can be restored until the purge_trash command
+    removes it for good, see TRASH_RETENTION.
     """
     lookup_field = 'id'
     lookup_url_kwarg = 'folder_id'
@@ -124,7 +172,121 @@ class FolderDetailAPIView(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mi
         return self.update(request=request, folder_id=folder_id)
 
     def delete(self, request, folder_id):
-        return self.destroy(request=request, folder_id=folder_id)
+        folder = self.get_object()
+        if folder.parent_id is None:
+            return Response({'status': 'The root folder can not be deleted'}, status=400)
+        delete_folder(folder)
+        return Response(status=202)
+
+
+class FolderContentsAPIView(FolderAPIView):
+    """
+    URL eg. /api/folders/:id/contents/
+    GET: Displays everything needed to render a folder in one go: the folder
+    itself, its path from the root folder, its child folders and its files.
+    Takes the same handful of queries however big the folder is.
+    """
+    lookup_field = 'id'
+    lookup_url_kwarg = 'folder_id'
+
+    def get(self, request, folder_id):
+        folder = self.get_object()
+
+        # the hierarchy engine gives us the path without walking the tree
+        path = get_hierarchy().get_ancestors(folder, include_self=True).values('id', 'name')
+        children = Folder.objects.filter(parent=folder, deleted_at__isnull=True).order_by('name', 'id')
+        files = File.objects.filter(folder=folder, deleted_at__isnull=True).order_by('-modified', '-id')
+
+        context = self.get_serializer_context()
+        return Response({
+            'folder': FolderSerializer(folder, context=context).data,
+            'path': list(path),
+            'folders': FolderSerializer(children, many=True, context=context).data,
+            'files': FileSerializer(files, many=True, context=context).data,
+        })
+
+
+class FolderTreeAPIView(FolderAPIView):
+    """
+    URL eg. /api/folders/:id/tree/?files=true
+    GET: Streams a folder and all of its descendants as one nested JSON
+    document, optionally with each folder's files. Lets a client mirror a
+    whole drive with a single request.
+    """
+    lookup_field = 'id'
+    lookup_url_kwarg = 'folder_id'
+
+    def get(self, request, folder_id):
+        folder = self.get_object()
+        include_files = request.query_params.get('files', '').lower() in ('1', 'true', 'yes')
+        return StreamingHttpResponse(iter_tree_json(folder, include_files=include_files),
+                                     content_type='application/json')
+
+
+class FolderArchiveAPIView(FolderAPIView):
+    """
+    URL eg. /api/folders/:id/archive/
+    GET: Streams a folder and everything below it as a ZIP archive, built
+    on the fly, see archive.py
+    """
+    lookup_field = 'id'
+    lookup_url_kwarg = 'folder_id'
+
+    def get(self, request, folder_id):
+        folder = self.get_object()
+        response = StreamingHttpResponse(iter_archive(folder), content_type='application/zip')
+        response['Content-Disposition'] = "attachment; filename*=UTF-8''{}".format(urlquote(folder.name + '.zip'))
+        return response
+
+
+class FolderImportAPIView(FolderAPIView):
+    """
+    URL eg. /api/folders/:id/import/
+    POST: Imports a zip or tar archive, uploaded as 'archive', into the
+    folder: folders in it are merged into the folder's subfolders of the
+    same name or created, and its files added, see imports.py
+    """
+    lookup_field = 'id'
+    lookup_url_kwarg = 'folder_id'
+
+    def post(self, request, folder_id):
+        folder = self.get_object()
+        upload = request.data.get('archive')
+        if not upload:
+            return Response({'status': 'No archive uploaded'}, status=400)
+
+        try:
+            folders, files = import_archive(folder, upload)
+        except QuotaExceeded as e:
+            return Response({'status': str(e)}, status=413)
+        except UploadError as e:
+            return Response({'status': str(e)}, status=400)
+
+        return Response({'folders': folders, 'files': files}, status=201)
+
+
+class FolderRestoreAPIView(FolderAPIView):
+    """
+    URL eg. /api/folders/:id/restore/
+    POST: Takes a folder and everything in it back out of the trash
+    """
+    lookup_field = 'id'
+    lookup_url_kwarg = 'folder_id'
+
+    def get_queryset(self):
+        """
+        Only the requesting user's trashed folders can be restored
+        """
+        return Folder.objects.filter(owner=self.request.user, deleted_at__isnull=False)
+
+    def post(self, request, folder_id):
+        folder = self.get_object()
+
+        if Folder.objects.filter(pk=folder.parent_id, trashed=True).exists():
+            return Response({'status': 'Parent folder is in the trash'}, status=400)
+
+        restore_folder(folder)
+        return Response(FolderSerializer(folder, context=self.get_serializer_context()).data, status=200)
 
 
 class FileAPIView(GenericAPIView):
@@ -140,7 +302,7 @@ class FileAPIView(GenericAPIView):
         """
         folder = self.get_folder()
         queryset = super().get_queryset()
-        queryset = queryset.filter(folder=folder)
+        queryset = queryset.filter(folder=folder, deleted_at__isnull=True)
         return queryset
 
     def get_folder(self):
@@ -148,22 +310,31 @@ class FileAPIView(GenericAPIView):
         Returns and instance of a folder with a given id, owned by the requesting user.
         If the folder doesn't exist, raises a Http404 error
         """
-        queryset = Folder.objects.all()
-        return get_object_or_404(queryset, owner=self.request.user,
-                                 id=self.kwargs['folder_id'])
+        if not hasattr(self, '_folder'):
+            queryset = exclude_deleted(Folder.objects.all())
+            self._folder = get_object_or_404(queryset, owner=self.request.user,
+                                             id=self.kwargs['folder_id'])
+        return self._folder
 
 
 class AllFileListAPIView(mixins.ListModelMixin, FileAPIView):
     """
     Returns all files for the requesting user
     """
+    pagination_class = FilePagination
 
     def get_queryset(self):
         """
-        Filter queryset by owner
+        Filter queryset by owner, and optionally by checksum so clients can
+        check whether they already have a file before uploading it
         """
 
-        queryset = File.objects.filter(owner=self.request.user)
+        queryset = File.objects.filter(owner=self.request.user, deleted_at__isnull=True)
+        queryset = exclude_deleted(queryset, prefix='folder__')
+
+        checksum = self.request.query_params.get('checksum')
+        if checksum:
+            queryset = queryset.filter(checksum=checksum)
         return queryset
 
     def get(self, request):
@@ -173,25 +344,202 @@ class AllFileListAPIView(mixins.ListModelMixin, FileAPIView):
 class FileListAPIView(mixins.ListModelMixin, mixins.CreateModelMixin, FileAPIView):
     """
     URL eg. /api/folders/:id/files/
-    GET: Displays a list of files in the specified folder for the requesting user
+    GET: Displays a list of files in the specified folder for the requesting
+    user. Supports conditional requests (ETag, If-None-Match) and is cached
+    until the folder's files change, see listing_cache.py.
     POST: Creates a new file in the specified folder owned by the requesting user
     """
+    pagination_class = FilePagination
+
     def get(self, request, folder_id):
-        return self.list(request=request, folder_id=folder_id)
+        folder = self.get_folder()
+        return cached_listing(request, ('files', folder.pk, folder.created, folder.version),
+                              lambda: self.list(request=request, folder_id=folder_id).data)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if request.method == 'POST':
+            # in place before anything reads the body, which may happen while
+            # authenticating, see get_upload_quota
+            self.quota_handler = QuotaUploadHandler(lambda: self.get_upload_quota(request), request)
+            request.upload_handlers.insert(0, self.quota_handler)
+        return request
+
+    def get_upload_quota(self, request):
+        """
+        Returns the remaining quota of the user uploading. SessionAuthentication
+        reads the body for its CSRF check before request.user is set, on
+        behalf of the user the session belongs to.
+        """
+        user = request.user if hasattr(request, '_user') else request._request.user
+        if not user.is_authenticated:
+            return None
+        return get_remaining_quota(user)
 
     def post(self, request, folder_id):
-        return self.create(request=request, folder_id=folder_id)
+        remaining = get_remaining_quota(request.user)
+        if remaining is not None:
+            # turn the upload away before reading any of it if we can, or
+            # else as soon as it grows too large
+            if int(request.META.get('CONTENT_LENGTH') or 0) > remaining + MULTIPART_OVERHEAD:
+                return Response({'status': 'Storage quota exceeded'}, status=413)
+
+            request.data  # parse the body now, with the handler in place
+            if self.quota_handler.exceeded:
+                return Response({'status': 'Storage quota exceeded'}, status=413)
+
+        try:
+            return self.create(request=request, folder_id=folder_id)
+        except QuotaExceeded as e:
+            return Response({'status': str(e)}, status=413)
 
     def perform_create(self, serializer):
+        upload = serializer.validated_data.get('file')
+        if upload is not None:
+            check_quota(self.request.user, upload.size)
         serializer.save(owner=self.request.user, folder=self.get_folder())
 
 
+class FileUploadAPIView(FileAPIView):
+    """
+    URL eg. /api/folders/:id/uploads/
+    POST: Returns a presigned target for uploading a new file straight to
+    storage, plus a token to complete the upload with
+    """
+    def post(self, request, folder_id):
+        serializer = UploadSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        try:
+            upload = create_upload(request.user, self.get_folder(), **serializer.validated_data)
+        except QuotaExceeded as e:
+            return Response({'status': str(e)}, status=413)
+        except UploadError as e:
+            return Response({'status': str(e)}, status=400)
+
+        return Response(upload, status=201)
+
+
+class FileUploadCompleteAPIView(FileAPIView):
+    """
+    URL eg. /api/folders/:id/uploads/complete/
+    POST: Verifies a file uploaded straight to storage and creates it in the
+    specified folder
+    """
+    def post(self, request, folder_id):
+        serializer = UploadCompleteSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        try:
+            file = complete_upload(request.user, self.get_folder(), serializer.validated_data['token'])
+        except QuotaExceeded as e:
+            return Response({'status': str(e)}, status=413)
+        except UploadError as e:
+            return Response({'status': str(e)}, status=400)
+
+        return Response(FileSerializer(file).data, status=201)
+
+
+class UploadSessionListAPIView(mixins.CreateModelMixin, FileAPIView):
+    """
+    URL eg. /api/folders/:id/upload-sessions/
+    POST: Opens a resumable upload session for a new file in the specified folder
+    """
+    serializer_class = UploadSessionSerializer
+
+    def post(self, request, folder_id):
+        try:
+            return self.create(request=request, folder_id=folder_id)
+        except QuotaExceeded as e:
+            return Response({'status': str(e)}, status=413)
+
+    def perform_create(self, serializer):
+        check_quota(self.request.user, serializer.validated_data['size'])
+        serializer.save(owner=self.request.user, folder=self.get_folder())
+
+
+class UploadSessionAPIView(GenericAPIView):
+    """
+    Base upload session API class so we don't have to repeat ourselves
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    lookup_field = 'id'
+    lookup_url_kwarg = 'session_id'
+
+    def get_queryset(self):
+        """
+        Filter queryset by owner = requesting user
+        """
+        queryset = super().get_queryset()
+        queryset = queryset.filter(owner=self.request.user)
+        return exclude_deleted(queryset, prefix='folder__')
+
+
+class UploadSessionDetailAPIView(mixins.RetrieveModelMixin, UploadSessionAPIView):
+    """
+    URL eg. /api/upload-sessions/:id/
+    GET: Displays an upload session, including which chunks have landed
+    DELETE: Aborts an upload session and throws away its chunks
+    """
+    def get(self, request, session_id):
+        return self.retrieve(request=request, session_id=session_id)
+
+    def delete(self, request, session_id):
+        abort_session(self.get_object())
+        return Response(status=204)
+
+
+class UploadChunkAPIView(UploadSessionAPIView):
+    """
+    URL eg. /api/upload-sessions/:id/chunks/:number/
+    PUT: Stores one chunk of the file, sent as the raw request body.
+    Chunks are numbered from 1 and may be sent in any order, concurrently.
+    """
+    def put(self, request, session_id, number):
+        session = self.get_object()
+
+        try:
+            chunk = write_chunk(session, int(number), request.stream)
+        except UploadConflict as e:
+            return Response({'status': str(e)}, status=409)
+        except UploadError as e:
+            return Response({'status': str(e)}, status=400)
+
+        return Response({'number': chunk.number, 'size': chunk.size}, status=200)
+
+
+class UploadSessionCompleteAPIView(UploadSessionAPIView):
+    """
+    URL eg. /api/upload-sessions/:id/complete/
+    POST: Assembles the uploaded chunks and creates the file. Answers 409
+    if another request completed the session first.
+    """
+    def post(self, request, session_id):
+        session = self.get_object()
+
+        try:
+            file = complete_session(session)
+        except QuotaExceeded as e:
+            return Response({'status': str(e)}, status=413)
+        except UploadConflict as e:
+            return Response({'status': str(e)}, status=409)
+        except UploadError as e:
+            return Response({'status': str(e)}, status=400)
+
+        return Response(FileSerializer(file).data, status=201)
+
+
 class FileDetailAPIView(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin,FileAPIView):
     """
     URL eg. /api/folders/:id/files/:id/
     GET: Displays a single file's details
     PUT: Updates a file's details
-    DELETE: Deletes a file 
+    DELETE: Moves a file to the trash, see FolderDetailAPIView
     """
 
     lookup_field = 'id'
@@ -205,45 +553,174 @@ class FileDetailAPIView(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixi
         return self.update(request=request, folder_id=folder_id, file_id=file_id)
 
     def delete(self, request, folder_id, file_id):
-        return self.destroy(request=request, folder_id=folder_id, file_id=file_id)
+        delete_file(self.get_object())
+        return Response(status=204)
+
+
+class FileRestoreAPIView(FileAPIView):
+    """
+    URL eg. /api/folders/:id/files/:id/restore/
+    POST: Takes a file back out of the trash
+    """
+    lookup_field = 'id'
+    lookup_url_kwarg = 'file_id'
+
+    def get_queryset(self):
+        """
+        Only the requesting user's trashed files can be restored
+        """
+        return File.objects.filter(folder_id=self.kwargs['folder_id'], owner=self.request.user,
+                                   deleted_at__isnull=False)
+
+    def post(self, request, folder_id, file_id):
+        file = self.get_object()
+
+        folder = Folder.objects.filter(pk=file.folder_id)
+        if not exclude_deleted(folder).exists():
+            return Response({'status': 'Folder is in the trash'}, status=400)
+
+        restore_file(file)
+        return Response(FileSerializer(file, context=self.get_serializer_context()).data, status=200)
 
 
 class FileRedirectAPIView(FileAPIView):
     """
     Retrieves the file from the database and returns a redirect to the
-    location of the file.
+    location of the file. On S3 the location is a short-lived presigned URL
+    (see SIGNED_URL_TTL), which is cached so hot files skip the signing
+    until the file itself changes.
     """
     lookup_field = 'id'
     lookup_url_kwarg = 'file_id'
 
     def get(self, request, folder_id, file_id):
-        queryset = File.objects.filter(folder_id=folder_id, owner=request.user)
+        queryset = File.objects.filter(folder_id=folder_id, owner=request.user, deleted_at__isnull=True)
+        queryset = exclude_deleted(queryset, prefix='folder__')
 
         try:
             file = queryset.get(id=file_id)
         except File.DoesNotExist:
             return Response(status=404)
 
-        return HttpResponseRedirect(file.file.url)
+        return HttpResponseRedirect(get_file_url(file))
 
 
 class FileStreamAPIView(FileAPIView):
     """
-    Retrieves the file from the database and returns a redirect to the
-    location of the file.
+    Retrieves the file from the database and streams its content back in
+    chunks of FILE_STREAM_CHUNK_SIZE bytes, so memory use stays flat no
+    matter how large the file is. Supports single and multiple byte ranges
+    through the Range header.
+
+    With FILE_SERVE_MODE set to 'x-accel-redirect' or 'x-sendfile' the view
+    only checks ownership and leaves the transfer to the front-end server.
     """
     lookup_field = 'id'
     lookup_url_kwarg = 'file_id'
 
     def get(self, request, folder_id, file_id):
-        queryset = File.objects.filter(folder_id=folder_id, owner=request.user)
+        queryset = File.objects.filter(folder_id=folder_id, owner=request.user, deleted_at__isnull=True)
+        queryset = exclude_deleted(queryset, prefix='folder__')
 
         try:
             file = queryset.get(id=file_id)
         except File.DoesNotExist:
             return Response(status=404)
 
-        content = ContentFile(file.file.read())
+        return file_response(file.file, file.mime_type,
+                             range_header=request.META.get('HTTP_RANGE'))
+
 
-        return HttpResponse(content=content, content_type=file.mime_type)
+class ChangesAPIView(APIView):
+    """
+    URL eg. /api/changes/?since=:cursor&wait=:seconds
+    GET: Displays what changed since `cursor`, at most CHANGES_PAGE_SIZE
+    changes, each with the file or folder as it is now (None once deleted
+    for good), and the cursor to ask with next time. Without `since`, just
+    hands out the current cursor, for clients that have listed everything.
+    Answers 410 once the changes since `cursor` have been compacted away,
+    the client has to list everything again, see journal.py.
+    With `wait`, nothing changed yet holds the request until something
+    does, up to `wait` seconds (at most CHANGES_MAX_WAIT), see
+    notifications.py.
+    """
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            cursor = StorageUser.objects.filter(pk=request.user.pk).values_list('journal_seq', flat=True).get()
+            return Response({'changes': [], 'cursor': cursor, 'more': False})
+
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({'status': 'Invalid cursor'}, status=400)
+        try:
+            wait = min(max(int(request.query_params.get('wait', 0)), 0), get_max_wait())
+        except ValueError:
+            return Response({'status': 'Invalid wait'}, status=400)
+        if since < get_journal_floor(request.user):
+            return Response({'status': 'Cursor has expired, list everything again'}, status=410)
+
+        changes, more, cursor = get_changes(request.user, since)
+        if not changes and wait and wait_for_changes(request.user.pk, since, wait):
+            changes, more, cursor = get_changes(request.user, since)
+        ids = {kind: [change.item_id for change in changes if change.kind == kind]
+               for kind in (Change.KIND_FILE, Change.KIND_FOLDER)}
+        files = File.objects.in_bulk(ids[Change.KIND_FILE])
+        folders = Folder.objects.in_bulk(ids[Change.KIND_FOLDER])
+
+        context = {'request': request}
+        data = []
+        for change in changes:
+            if change.kind == Change.KIND_FILE:
+                item = files.get(change.item_id)
+                item = FileSerializer(item, context=context).data if item is not None else None
+            else:
+                item = folders.get(change.item_id)
+                item = FolderSerializer(item, context=context).data if item is not None else None
+            data.append({'seq': change.seq, 'type': change.kind, 'id': change.item_id,
+                         'action': change.action, 'item': item})
+
+        return Response({'changes': data, 'cursor': cursor, 'more': more})
+
+
+class BatchAPIView(APIView):
+    """
+    URL eg. /api/batch/
+    POST: Moves, renames and deletes many files and folders at once. Takes
+    {"operations": [{"op": "move", "type": "file", "id": 1, "folder": 2}, ...]}
+    and returns the result of each operation, in order, see batch.py
+    """
+    def post(self, request):
+        try:
+            results = run_batch(request.user, request.data.get('operations'))
+        except BatchError as e:
+            return Response({'status': str(e)}, status=400)
+        return Response({'results': results})
+
+
+class TrashAPIView(APIView):
+    """
+    URL eg. /api/trash/
+    GET: Displays what the requesting user can restore: the folders they
+    deleted and the files they deleted on their own, newest first. Whatever
+    sits inside a deleted folder comes back with it and isn't listed.
+    DELETE: Empties the requesting user's trash for good, which frees the
+    space it takes up in their quota
+    """
+    def get(self, request):
+        folders = Folder.objects.filter(owner=request.user, deleted_at__isnull=False, parent__trashed=False) \
+            .order_by('-deleted_at', '-id')
+
+        files = File.objects.filter(owner=request.user, deleted_at__isnull=False).order_by('-deleted_at', '-id')
+        files = exclude_deleted(files, prefix='folder__')
+
+        context = {'request': request}
+        return Response({
+            'folders': FolderSerializer(folders, many=True, context=context).data,
+            'files': FileSerializer(files, many=True, context=context).data,
+        })
 
+    def delete(self, request):
+        empty_trash(request.user)
+        return Response(status=204)